@@ -0,0 +1,321 @@
+"""
+actor_learner.py
+~~~~~~~~~~~~~~~~
+Actor–Learner 解耦训练（IMPALA 风格）：
+
+* 每台设备一个 actor 进程，持续用最新策略权重 step ScrcpyEnv，
+  每 unroll_len 步把一段轨迹推入共享队列，PPO 更新期间手机不会停下来
+* learner 进程消费轨迹，用 V-trace 做 off-policy 修正后以 PPO 截断目标更新，
+  每 publish_every 次更新把权重原子写盘并递增版本号，actor 发现新版本即热加载
+
+Usage:
+    python actor_learner.py --config config.yaml
+"""
+from __future__ import annotations
+import argparse
+import os
+import queue
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import yaml
+
+# ───────────────────── 默认参数 ─────────────────────
+DEFAULTS = {
+    "unroll_len": 32,          # actor 每段轨迹长度
+    "batch_unrolls": 4,        # learner 每次更新消费的轨迹段数
+    "queue_size": 16,          # 轨迹队列上限，满了 actor 会阻塞（背压）
+    "n_epochs": 2,
+    "learning_rate": 3e-4,
+    "gamma": 0.95,
+    "clip_range": 0.2,
+    "ent_coef": 0.1,
+    "vf_coef": 0.5,
+    "max_grad_norm": 0.5,
+    "rho_bar": 1.0,            # V-trace 重要性权重截断
+    "c_bar": 1.0,
+    "publish_every": 1,
+    "total_timesteps": 100000,
+    "weights_path": "./actor_learner/weights.pt",
+    "tensorboard_log": "./runs",
+    "devices": [],             # [{serial: "...", port: 1234}, ...]；为空时用 adb_bridge
+}
+
+
+def _settings(config) -> Dict:
+    s = dict(DEFAULTS)
+    s.update(config.get("actor_learner", {}) or {})
+    if not s["devices"]:
+        s["devices"] = [{"serial": config["adb_bridge"]["serial"], "port": config["adb_bridge"]["port"]}]
+    return s
+
+
+def _make_policy(config, obs_space, act_space, lr: float):
+    from stable_baselines3.common.policies import ActorCriticCnnPolicy
+    from train_agent import policy_kwargs_from_config
+    return ActorCriticCnnPolicy(obs_space, act_space, lr_schedule=lambda _: lr,
+                                **policy_kwargs_from_config(config))
+
+
+# ───────────────────── 权重发布 ─────────────────────
+def publish_weights(policy, path: Path, version) -> None:
+    """先写临时文件再 os.replace，actor 永远读不到半截文件。"""
+    import torch
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    torch.save({k: v.detach().cpu() for k, v in policy.state_dict().items()}, tmp)
+    os.replace(tmp, path)
+    with version.get_lock():
+        version.value += 1
+
+
+def _maybe_reload(policy, path: Path, version, loaded: int) -> int:
+    import torch
+    cur = version.value
+    if cur > loaded:
+        policy.load_state_dict(torch.load(path, map_location="cpu"))
+        return cur
+    return loaded
+
+
+# ───────────────────── Actor ─────────────────────
+def actor_main(actor_id: int, config, device: Dict, traj_queue, version, stop_event) -> None:
+    import torch
+    from env_launcher import ScrcpyLauncher
+    from train_agent import build_env
+    from telemetry import setup_logging
+
+    setup_logging(config.get("logging", {}).get("level", "INFO"))     # 子进程不继承日志配置
+    s = _settings(config)
+    weights_path = Path(s["weights_path"])
+    torch.set_num_threads(1)       # 多个 actor 共享 CPU，推理单线程即可
+
+    launcher = ScrcpyLauncher.from_config(config, serial=device.get("serial"), port=device["port"])
+    with launcher:
+        env = build_env(config, launcher, serial=device.get("serial"), port=device["port"])
+        traj_queue.put(("spaces", actor_id, env.observation_space, env.action_space))
+
+        policy = _make_policy(config, env.observation_space, env.action_space, s["learning_rate"])
+        policy.set_training_mode(False)
+        while version.value == 0 and not stop_event.is_set():
+            time.sleep(0.1)        # 等 learner 发布初始权重
+        loaded = _maybe_reload(policy, weights_path, version, 0)
+
+        obs, _ = env.reset()
+        ep_ret, ep_len = 0.0, 0
+        while not stop_event.is_set():
+            loaded = _maybe_reload(policy, weights_path, version, loaded)
+            buf = {k: [] for k in ("obs", "actions", "logp", "rewards", "dones")}
+            episodes: List[tuple] = []
+            for _ in range(s["unroll_len"]):
+                with torch.no_grad():
+                    obs_t = policy.obs_to_tensor(obs)[0]
+                    action, _, logp = policy(obs_t)
+                # Discrete 为标量，MultiDiscrete 为 (方向, 按钮)，原样交给 env
+                a = action.cpu().numpy()[0]
+                next_obs, r, terminated, truncated, _ = env.step(a)
+                done = terminated or truncated
+
+                buf["obs"].append(obs)
+                buf["actions"].append(a)
+                buf["logp"].append(float(logp.item()))
+                buf["rewards"].append(float(r))
+                buf["dones"].append(done)
+                ep_ret += r
+                ep_len += 1
+
+                if done:
+                    episodes.append((ep_ret, ep_len))
+                    ep_ret, ep_len = 0.0, 0
+                    next_obs, _ = env.reset()
+                obs = next_obs
+
+            traj = {
+                "obs": np.stack(buf["obs"]),
+                "actions": np.asarray(buf["actions"], dtype=np.int64),
+                "logp": np.asarray(buf["logp"], dtype=np.float32),
+                "rewards": np.asarray(buf["rewards"], dtype=np.float32),
+                "dones": np.asarray(buf["dones"], dtype=np.float32),
+                "last_obs": obs,
+                "version": loaded,
+                "episodes": episodes,
+            }
+            traj_queue.put(("traj", actor_id, traj))
+
+
+# ───────────────────── V-trace ─────────────────────
+def vtrace(behaviour_logp, target_logp, rewards, values, bootstrap, dones, gamma, rho_bar, c_bar):
+    """
+    所有输入形状 (T, B)，bootstrap 为 (B,)。
+    返回 (vs, pg_adv)：价值目标与策略梯度优势。
+    """
+    import torch
+    rhos = torch.exp(target_logp - behaviour_logp)
+    clipped_rhos = torch.clamp(rhos, max=rho_bar)
+    cs = torch.clamp(rhos, max=c_bar)
+    discounts = gamma * (1.0 - dones)
+
+    values_tp1 = torch.cat([values[1:], bootstrap[None]], dim=0)
+    deltas = clipped_rhos * (rewards + discounts * values_tp1 - values)
+
+    acc = torch.zeros_like(bootstrap)
+    vs_minus_v = []
+    for t in reversed(range(values.shape[0])):
+        acc = deltas[t] + discounts[t] * cs[t] * acc
+        vs_minus_v.append(acc)
+    vs = values + torch.stack(vs_minus_v[::-1])
+
+    vs_tp1 = torch.cat([vs[1:], bootstrap[None]], dim=0)
+    pg_adv = clipped_rhos * (rewards + discounts * vs_tp1 - values)
+    return vs, pg_adv
+
+
+# ───────────────────── Learner ─────────────────────
+class Learner:
+    def __init__(self, config, settings: Dict, obs_space, act_space):
+        import torch
+        from stable_baselines3.common.logger import configure
+
+        self.s = settings
+        self.policy = _make_policy(config, obs_space, act_space, settings["learning_rate"])
+        self.device = self.policy.device
+        self.logger = configure(settings["tensorboard_log"], ["stdout", "tensorboard"])
+        self.num_timesteps = 0
+        self.n_updates = 0
+        self.published = 0         # 已发布的权重版本号
+        self.ep_returns: List[float] = []
+        self._torch = torch
+
+    def _to_tensor(self, arr):
+        return self._torch.as_tensor(arr, device=self.device)
+
+    def update(self, trajs: List[Dict]) -> None:
+        torch = self._torch
+        s = self.s
+        T, B = len(trajs[0]["actions"]), len(trajs)
+
+        # (T, B, ...) 时间优先，便于 V-trace 反向递推
+        obs = self._to_tensor(np.stack([t["obs"] for t in trajs], axis=1))
+        actions = self._to_tensor(np.stack([t["actions"] for t in trajs], axis=1))
+        behaviour_logp = self._to_tensor(np.stack([t["logp"] for t in trajs], axis=1))
+        rewards = self._to_tensor(np.stack([t["rewards"] for t in trajs], axis=1))
+        dones = self._to_tensor(np.stack([t["dones"] for t in trajs], axis=1))
+        last_obs = self._to_tensor(np.stack([t["last_obs"] for t in trajs]))
+
+        flat_obs = obs.reshape(T * B, *obs.shape[2:])
+        flat_actions = actions.reshape(T * B, *actions.shape[2:])
+
+        self.policy.set_training_mode(True)
+        for _ in range(s["n_epochs"]):
+            values, logp, entropy = self.policy.evaluate_actions(flat_obs, flat_actions)
+            values = values.reshape(T, B)
+            logp = logp.reshape(T, B)
+            with torch.no_grad():
+                bootstrap = self.policy.predict_values(last_obs).reshape(B)
+                vs, pg_adv = vtrace(behaviour_logp, logp.detach(), rewards, values.detach(),
+                                    bootstrap, dones, s["gamma"], s["rho_bar"], s["c_bar"])
+                pg_adv = (pg_adv - pg_adv.mean()) / (pg_adv.std() + 1e-8)
+
+            # PPO 截断目标：比值相对行为策略
+            ratio = torch.exp(logp - behaviour_logp)
+            surr1 = ratio * pg_adv
+            surr2 = torch.clamp(ratio, 1 - s["clip_range"], 1 + s["clip_range"]) * pg_adv
+            policy_loss = -torch.min(surr1, surr2).mean()
+            value_loss = torch.nn.functional.mse_loss(values, vs)
+            entropy_loss = -entropy.mean()
+            loss = policy_loss + s["vf_coef"] * value_loss + s["ent_coef"] * entropy_loss
+
+            self.policy.optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(self.policy.parameters(), s["max_grad_norm"])
+            self.policy.optimizer.step()
+
+        self.n_updates += 1
+        self.num_timesteps += T * B
+        for t in trajs:
+            self.ep_returns.extend(r for r, _ in t["episodes"])
+        lag = np.mean([self.published - t["version"] for t in trajs])
+
+        self.logger.record("train/policy_loss", policy_loss.item())
+        self.logger.record("train/value_loss", value_loss.item())
+        self.logger.record("train/entropy_loss", entropy_loss.item())
+        self.logger.record("train/policy_lag", lag)
+        if self.ep_returns:
+            self.logger.record("rollout/ep_rew_mean", float(np.mean(self.ep_returns[-100:])))
+        self.logger.dump(self.num_timesteps)
+
+
+def learner_main(config, traj_queue, version, stop_event) -> None:
+    s = _settings(config)
+    weights_path = Path(s["weights_path"])
+
+    # 等第一个 actor 报告观测 / 动作空间
+    learner = None
+    while learner is None:
+        kind, actor_id, *payload = traj_queue.get()
+        if kind == "spaces":
+            learner = Learner(config, s, *payload)
+            publish_weights(learner.policy, weights_path, version)
+            learner.published = version.value
+            print(f"[actor_learner] learner 就绪 (空间来自 actor {actor_id})")
+
+    pending: List[Dict] = []
+    while learner.num_timesteps < s["total_timesteps"]:
+        try:
+            kind, actor_id, *payload = traj_queue.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if kind != "traj":
+            continue
+        pending.append(payload[0])
+        if len(pending) < s["batch_unrolls"]:
+            continue
+
+        learner.update(pending)
+        pending = []
+        if learner.n_updates % s["publish_every"] == 0:
+            publish_weights(learner.policy, weights_path, version)
+            learner.published = version.value
+
+    learner.policy.save("BrawlStars_policy.pt")
+    stop_event.set()
+
+
+# ───────────────────── 入口 ─────────────────────
+def main(config) -> None:
+    import torch.multiprocessing as mp
+
+    s = _settings(config)
+    ctx = mp.get_context("spawn")
+    traj_queue = ctx.Queue(maxsize=s["queue_size"])
+    version = ctx.Value("i", 0)
+    stop_event = ctx.Event()
+
+    actors = [
+        ctx.Process(target=actor_main, args=(i, config, dev, traj_queue, version, stop_event), daemon=True)
+        for i, dev in enumerate(s["devices"])
+    ]
+    for p in actors:
+        p.start()
+    print(f"[actor_learner] 已启动 {len(actors)} 个 actor")
+
+    try:
+        learner_main(config, traj_queue, version, stop_event)
+    except KeyboardInterrupt:
+        print("\n[actor_learner] 手动中断，已安全退出。")
+    finally:
+        stop_event.set()
+        for p in actors:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actor–Learner 解耦训练")
+    parser.add_argument("--config", default="config.yaml")
+    args = parser.parse_args()
+    with open(args.config) as f:
+        main(yaml.safe_load(f))
@@ -1,7 +1,7 @@
 """
 adb_control.py
 ~~~~~~~~~~~~~~
-纯 ADB 注入：tap / swipe / key / drag(持续按住再抬起)。
+纯 ADB 注入：tap / swipe / key / drag(持续按住再抬起)，以及 shell_batch 批量注入。
 """
 from __future__ import annotations
 import subprocess, shlex, time
@@ -62,6 +62,57 @@ class AdbControl:
     def key(self, keycode: int):
         self._adb(f"shell input keyevent {keycode}")
 
+    def shell_batch(self, cmds):
+        """多条 shell 命令合成一行 "a; b; c"，一次 adb 往返（或一次 shell 会话写入）执行完。"""
+        if cmds:
+            self._adb("shell " + "; ".join(cmds))
+
     def check_adb_link(self):
         self._adb("shell echo hello")
         return self.device_is_connected
+
+
+class AdbShellControl(AdbControl):
+    """
+    常驻 `adb shell` 会话：`shell ...` 命令直接写进同一个进程的 stdin，
+    省去每条命令一次 adb 进程启动 + 连接握手。写入即返回，不等命令执行完。
+    非 shell 命令（forward / push 等）仍走父类的一次性子进程。
+    """
+
+    def __init__(self, serial: Optional[str] = None):
+        super().__init__(serial)
+        self._proc: Optional[subprocess.Popen] = None
+
+    def _session(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            base = ["adb"] + (["-s", self.serial] if self.serial else [])
+            self._proc = subprocess.Popen(
+                base + ["shell"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        return self._proc
+
+    def _adb(self, cmd: str) -> None:
+        if not cmd.startswith("shell ") or cmd == "shell echo hello":
+            return super()._adb(cmd)        # 连通性检查需要真实返回码
+        try:
+            proc = self._session()
+            proc.stdin.write(cmd[len("shell "):] + "\n")
+            proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            print(f"[ADB Warning] shell 会话中断: {e}")
+            self.device_is_connected = False
+            self._proc = None
+
+    def close(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            self._proc.terminate()
+        self._proc = None
@@ -0,0 +1,225 @@
+"""
+auto_label.py
+~~~~~~~~~~~~~
+用 GameDetector 批量预标注采集到的画面，产出 YOLO 格式标签供人工复核。
+
+* 多进程：每个 worker 进程各加载一份模型，按 batch 调用 detect_batch；
+  torch 线程数按 worker 平分 CPU，避免超订
+* 可断点续跑：每完成一批就向 progress.jsonl 追加逐图记录，重启时跳过已记录的图片
+* 输出目录::
+
+    out/
+      <与输入相同的相对路径>.txt     cls cx cy w h（归一化），无检测时为空文件
+      classes.txt                   模型类别表（行号即类别 id）
+      progress.jsonl                逐图记录 {"file", "n", "cls", "conf"}
+      summary.json                  各类别计数、置信度直方图、吞吐
+      review.txt                    含低置信度框的图片，优先人工检查
+
+Usage:
+    python auto_label.py frames/20260101-120000 --weight best.pt --workers 4 --batch 8
+    python auto_label.py frames/ --out labels/ --review-conf 0.6 --swap-rb   # 旧版通道互换的截图
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+__all__ = ["find_images", "to_yolo_lines", "summarize"]
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+CONF_BINS = np.linspace(0.0, 1.0, 21)
+
+# worker 进程内的全局状态，由 _init_worker 设置
+_detector = None
+_opts: Dict = {}
+
+
+def find_images(root: Path, exclude: Optional[Path] = None) -> List[Path]:
+    """递归列出图片（相对 root，排序保证多次运行顺序一致）；跳过输出目录。"""
+    out = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if exclude is not None:
+            dirnames[:] = [d for d in dirnames if Path(dirpath, d).resolve() != exclude]
+        for name in filenames:
+            if name.lower().endswith(IMAGE_EXTS):
+                out.append(Path(dirpath, name).relative_to(root))
+    return sorted(out)
+
+
+def to_yolo_lines(dets: Sequence[Dict], class_ids: Dict[str, int], w: int, h: int) -> List[str]:
+    lines = []
+    for d in dets:
+        x1, y1, x2, y2 = d["xyxy"]
+        cx, cy = (x1 + x2) / 2 / w, (y1 + y2) / 2 / h
+        bw, bh = (x2 - x1) / w, (y2 - y1) / h
+        lines.append(f"{class_ids[d['cls']]} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}")
+    return lines
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+# ───────────────────── worker 进程 ─────────────────────
+def _init_worker(opts: Dict) -> None:
+    global _detector, _opts
+    import torch
+    torch.set_num_threads(opts["threads"])
+    from game_detector import GameDetector
+
+    _opts = opts
+    _detector = GameDetector(opts["weight"], device="cpu", input_order=opts["input_order"])
+
+
+def _label_batch(rels: Sequence[str]) -> List[Dict]:
+    root, out = Path(_opts["root"]), Path(_opts["out"])
+    frames, ok = [], []
+    for rel in rels:
+        img = cv2.imread(str(root / rel), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        # 磁盘上是 BGR，检测器吃 RGB 帧；旧版截图本身就是通道互换的，--swap-rb 时原样使用
+        frames.append(img if _opts["swap_rb"] else cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        ok.append(rel)
+
+    records = []
+    if frames:
+        class_ids = {name: i for i, name in _detector.names.items()}
+        for rel, frame, dets in zip(ok, frames, _detector.detect_batch(frames, _opts["conf"], _opts["imgsz"])):
+            h, w = frame.shape[:2]
+            _write_atomic((out / rel).with_suffix(".txt"), "".join(l + "\n" for l in to_yolo_lines(dets, class_ids, w, h)))
+            records.append({"file": rel, "n": len(dets), "cls": [d["cls"] for d in dets],
+                            "conf": [round(d["conf"], 4) for d in dets]})
+    bad = set(rels) - set(ok)
+    records.extend({"file": rel, "error": "unreadable"} for rel in sorted(bad))
+    return records
+
+
+def _class_names() -> Dict[int, str]:
+    return dict(_detector.names)
+
+
+# ───────────────────── 汇总 ─────────────────────
+def _load_progress(path: Path) -> Dict[str, Dict]:
+    done = {}
+    if path.exists():
+        with path.open() as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except json.JSONDecodeError:        # 中断时可能留下半行
+                    continue
+                done[r["file"]] = r
+    return done
+
+
+def summarize(records: Sequence[Dict], review_conf: float) -> Dict:
+    counts: Counter = Counter()
+    confs = defaultdict(list)
+    review, errors, empty = [], 0, 0
+    for r in records:
+        if "error" in r:
+            errors += 1
+            continue
+        if not r["n"]:
+            empty += 1
+        for c, p in zip(r["cls"], r["conf"]):
+            counts[c] += 1
+            confs[c].append(p)
+        if r["conf"] and min(r["conf"]) < review_conf:
+            review.append(r["file"])
+    return {
+        "images": len(records),
+        "empty": empty,
+        "errors": errors,
+        "boxes": sum(counts.values()),
+        "per_class": {c: {"count": n,
+                          "conf_mean": round(float(np.mean(confs[c])), 4),
+                          "conf_hist": np.histogram(confs[c], CONF_BINS)[0].tolist()}
+                      for c, n in counts.most_common()},
+        "conf_bins": CONF_BINS.round(2).tolist(),
+        "review_conf": review_conf,
+        "review": sorted(review),
+    }
+
+
+def _batches(items: Sequence[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), size):
+        yield list(items[i:i + size])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="GameDetector 批量预标注（YOLO 格式）")
+    parser.add_argument("root", help="图片目录（递归）")
+    parser.add_argument("--out", default=None, help="标签目录，默认 <root>_labels")
+    parser.add_argument("--weight", default="best.pt")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--conf", type=float, default=0.25, help="写入标签的最低置信度")
+    parser.add_argument("--review-conf", type=float, default=0.6, help="含低于此置信度框的图片列入 review.txt")
+    parser.add_argument("--imgsz", type=int, default=1088)
+    parser.add_argument("--input-order", default="rgb", choices=("rgb", "bgr"))
+    parser.add_argument("--swap-rb", action="store_true", help="图片是旧版 save_frame 写出的（RGB 当 BGR 存盘）")
+    parser.add_argument("--limit", type=int, default=None, help="只处理前 N 张（试跑）")
+    args = parser.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    out = Path(args.out).resolve() if args.out else root.with_name(root.name + "_labels")
+    out.mkdir(parents=True, exist_ok=True)
+    progress_path = out / "progress.jsonl"
+
+    done = _load_progress(progress_path)
+    images = [p.as_posix() for p in find_images(root, exclude=out)]
+    todo = [p for p in images if p not in done][:args.limit]
+    print(f"[auto_label] 共 {len(images)} 张，已完成 {len(done)}，本次处理 {len(todo)}")
+
+    opts = {"root": str(root), "out": str(out), "weight": args.weight, "conf": args.conf,
+            "imgsz": args.imgsz, "input_order": args.input_order, "swap_rb": args.swap_rb,
+            "threads": max(1, (os.cpu_count() or 1) // args.workers)}
+
+    t0 = time.monotonic()
+    n = 0
+    if todo:
+        import multiprocessing as mp
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(args.workers, initializer=_init_worker, initargs=(opts,)) as pool, \
+                progress_path.open("a") as prog:
+            # 类别表来自模型，主进程不加载模型，向任一 worker 取
+            if not (out / "classes.txt").exists():
+                names = pool.apply(_class_names)
+                _write_atomic(out / "classes.txt", "".join(f"{names[i]}\n" for i in sorted(names)))
+            for records in pool.imap_unordered(_label_batch, _batches(todo, args.batch)):
+                for r in records:
+                    prog.write(json.dumps(r, ensure_ascii=False) + "\n")
+                    done[r["file"]] = r
+                prog.flush()
+                n += len(records)
+                dt = time.monotonic() - t0
+                if n % (args.batch * args.workers * 10) < len(records):
+                    print(f"[auto_label] {n}/{len(todo)}  {n / dt * 3600:.0f} 张/小时")
+
+    dt = time.monotonic() - t0
+    summary = summarize(list(done.values()), args.review_conf)
+    summary["throughput_per_hour"] = round(n / dt * 3600) if n and dt > 0 else None
+    _write_atomic(out / "review.txt", "".join(f"{f}\n" for f in summary["review"]))
+    _write_atomic(out / "summary.json", json.dumps({k: v for k, v in summary.items() if k != "review"},
+                                                   ensure_ascii=False, indent=1))
+    print(f"[auto_label] 完成：{summary['images']} 张，{summary['boxes']} 个框，"
+          f"{len(summary['review'])} 张待复核 → {out}")
+    for c, s in summary["per_class"].items():
+        print(f"  {c:<16} {s['count']:>7}  conf_mean={s['conf_mean']:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
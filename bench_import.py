@@ -0,0 +1,75 @@
+"""
+bench_import.py
+~~~~~~~~~~~~~~~
+冷启动 import 耗时基准，防止重量级依赖（ultralytics / torch）重新被拉进模块加载路径。
+
+Usage:
+    python bench_import.py              # 默认预算
+    python bench_import.py --budget-ms 800 --repeat 5
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 模块 → 冷启动预算（毫秒）；只 import 本项目模块，不构造任何对象
+BUDGETS_MS = {
+    "scrcpy_env": 1500,
+    "game_detector": 200,
+    "game_state": 300,
+    "collect_frames": 1500,
+}
+
+# 这些模块在上述 import 之后不应出现在 sys.modules 中
+FORBIDDEN = ("ultralytics", "torch")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import importlib; importlib.import_module({mod!r})
+dt = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"ms": dt, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(mod: str, repeat: int) -> dict:
+    """每次都起新解释器，测得的是真正的冷启动。"""
+    times, loaded = [], set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(mod=mod, forbidden=FORBIDDEN)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        res = json.loads(out)
+        times.append(res["ms"])
+        loaded.update(res["loaded"])
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "loaded": sorted(loaded)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="模块冷启动 import 耗时基准")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=None, help="统一覆盖所有模块的预算")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for mod, budget in BUDGETS_MS.items():
+        budget = args.budget_ms or budget
+        try:
+            res = measure(mod, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ {mod:<16} import 失败:\n{e.stderr}")
+            failed = True
+            continue
+        ok = res["median_ms"] <= budget and not res["loaded"]
+        failed |= not ok
+        extra = f"  重依赖被加载: {', '.join(res['loaded'])}" if res["loaded"] else ""
+        print(f"{'✅' if ok else '❌'} {mod:<16} {res['median_ms']:8.1f} ms "
+              f"(min {res['min_ms']:.1f}, 预算 {budget:.0f}){extra}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+bench_motion.py
+~~~~~~~~~~~~~~~
+在录制好的帧上对比各运动估计器的耗时与判定一致性（以 ORB 为基准）。
+
+Usage:
+    python bench_motion.py ./frames --limit 500
+"""
+from __future__ import annotations
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from checker_monitor import ColorCheckerMonitor, MOTION_ESTIMATORS
+
+
+def _frame_key(p: Path):
+    # frame_12.png / 2_frame_12.png 按数字顺序排列
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", p.stem)]
+
+
+def load_frames(folder: Path, limit: int):
+    paths = sorted(folder.glob("*.png"), key=_frame_key)[:limit]
+    frames = [cv2.imread(str(p)) for p in paths]
+    # 与解码器输出保持一致：RGB
+    return [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in frames if f is not None]
+
+
+def run(method: str, frames, roi):
+    monitor = ColorCheckerMonitor(roi, method=method)
+    times, moved = [], []
+    for f in frames:
+        t0 = time.perf_counter()
+        m, _, _ = monitor.check_movement(f)
+        times.append((time.perf_counter() - t0) * 1000)
+        moved.append(bool(m))
+    return np.array(times[1:]), np.array(moved[1:])    # 首帧只用于初始化
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="运动估计器基准")
+    parser.add_argument("folder", type=Path, help="录制帧目录（save_frame / collect_frames 的输出）")
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.folder, args.limit)
+    if len(frames) < 2:
+        print(f"❌ 帧数量不足: {args.folder}")
+        return 1
+
+    h, w = frames[0].shape[:2]
+    roi = (int(w/2), int(h/2), 300, 150)
+    print(f"帧数 {len(frames)}  尺寸 {w}x{h}  ROI {roi}")
+
+    results = {m: run(m, frames, roi) for m in MOTION_ESTIMATORS}
+    ref_moved = results["orb"][1]
+    for m, (times, moved) in results.items():
+        agree = (moved == ref_moved).mean() * 100
+        print(f"{m:<6} mean {times.mean():7.3f} ms  p95 {np.percentile(times, 95):7.3f} ms  "
+              f"与 orb 一致 {agree:5.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
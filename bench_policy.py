@@ -0,0 +1,103 @@
+"""
+bench_policy.py
+~~~~~~~~~~~~~~~
+按观测模式 × 特征提取器测量策略网络在 CPU 上的吞吐：
+
+* act   ：batch=1 前向（每个 env step 的推理成本）
+* train ：batch=64 前向 + 反向 + 优化器一步（PPO 更新成本）
+
+Usage:
+    python bench_policy.py --iters 20 --threads 4
+"""
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+import torch
+from gymnasium.spaces import Box, Discrete
+from stable_baselines3.common.policies import ActorCriticCnnPolicy
+
+from scrcpy_env import ObservationMode
+from train_agent import FEATURE_EXTRACTORS
+
+FRAME_WH = (1088, 489)
+FRAME_STACK = 4
+
+# 名称 → ObservationMode 参数
+MODES = {
+    "rgb_full":   {},
+    "gray_full":  {"grayscale": True},
+    "gray_ds2":   {"grayscale": True, "downscale": 2},
+    "gray_ds4":   {"grayscale": True, "downscale": 4},
+    "rgb_ds4":    {"downscale": 4},
+}
+
+
+def _policy(obs_shape, extractor: str):
+    kwargs = {}
+    if extractor != "nature":
+        kwargs = {"features_extractor_class": FEATURE_EXTRACTORS[extractor],
+                  "features_extractor_kwargs": {"features_dim": 256}}
+    return ActorCriticCnnPolicy(Box(0, 255, obs_shape, np.uint8), Discrete(11),
+                                lr_schedule=lambda _: 3e-4, **kwargs)
+
+
+def bench(obs_shape, extractor: str, iters: int, batch: int):
+    policy = _policy(obs_shape, extractor)
+    n_params = sum(p.numel() for p in policy.parameters())
+
+    obs1 = torch.randint(0, 256, (1, *obs_shape), dtype=torch.uint8)
+    with torch.no_grad():
+        policy(obs1)
+        t0 = time.perf_counter()
+        for _ in range(iters):
+            policy(obs1)
+        act_ms = (time.perf_counter() - t0) / iters * 1000
+
+    obs = torch.randint(0, 256, (batch, *obs_shape), dtype=torch.uint8)
+    actions = torch.randint(0, 11, (batch,))
+    policy.set_training_mode(True)
+
+    def train_step():
+        values, logp, ent = policy.evaluate_actions(obs, actions)
+        loss = -logp.mean() + values.pow(2).mean() - 0.01 * ent.mean()
+        policy.optimizer.zero_grad()
+        loss.backward()
+        policy.optimizer.step()
+
+    train_step()
+    t0 = time.perf_counter()
+    for _ in range(max(1, iters // 4)):
+        train_step()
+    train_sps = batch * max(1, iters // 4) / (time.perf_counter() - t0)
+    return n_params, act_ms, train_sps
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="策略网络 CPU 吞吐基准")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0, help="torch 线程数，0 为默认")
+    parser.add_argument("--modes", nargs="*", default=list(MODES))
+    args = parser.parse_args(argv)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print(f"{'mode':<10} {'extractor':<9} {'obs shape':<18} {'params':>10} "
+          f"{'act ms':>8} {'train samples/s':>16}")
+    for name in args.modes:
+        mode = ObservationMode(**MODES[name])
+        h, w = mode.frame_shape(FRAME_WH)
+        obs_shape = (FRAME_STACK * mode.channels, h, w)
+        for extractor in ("nature", *FEATURE_EXTRACTORS):
+            try:
+                n, act_ms, sps = bench(obs_shape, extractor, args.iters, args.batch)
+            except RuntimeError as e:       # 例如 NatureCNN 在过小输入上卷积尺寸不足
+                print(f"{name:<10} {extractor:<9} {str(obs_shape):<18} 失败: {e}")
+                continue
+            print(f"{name:<10} {extractor:<9} {str(obs_shape):<18} {n:>10,} {act_ms:>8.2f} {sps:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
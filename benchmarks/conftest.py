@@ -0,0 +1,145 @@
+"""
+benchmarks/conftest.py
+~~~~~~~~~~~~~~~~~~~~~~
+无手机的端到端性能基准（pytest-benchmark）：
+
+* FakeDevice 在本地端口回放合成（或录制的）H.264 裸流，VideoDecoder 直接连接
+* fake_adb 以 `adb` 的名字放到 PATH 最前面，记录注入的输入，可配置延迟
+* 每项指标与 benchmarks/baseline.json 比较，超出容差即失败
+
+Usage:
+    pip install -r requirements-dev.txt
+    python -m pytest benchmarks -q                        # 与基准比较
+    python -m pytest benchmarks -q --update-baseline      # 在本机重新记录基准
+    BENCH_CLIP=match.h264 python -m pytest benchmarks     # 用录制的对局码流
+"""
+from __future__ import annotations
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+FRAME_WH = (1088, 489)
+SCREEN_WH = (2712, 1220)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("brawlbot benchmarks")
+    group.addoption("--update-baseline", action="store_true", help="把本次结果写入 baseline.json")
+    group.addoption("--bench-tolerance", type=float, default=0.25, help="允许的相对退化，默认 25%")
+
+
+def _free_port(kind=socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ───────────────────── 退化检查 ─────────────────────
+class Regression:
+    def __init__(self, baseline: dict, tolerance: float, update: bool):
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.update = update
+        self.results = {}
+
+    def check(self, name: str, value: float, unit: str, higher_is_better: bool) -> None:
+        self.results[name] = {"value": round(value, 3), "unit": unit, "higher_is_better": higher_is_better}
+        base = self.baseline.get(name)
+        if self.update or base is None:
+            return
+        ref = base["value"]
+        if higher_is_better:
+            limit = ref * (1 - self.tolerance)
+            assert value >= limit, f"{name} 退化: {value:.2f} {unit} < {limit:.2f}（基准 {ref}）"
+        else:
+            limit = ref * (1 + self.tolerance)
+            assert value <= limit, f"{name} 退化: {value:.2f} {unit} > {limit:.2f}（基准 {ref}）"
+
+
+@pytest.fixture(scope="session")
+def regression(request):
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    reg = Regression(baseline, request.config.getoption("--bench-tolerance"),
+                     request.config.getoption("--update-baseline"))
+    yield reg
+    if reg.update and reg.results:
+        BASELINE_PATH.write_text(json.dumps({**baseline, **reg.results}, indent=1, ensure_ascii=False) + "\n")
+
+
+# ───────────────────── 替身设备 ─────────────────────
+@pytest.fixture(scope="session")
+def ctrl_port() -> int:
+    return _free_port(socket.SOCK_DGRAM)
+
+
+@pytest.fixture(scope="session")
+def fake_adb(tmp_path_factory, ctrl_port):
+    """把 fake_adb 装到 PATH 最前面；返回日志文件路径。"""
+    from fake_adb import install_shim
+
+    d = tmp_path_factory.mktemp("fake_adb")
+    log = d / "adb.log"
+    saved = {k: os.environ.get(k) for k in ("PATH", "FAKE_DEVICE_CTRL", "FAKE_ADB_LOG")}
+    os.environ["PATH"] = install_shim(d) + os.pathsep + os.environ["PATH"]
+    os.environ["FAKE_DEVICE_CTRL"] = str(ctrl_port)
+    os.environ["FAKE_ADB_LOG"] = str(log)
+    os.environ.setdefault("FAKE_ADB_LATENCY_MS", "0")
+    yield log
+    for k, v in saved.items():
+        if v is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = v
+
+
+@pytest.fixture(scope="session")
+def clip(tmp_path_factory) -> str:
+    recorded = os.environ.get("BENCH_CLIP")
+    if recorded:
+        return recorded
+    from fake_device import make_synthetic_clip
+    return make_synthetic_clip(str(tmp_path_factory.mktemp("clip") / "synthetic.h264"), size=FRAME_WH)
+
+
+@pytest.fixture(scope="session")
+def clip_device(clip):
+    """不限速回放裸流：解码吞吐只受解码器本身约束。"""
+    from fake_device import FakeDevice
+
+    dev = FakeDevice(_free_port(), _free_port(socket.SOCK_DGRAM), screen=SCREEN_WH, frame=FRAME_WH,
+                     fps=0, h264=clip)
+    with dev:
+        yield dev
+
+
+@pytest.fixture(scope="session")
+def live_device(ctrl_port, fake_adb):
+    """实时绘制触摸状态的替身设备，fake_adb 的输入发往它。"""
+    from fake_device import FakeDevice
+
+    with FakeDevice(_free_port(), ctrl_port, screen=SCREEN_WH, frame=FRAME_WH, fps=60) as dev:
+        yield dev
+
+
+class NullDetector:
+    """不跑模型的检测器，用来单独衡量 env.step 其余部分的开销。"""
+
+    def detect(self, frame, **kw):
+        return []
+
+    detect_now = detect
+
+    def reset(self):
+        pass
+
+    def bbox_center2screen_pos(self, bbox):
+        x1, y1, x2, y2 = bbox
+        return int((x1 + x2) / 2), int((y1 + y2) / 2)
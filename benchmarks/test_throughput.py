@@ -0,0 +1,124 @@
+"""
+端到端吞吐 / 延迟基准。每项用 pytest-benchmark 计时，再交给 regression 与基准比较。
+"""
+from __future__ import annotations
+import itertools
+import time
+from pathlib import Path
+
+import pytest
+
+from conftest import FRAME_WH, ROOT, NullDetector
+
+FRAMES_PER_ROUND = 60
+
+
+def _mean_s(benchmark) -> float:
+    return benchmark.stats.stats.mean
+
+
+# ───────────────────── 解码 ─────────────────────
+def test_decoder_fps(benchmark, clip_device, regression):
+    from scrcpy_video import VideoDecoder
+
+    dec = VideoDecoder("127.0.0.1", clip_device.port, resize=FRAME_WH)
+    try:
+        assert dec.read(timeout=5.0) is not None, "替身设备没有推流"
+
+        def decode_n():
+            start = dec.n_frames
+            while dec.n_frames - start < FRAMES_PER_ROUND:
+                time.sleep(0.0005)
+
+        benchmark.pedantic(decode_n, rounds=10, warmup_rounds=1)
+    finally:
+        dec.close()
+    fps = FRAMES_PER_ROUND / _mean_s(benchmark)
+    benchmark.extra_info["fps"] = fps
+    regression.check("decoder_fps", fps, "fps", higher_is_better=True)
+
+
+# ───────────────────── 输入注入 ─────────────────────
+@pytest.mark.parametrize("backend", ["adb", "adb_shell"])
+def test_adb_actions_per_s(benchmark, backend, live_device, regression):
+    from adb_control import AdbControl, AdbShellControl
+
+    ctrl = {"adb": AdbControl, "adb_shell": AdbShellControl}[backend](None)
+    points = itertools.cycle([(400, 930), (580, 930), (400, 750)])
+
+    def inject_one():
+        # adb_shell 写完 stdin 就返回：等到替身设备真正收到这条输入才算一次动作
+        start = live_device.n_events
+        ctrl.touch_move(*next(points))
+        deadline = time.monotonic() + 5.0
+        while live_device.n_events == start:
+            assert time.monotonic() < deadline, "替身设备没有收到输入"
+            time.sleep(0.0001)
+
+    try:
+        benchmark.pedantic(inject_one, rounds=30, warmup_rounds=2)
+    finally:
+        if hasattr(ctrl, "close"):
+            ctrl.close()
+    assert ctrl.device_is_connected
+    rate = 1.0 / _mean_s(benchmark)
+    benchmark.extra_info["actions_per_s"] = rate
+    regression.check(f"{backend}_actions_per_s", rate, "actions/s", higher_is_better=True)
+
+
+# ───────────────────── 检测器 ─────────────────────
+@pytest.fixture(scope="module")
+def yolo_detector():
+    pytest.importorskip("ultralytics")
+    weight = ROOT / "best.pt"
+    if not weight.exists():
+        pytest.skip("缺少 best.pt")
+    from game_detector import GameDetector
+
+    det = GameDetector(str(weight))
+    det.warmup(frame_shape=(FRAME_WH[1], FRAME_WH[0], 3))
+    return det
+
+
+def test_detector_latency(benchmark, clip_device, yolo_detector, regression):
+    from frame_context import FrameContext
+    from scrcpy_video import VideoDecoder
+
+    dec = VideoDecoder("127.0.0.1", clip_device.port, resize=FRAME_WH)
+    try:
+        frame = dec.read(timeout=5.0)
+    finally:
+        dec.close()
+    # 每轮新建上下文，不让 letterbox 缓存掩盖预处理成本
+    benchmark.pedantic(lambda: yolo_detector.detect(FrameContext(frame)), rounds=20, warmup_rounds=2)
+    ms = _mean_s(benchmark) * 1000
+    regression.check("detector_latency_ms", ms, "ms", higher_is_better=False)
+
+
+# ───────────────────── 整步 ─────────────────────
+@pytest.mark.parametrize("detector_kind", ["null", "yolo"])
+def test_env_step(benchmark, detector_kind, live_device, tmp_path, monkeypatch, request, regression):
+    from adb_control import AdbControl
+    from scrcpy_env import ScrcpyEnv
+    from scrcpy_video import VideoDecoder
+
+    detector = NullDetector() if detector_kind == "null" else request.getfixturevalue("yolo_detector")
+    monkeypatch.chdir(tmp_path)             # save_frame 写 ./frames/
+    Path("frames").mkdir()
+
+    dec = VideoDecoder("127.0.0.1", live_device.port, resize=FRAME_WH)
+    env = ScrcpyEnv(dec, AdbControl(None), detector, None, resize=FRAME_WH, motion_method="phase")
+    try:
+        first = dec.read(timeout=5.0)
+        assert first is not None, "替身设备没有推流"
+        # 跳过 reset() 里的菜单流程，直接进入对局中状态
+        env._last_frame = first
+        for _ in range(env.frame_stack):
+            env.frames.append(env.obs_mode.apply(first))
+        actions = itertools.cycle(range(env.action_space.n))
+        benchmark.pedantic(lambda: env.step(next(actions)), rounds=30, warmup_rounds=3)
+    finally:
+        dec.close()
+    sps = 1.0 / _mean_s(benchmark)
+    benchmark.extra_info["steps_per_s"] = sps
+    regression.check(f"env_step_{detector_kind}_per_s", sps, "steps/s", higher_is_better=True)
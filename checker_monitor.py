@@ -1,26 +1,41 @@
+import logging
+
 import cv2
 import numpy as np
 
-class ColorCheckerMonitor:
-    def __init__(self, roi, min_inliers=10, inlier_ratio_threshold=0.3, move_threshold=5.0):
-        """
-        初始化校色标记监测器
+from frame_context import FrameContext
+from telemetry import kv
 
-        参数:
-            roi: 校色标记区域 (x, y, w, h)
-            min_inliers: 最小内点数量阈值
-            inlier_ratio_threshold: 内点比例阈值
-            move_threshold: 移动阈值(像素)
-        """
-        print("初始化校色标记监测器", roi)
+log = logging.getLogger("brawlbot.monitor")
+
+
+# ───────────────────── 运动估计器 ─────────────────────
+class MotionEstimator:
+    """
+    运动估计接口：输入当前帧 ROI 的灰度图，返回 (moved, offset, center)。
+    center 为 ROI 中心在当前帧中的位置（整帧坐标），估计失败时为 None。
+    """
+
+    def __init__(self, roi, move_threshold=5.0):
         self.roi = roi
-        self.min_inliers = min_inliers
-        self.inlier_ratio_threshold = inlier_ratio_threshold
         self.move_threshold = move_threshold
-
-        # 计算参考标记中心点（基于ROI）
         x, y, w, h = roi
         self.ref_center = np.array([x + w//2, y + h//2], dtype=np.float32)
+
+    def estimate(self, roi_gray):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class OrbMotionEstimator(MotionEstimator):
+    """ORB 特征 + 暴力匹配 + RANSAC 单应性（原始实现，精度高但较慢）。"""
+
+    def __init__(self, roi, move_threshold=5.0, min_inliers=10, inlier_ratio_threshold=0.3):
+        super().__init__(roi, move_threshold)
+        self.min_inliers = min_inliers
+        self.inlier_ratio_threshold = inlier_ratio_threshold
         self.prev_center = self.ref_center.copy()
 
         # 初始化特征检测器和匹配器
@@ -33,40 +48,40 @@ class ColorCheckerMonitor:
         self.ref_desc = None
         self.initialized = False  # 标记是否完成初始化
 
-    def _initialize_reference(self, frame_gray):
+    def reset(self):
+        self.prev_center = self.ref_center.copy()
+        self.initialized = False
+
+    def _initialize_reference(self, roi_gray):
         """使用当前帧初始化参考特征"""
-        x, y, w, h = self.roi
-        self.ref_roi = frame_gray[y:y+h, x:x+w]
+        self.ref_roi = roi_gray
 
         # 提取参考特征
         self.ref_kp, self.ref_desc = self.detector.detectAndCompute(self.ref_roi, None)
 
         if self.ref_desc is None or len(self.ref_kp) < 4:
-            print("警告: 初始化参考帧失败，特征点不足，等待下一帧")
+            log.debug("初始化参考帧失败，特征点不足，等待下一帧")
             return False
 
-        print(f"参考帧初始化成功! 检测到 {len(self.ref_kp)} 个特征点")
+        log.debug("参考帧初始化成功", extra=kv(n_kp=len(self.ref_kp)))
         self.initialized = True
         return True
 
-    def check_movement(self, frame):
-        # 转换为灰度图
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def estimate(self, roi_gray):
         x, y, w, h = self.roi
-        cur_roi = gray[y:y+h, x:x+w]
 
         # 尚未初始化参考帧：尝试初始化
         if not self.initialized:
-            success = self._initialize_reference(gray)
+            self._initialize_reference(roi_gray)
             # 无论是否成功初始化，当前帧不视为移动
             return False, 0.0, None
 
         # 检测当前帧特征点
-        cur_kp, cur_desc = self.detector.detectAndCompute(cur_roi, None)
+        cur_kp, cur_desc = self.detector.detectAndCompute(roi_gray, None)
 
         # 特征点不足处理
         if cur_desc is None or len(cur_kp) < 4:
-            print("警告: 当前帧特征点不足，保留参考帧")
+            log.debug("当前帧特征点不足，保留参考帧")
             return True, float('inf'), None
 
         # 匹配特征点
@@ -74,7 +89,7 @@ class ColorCheckerMonitor:
 
         # 匹配点不足处理
         if len(matches) < 4:
-            print(f"警告: 匹配点不足({len(matches)}个)，更新参考帧")
+            log.debug("匹配点不足，更新参考帧", extra=kv(n_matches=len(matches)))
             self._update_reference(cur_kp, cur_desc)
             return True, float('inf'), None
 
@@ -91,7 +106,8 @@ class ColorCheckerMonitor:
 
         # 检查匹配质量
         if inliers < self.min_inliers or inlier_ratio < self.inlier_ratio_threshold:
-            print(f"警告: 匹配质量差(内点:{inliers}/{len(matches)}，比例:{inlier_ratio:.2f})，更新参考帧")
+            log.debug("匹配质量差，更新参考帧",
+                      extra=kv(inliers=inliers, n_matches=len(matches), inlier_ratio=inlier_ratio))
             self._update_reference(cur_kp, cur_desc)
             return True, float('inf'), None
 
@@ -117,4 +133,105 @@ class ColorCheckerMonitor:
     def _update_reference(self, kp, desc):
         """更新参考帧特征"""
         self.ref_kp = kp
-        self.ref_desc = desc
\ No newline at end of file
+        self.ref_desc = desc
+
+
+class PhaseCorrMotionEstimator(MotionEstimator):
+    """
+    相位相关：对缓存的上一帧 ROI 与当前 ROI 做 FFT 互相关，直接得到整体平移。
+    先按 downscale 缩小 ROI，单次估计在亚毫秒级。
+    """
+
+    def __init__(self, roi, move_threshold=5.0, downscale=2, min_response=0.05):
+        super().__init__(roi, move_threshold)
+        self.downscale = max(1, int(downscale))
+        self.min_response = min_response      # 相关峰过低说明画面整体切换，无法估计
+        _, _, w, h = roi
+        self._size = (max(8, w // self.downscale), max(8, h // self.downscale))
+        self._window = cv2.createHanningWindow(self._size, cv2.CV_32F)
+        self._prev = None
+
+    def reset(self):
+        self._prev = None
+
+    def _prepare(self, roi_gray):
+        if self.downscale > 1:
+            roi_gray = cv2.resize(roi_gray, self._size, interpolation=cv2.INTER_AREA)
+        return roi_gray.astype(np.float32)
+
+    def estimate(self, roi_gray):
+        cur = self._prepare(roi_gray)
+        prev, self._prev = self._prev, cur
+        if prev is None:
+            return False, 0.0, None
+
+        (dx, dy), response = cv2.phaseCorrelate(prev, cur, self._window)
+        if response < self.min_response:
+            return True, float('inf'), None
+
+        shift = np.array([dx, dy], dtype=np.float32) * self.downscale
+        offset = float(np.hypot(shift[0], shift[1]))
+        return offset > self.move_threshold, offset, self.ref_center + shift
+
+
+class FlowMotionEstimator(PhaseCorrMotionEstimator):
+    """缩小后的 Farneback 稠密光流，取中位数位移；对局部遮挡比相位相关更稳。"""
+
+    def __init__(self, roi, move_threshold=5.0, downscale=4):
+        super().__init__(roi, move_threshold, downscale=downscale)
+
+    def _prepare(self, roi_gray):
+        return cv2.resize(roi_gray, self._size, interpolation=cv2.INTER_AREA)
+
+    def estimate(self, roi_gray):
+        cur = self._prepare(roi_gray)
+        prev, self._prev = self._prev, cur
+        if prev is None:
+            return False, 0.0, None
+
+        flow = cv2.calcOpticalFlowFarneback(prev, cur, None, 0.5, 2, 9, 2, 5, 1.1, 0)
+        shift = np.median(flow.reshape(-1, 2), axis=0) * self.downscale
+        offset = float(np.hypot(shift[0], shift[1]))
+        return offset > self.move_threshold, offset, self.ref_center + shift
+
+
+MOTION_ESTIMATORS = {
+    "orb": OrbMotionEstimator,
+    "phase": PhaseCorrMotionEstimator,
+    "flow": FlowMotionEstimator,
+}
+
+
+# ───────────────────── 监测器 ─────────────────────
+class ColorCheckerMonitor:
+    def __init__(self, roi, min_inliers=10, inlier_ratio_threshold=0.3, move_threshold=5.0,
+                 method="orb", **estimator_kwargs):
+        """
+        初始化校色标记监测器
+
+        参数:
+            roi: 校色标记区域 (x, y, w, h)
+            min_inliers: 最小内点数量阈值（仅 orb）
+            inlier_ratio_threshold: 内点比例阈值（仅 orb）
+            move_threshold: 移动阈值(像素)
+            method: 运动估计方法 "orb" / "phase" / "flow"，或 MotionEstimator 实例
+        """
+        log.info("初始化校色标记监测器 roi=%s method=%s", roi, method)
+        self.roi = roi
+        self.move_threshold = move_threshold
+
+        if isinstance(method, MotionEstimator):
+            self.estimator = method
+        elif method == "orb":
+            self.estimator = OrbMotionEstimator(
+                roi, move_threshold, min_inliers, inlier_ratio_threshold)
+        else:
+            self.estimator = MOTION_ESTIMATORS[method](roi, move_threshold, **estimator_kwargs)
+
+    def check_movement(self, frame):
+        # 只对 ROI 做灰度转换（与其他模块共用 FrameContext 缓存）
+        cur_roi = FrameContext.wrap(frame).gray_roi(self.roi)
+        return self.estimator.estimate(cur_roi)
+
+    def reset(self):
+        self.estimator.reset()
@@ -0,0 +1,171 @@
+"""
+checkpoint.py
+~~~~~~~~~~~~~
+异步检查点与断点续训：
+
+* 训练线程里只做一次内存快照（参数 / 优化器状态拷到 CPU），序列化与写盘交给后台线程
+* 先写 *.tmp 再 os.replace 原子改名，评估服务与续训永远读不到半截文件
+* 只保留最近 keep_last 个
+* restore() 恢复策略参数、优化器、num_timesteps / _n_updates 以及各回调自身的状态
+  （如熵系数调度），配合 train_agent --resume 让长时间训练扛过 ADB 掉线与崩溃
+"""
+from __future__ import annotations
+import os
+import queue
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+
+__all__ = ["AsyncCheckpointCallback", "latest_checkpoint", "restore", "load_policy"]
+
+_STEP_RE = re.compile(r"_(\d+)_steps\.pt$")
+
+
+def _cpu_clone(obj):
+    """递归拷贝到 CPU，快照与训练中的张量彻底脱钩。"""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _cpu_clone(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_cpu_clone(v) for v in obj)
+    return obj
+
+
+def _step_of(path: Path) -> int:
+    m = _STEP_RE.search(path.name)
+    return int(m.group(1)) if m else -1
+
+
+def latest_checkpoint(save_path: str | Path, name_prefix: str = "") -> Optional[Path]:
+    files = [p for p in Path(save_path).glob(f"{name_prefix}*_steps.pt") if _step_of(p) >= 0]
+    return max(files, key=_step_of) if files else None
+
+
+# ───────────────────── 回调 ─────────────────────
+class AsyncCheckpointCallback(BaseCallback):
+    def __init__(
+        self,
+        save_freq: int,
+        save_path: str,
+        name_prefix: str = "rl_model",
+        keep_last: int = 5,
+        stateful_callbacks: Optional[Dict[str, BaseCallback]] = None,
+        verbose: int = 0,
+    ):
+        """
+        参数:
+            save_freq: 每多少次 step 存一次
+            keep_last: 磁盘上保留最近的检查点个数
+            stateful_callbacks: {名字: 回调}，回调需实现 state_dict() / load_state_dict()
+        """
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = Path(save_path)
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.stateful_callbacks = stateful_callbacks or {}
+
+        # 只排队一个快照：写盘跟不上时丢弃旧快照，训练线程绝不等待
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=1)
+        self._writer: Optional[threading.Thread] = None
+
+    def _init_callback(self) -> None:
+        self.save_path.mkdir(parents=True, exist_ok=True)
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+
+    def _on_step(self) -> bool:
+        if self.n_calls % self.save_freq == 0:
+            self.snapshot()
+        return True
+
+    def _on_training_end(self) -> None:
+        self.snapshot()
+        self._queue.put(None)
+        self._writer.join()
+
+    def snapshot(self) -> None:
+        model = self.model
+        state = {
+            "policy": _cpu_clone(model.policy.state_dict()),
+            "optimizer": _cpu_clone(model.policy.optimizer.state_dict()),
+            "num_timesteps": model.num_timesteps,
+            "n_updates": getattr(model, "_n_updates", 0),
+            "episode_num": getattr(model, "_episode_num", 0),
+            "ent_coef": getattr(model, "ent_coef", None),
+            # 未完成的 rollout 不落盘（体积是观测的 n_steps 倍），续训时从新的 rollout 开始
+            "rollout_pos": getattr(getattr(model, "rollout_buffer", None), "pos", 0),
+            "callbacks": {k: cb.state_dict() for k, cb in self.stateful_callbacks.items()},
+            # 评估服务据此在不构造环境的情况下重建策略
+            "policy_class": type(model.policy),
+            "policy_kwargs": model.policy_kwargs,
+            "observation_space": model.observation_space,
+            "action_space": model.action_space,
+        }
+        path = self.save_path / f"{self.name_prefix}_{model.num_timesteps}_steps.pt"
+        try:
+            self._queue.put_nowait((path, state))
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._queue.put_nowait((path, state))
+
+    # ---------------- 后台写盘 ----------------
+    def _writer_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, state = item
+            tmp = path.with_suffix(".tmp")
+            try:
+                torch.save(state, tmp)
+                os.replace(tmp, path)
+                self._prune()
+                if self.verbose:
+                    print(f"[checkpoint] 已保存 {path}")
+            except Exception as e:
+                print(f"[checkpoint] ⚠️ 保存失败 {path}: {e}")
+
+    def _prune(self) -> None:
+        files = sorted(self.save_path.glob(f"{self.name_prefix}_*_steps.pt"), key=_step_of)
+        for p in files[:-self.keep_last]:
+            p.unlink(missing_ok=True)
+
+
+# ───────────────────── 恢复 ─────────────────────
+def restore(model, path: str | Path, stateful_callbacks: Optional[Dict[str, BaseCallback]] = None) -> Dict:
+    """把检查点恢复进已构造好的模型，返回原始 state 以便调用方查看。"""
+    state = torch.load(path, map_location=model.device, weights_only=False)
+    model.policy.load_state_dict(state["policy"])
+    model.policy.optimizer.load_state_dict(state["optimizer"])
+    model.num_timesteps = state["num_timesteps"]
+    model._n_updates = state["n_updates"]
+    model._episode_num = state["episode_num"]
+    if state.get("ent_coef") is not None:
+        model.ent_coef = state["ent_coef"]
+    for k, cb in (stateful_callbacks or {}).items():
+        if k in state["callbacks"]:
+            cb.load_state_dict(state["callbacks"][k])
+    print(f"[checkpoint] 已从 {path} 恢复，num_timesteps={model.num_timesteps}")
+    return state
+
+
+def load_policy(path: str | Path, device: str = "cpu"):
+    """仅重建策略网络（评估 / 推理用），不需要环境。"""
+    state = torch.load(path, map_location=device, weights_only=False)
+    policy = state["policy_class"](
+        state["observation_space"],
+        state["action_space"],
+        lr_schedule=lambda _: 0.0,
+        **(state["policy_kwargs"] or {}),
+    )
+    policy.load_state_dict(state["policy"])
+    return policy.to(device)
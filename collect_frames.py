@@ -1,56 +1,216 @@
+"""
+collect_frames.py
+~~~~~~~~~~~~~~~~~
+采集数据集画面：只保留和最近保留帧差异足够大的帧，后台线程池编码写盘。
+
+* 去重：dhash（64 位差值哈希，汉明距离）或 diff（缩小灰度图的平均绝对差），
+  与最近 history 张已保留帧逐一比较，最小距离超过阈值才保留
+* 每次运行一个会话目录，按 shard_size 分片；manifest.jsonl 每行一张图，
+  session.json 记录参数与统计
+
+目录结构::
+
+    frames/
+      20260101-120000/
+        shard_0000/000000.png ...
+        manifest.jsonl          {"file", "frame", "ts", "dist", "fp"}
+        session.json
+
+Usage:
+    python collect_frames.py                        # 参数见 config.yaml 的 collect 段
+    python collect_frames.py --method diff --threshold 4 --tag lobby
+    python collect_frames.py --threshold 0          # 不去重，与旧版一样每 interval 存一张
+"""
+from __future__ import annotations
+import argparse
+import json
+import threading
 import time
-import yaml
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Dict, Optional, Tuple
+
 import cv2
-from scrcpy_env     import ScrcpyEnv
-from env_launcher   import ScrcpyLauncher
-from scrcpy_video import VideoDecoder
-from adb_control import AdbControl
-
-r = 0.7
-ATTACK_BTN = (2280, 750)
-SKILL_BTN  = (1940, 890)
-DEFEAT_BTN = (1403, 1133)
-GO_ON_BTN  = (2450, 1130)
-PLAY_AGIN_BTN  = (2000, 1130)
-BATTLE_BTN  = (1720/r, 790/r)
+import numpy as np
+import yaml
 
-if __name__ == "__main__":
+from frame_context import FrameContext
 
-    with open('config.yaml') as f:
-        config = yaml.safe_load(f)
+__all__ = ["FrameDeduper", "SessionWriter", "DEFAULT_COLLECT_CONFIG"]
+
+DEFAULT_COLLECT_CONFIG = {
+    "out": "./frames",
+    "method": "dhash",      # dhash | diff
+    "threshold": None,      # None 取各方法的默认值
+    "history": 8,           # 与最近多少张已保留帧比较
+    "interval": 0.1,        # 两次采样的最小间隔（秒）
+    "workers": 4,
+    "shard_size": 1000,
+    "format": "png",        # png | jpg
+    "jpeg_quality": 95,
+}
+
+DEFAULT_THRESHOLDS = {"dhash": 6, "diff": 3.0}
+_DIFF_SIZE = (64, 36)
+
+
+class FrameDeduper:
+    """判断一帧是否与最近保留的帧“足够不同”。"""
+
+    def __init__(self, method: str = "dhash", threshold: Optional[float] = None, history: int = 8):
+        if method not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"未知去重方法: {method}")
+        self.method = method
+        self.threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        self.recent: Deque = deque(maxlen=max(1, history))
 
-        SCREEN_DIM = config["display"]["screen"]
-        FRAME_DIM = config["display"]["frame"]
-        ADB_BRIDGE = config["adb_bridge"]
+    def fingerprint(self, frame: np.ndarray):
+        if self.method == "dhash":
+            g = cv2.cvtColor(cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+            bits = (g[:, 1:] > g[:, :-1]).ravel()
+            return int.from_bytes(np.packbits(bits).tobytes(), "big")
+        g = cv2.cvtColor(cv2.resize(frame, _DIFF_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+        return g.astype(np.int16)
 
-        host  = config["adb_bridge"]["host"]
-        port  = config["adb_bridge"]["port"]
-        serial = config["adb_bridge"]["serial"]
+    def distance(self, a, b) -> float:
+        if self.method == "dhash":
+            return float(bin(a ^ b).count("1"))
+        return float(np.abs(a - b).mean())
 
-        k =  SCREEN_DIM[0]/FRAME_DIM[0] #2.511111111111111
+    def check(self, frame: np.ndarray) -> Tuple[bool, float, object]:
+        """返回 (是否保留, 与最近保留帧的最小距离, 指纹)；保留时指纹进入历史。"""
+        fp = self.fingerprint(frame)
+        dist = min((self.distance(fp, r) for r in self.recent), default=float("inf"))
+        keep = dist > self.threshold or self.threshold <= 0
+        if keep:
+            self.recent.append(fp)
+        return keep, dist, fp
 
-        def save_frame(episode, frame_num, frame):
 
-                path = "./frames/"+str(episode)+"_frame_" + str(frame_num) + ".png"
-                cv2.imwrite(path, frame)
+class SessionWriter:
+    """会话目录 + 分片 + 线程池编码；cv2.imencode / 写文件都会释放 GIL。"""
 
-        launcher = ScrcpyLauncher(
-            video_port=1234,
-        )
+    def __init__(self, root: str | Path, shard_size: int = 1000, workers: int = 4,
+                 fmt: str = "png", jpeg_quality: int = 95, tag: Optional[str] = None):
+        session = time.strftime("%Y%m%d-%H%M%S") + (f"_{tag}" if tag else "")
+        self.dir = Path(root) / session
+        self.dir.mkdir(parents=True, exist_ok=False)
+        self.shard_size = shard_size
+        self.ext = "." + fmt
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if fmt == "jpg" else []
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collect")
+        self._slots = threading.BoundedSemaphore(workers * 4)     # 在途帧上限，防止写盘跟不上时内存膨胀
+        self._manifest = open(self.dir / "manifest.jsonl", "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.n_written = 0
+        self.n_failed = 0
+        self.bytes = 0
+
+    def submit(self, idx: int, frame: np.ndarray, record: Dict) -> None:
+        rel = f"shard_{idx // self.shard_size:04d}/{idx:06d}{self.ext}"
+        self._slots.acquire()
+        self._pool.submit(self._write, rel, frame, {"file": rel, **record})
+
+    def _write(self, rel: str, frame: np.ndarray, record: Dict) -> None:
         try:
-            with launcher:
-                decoder = VideoDecoder("localhost", 1234, resize=(FRAME_DIM[0], FRAME_DIM[1]))
-                ctrl = AdbControl(None)
-                Episode = 2
-                frame_num = 0
-                while True :
-                    time.sleep(0.1)
-                    frame_num += 1
-                    frame = decoder.read()
-                    if frame is None: continue
-                    save_frame(Episode, frame_num, frame)
-
-        except KeyboardInterrupt:
-            print("\n[train_agent] 手动中断，已安全退出。")
+            # imwrite / imencode 期望 BGR；解码帧是 RGB
+            ok, buf = cv2.imencode(self.ext, FrameContext.wrap(frame).bgr, self.params)
+            if not ok:
+                raise RuntimeError("imencode 失败")
+            path = self.dir / rel
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(buf.tobytes())
+            with self._lock:
+                self._manifest.write(json.dumps(record) + "\n")
+                self.n_written += 1
+                self.bytes += buf.nbytes
+        except Exception as e:
+            with self._lock:
+                self.n_failed += 1
+            print(f"[collect_frames] 写入 {rel} 失败: {e}")
+        finally:
+            self._slots.release()
+
+    def close(self, summary: Dict) -> None:
+        self._pool.shutdown(wait=True)
+        self._manifest.close()
+        summary = {**summary, "written": self.n_written, "failed": self.n_failed, "bytes": self.bytes}
+        (self.dir / "session.json").write_text(json.dumps(summary, ensure_ascii=False, indent=1))
+
 
+def collect(decoder, writer: SessionWriter, deduper: FrameDeduper, interval: float,
+            duration: Optional[float] = None) -> Dict:
+    """从解码器取新帧，去重后交给 writer；Ctrl-C 或到达 duration 结束。"""
+    seen = kept = 0
+    last_ts = 0
+    t_start = time.monotonic()
+    next_t = t_start
+    try:
+        while duration is None or time.monotonic() - t_start < duration:
+            frame, ts = decoder.wait_frame(last_ts, timeout=1.0)
+            if frame is None:
+                continue
+            last_ts = ts
+            seen += 1
+            keep, dist, fp = deduper.check(frame)
+            if keep:
+                record = {"frame": seen, "ts": round(time.time(), 3), "dist": dist,
+                          "fp": fp if isinstance(fp, int) else None}
+                writer.submit(kept, frame, record)
+                kept += 1
+            if seen % 100 == 0:
+                print(f"[collect_frames] 采样 {seen} 帧，保留 {kept}（{kept / seen:.1%}）")
+            next_t += interval
+            time.sleep(max(0.0, next_t - time.monotonic()))
+    except KeyboardInterrupt:
+        print("\n[collect_frames] 手动中断，正在写完队列中的帧…")
+    return {"seen": seen, "kept": kept, "seconds": round(time.monotonic() - t_start, 1)}
 
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="去重采集数据集画面")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--method", choices=tuple(DEFAULT_THRESHOLDS), default=None)
+    parser.add_argument("--threshold", type=float, default=None, help="dhash: 汉明距离；diff: 平均灰度差；0 不去重")
+    parser.add_argument("--history", type=int, default=None)
+    parser.add_argument("--interval", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=None)
+    parser.add_argument("--format", choices=("png", "jpg"), default=None)
+    parser.add_argument("--tag", default=None, help="附加在会话目录名后")
+    parser.add_argument("--duration", type=float, default=None, help="采集秒数，默认直到 Ctrl-C")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    cfg = {**DEFAULT_COLLECT_CONFIG, **(config.get("collect") or {})}
+    for key in ("out", "method", "threshold", "history", "interval", "workers", "shard_size", "format"):
+        if getattr(args, key) is not None:
+            cfg[key] = getattr(args, key)
+
+    from env_launcher import ScrcpyLauncher
+    from scrcpy_protocol import make_decoder
+
+    frame_wh = tuple(config["display"]["frame"])
+    host = config["adb_bridge"]["host"]
+    deduper = FrameDeduper(cfg["method"], cfg["threshold"], cfg["history"])
+    with ScrcpyLauncher.from_config(config) as launcher:
+        decoder = make_decoder(config, host, launcher.video_port, resize=frame_wh)
+        writer = SessionWriter(cfg["out"], cfg["shard_size"], cfg["workers"], cfg["format"],
+                               cfg["jpeg_quality"], tag=args.tag)
+        print(f"[collect_frames] 会话目录 {writer.dir}（{deduper.method}, 阈值 {deduper.threshold}）")
+        try:
+            stats = collect(decoder, writer, deduper, cfg["interval"], args.duration)
+        finally:
+            decoder.close()
+        writer.close({**stats, "method": deduper.method, "threshold": deduper.threshold,
+                      "history": cfg["history"], "interval": cfg["interval"], "frame": list(frame_wh)})
+    print(f"[collect_frames] 完成：采样 {stats['seen']} 帧，写入 {writer.n_written} 张，"
+          f"{writer.bytes / 2**20:.1f} MiB → {writer.dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,48 @@
 from __future__ import annotations
-import shlex, subprocess, time
+import math, shlex, subprocess, time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Sequence
+
+# 推流默认参数：raw_stream 供 VideoDecoder 直接按裸 H.264 解码
+BASE_SERVER_OPTS = (
+    "tunnel_forward=true audio=false control=false "
+    "cleanup=false raw_stream=true power_on=true"
+)
+# scrcpy 协议模式（ScrcpyProtocolDecoder）：保留 dummy byte、codec meta 与逐包帧头
+PROTOCOL_SERVER_OPTS = (
+    "tunnel_forward=true audio=false control=false cleanup=false power_on=true "
+    "send_device_meta=false send_dummy_byte=true send_codec_meta=true send_frame_meta=true"
+)
+
+
+def derive_stream_options(config) -> dict:
+    """
+    由 config.yaml 推导推流参数：
+    * max_size 取 display.frame 的长边——手机直接按观测尺寸编码，解码端不必再缩放
+    * max_fps = control_hz × fps_margin——env 每秒只消费 control_hz 帧，多出的帧只会被覆盖
+    * video_bit_rate 按 像素 × fps × bits_per_pixel 估算
+    stream 段里写了具体数值的项直接使用，写 auto / 不写则推导。
+    """
+    frame_w, frame_h = config["display"]["frame"]
+    cfg = config.get("stream", {}) or {}
+
+    max_fps = cfg.get("max_fps", "auto")
+    if max_fps in (None, "auto"):
+        max_fps = int(math.ceil(cfg.get("control_hz", 15) * cfg.get("fps_margin", 2)))
+
+    bit_rate = cfg.get("video_bit_rate", "auto")
+    if bit_rate in (None, "auto"):
+        bit_rate = int(frame_w * frame_h * max_fps * cfg.get("bits_per_pixel", 0.1))
+
+    return {
+        "max_size": max(frame_w, frame_h),
+        "max_fps": int(max_fps),
+        "video_bit_rate": int(bit_rate),
+        "video_codec_options": cfg.get("video_codec_options"),
+        "crop": cfg.get("crop"),
+        "server_opts": PROTOCOL_SERVER_OPTS if cfg.get("protocol") == "scrcpy" else BASE_SERVER_OPTS,
+    }
+
 
 class ScrcpyLauncher:
     def __init__(
@@ -11,22 +52,64 @@ class ScrcpyLauncher:
         video_port: int = 27183,
         server_jar: str | Path = "scrcpy-server.jar",
         server_version: str = "3.2",
-        server_opts: str = (
-            "tunnel_forward=true audio=false control=false "
-            "cleanup=false raw_stream=true max_size=1088 power_on=true"
-        ),
+        server_opts: str = BASE_SERVER_OPTS,
         unlock_screen: bool = True,
+        max_size: Optional[int] = 1088,
+        max_fps: Optional[int] = None,
+        video_bit_rate: Optional[int] = None,
+        video_codec_options: Optional[str | Dict[str, object]] = None,
+        crop: Optional[Sequence[int]] = None,
     ):
+        """
+        max_size            : 长边像素，None 为设备原始分辨率
+        max_fps             : 推流帧率上限，None 为设备默认（通常 60）
+        video_bit_rate      : 码率 bit/s，None 为 scrcpy 默认 8 Mbps
+        video_codec_options : MediaCodec 参数，"key=value,..." 或 dict
+        crop                : (w, h, x, y) 设备坐标裁剪；注意触摸坐标仍是整屏坐标
+        """
         self.serial = serial
         self.video_port = video_port
         self.server_jar = Path(server_jar)
         self.server_version = server_version
-        self.server_opts = server_opts
+        self.max_size = max_size
+        self.max_fps = max_fps
+        self.video_bit_rate = video_bit_rate
+        self.video_codec_options = video_codec_options
+        self.crop = tuple(crop) if crop else None
+        self.server_opts = self._build_opts(server_opts)
         self.unlock_screen = unlock_screen
 
         self._adb_base = ["adb"] + (["-s", self.serial] if self.serial else [])
         self._server_proc: subprocess.Popen | None = None
 
+    @classmethod
+    def from_config(cls, config, *, serial: Optional[str] = None, port: Optional[int] = None,
+                    **overrides) -> "ScrcpyLauncher":
+        bridge = config["adb_bridge"]
+        opts = {**derive_stream_options(config), **overrides}
+        return cls(
+            serial=serial if serial is not None else bridge.get("serial") or None,
+            video_port=port if port is not None else bridge["port"],
+            **opts,
+        )
+
+    def _build_opts(self, base: str) -> str:
+        opts = [base]
+        if self.max_size:
+            opts.append(f"max_size={self.max_size}")
+        if self.max_fps:
+            opts.append(f"max_fps={self.max_fps}")
+        if self.video_bit_rate:
+            opts.append(f"video_bit_rate={self.video_bit_rate}")
+        if self.video_codec_options:
+            co = self.video_codec_options
+            if isinstance(co, dict):
+                co = ",".join(f"{k}={v}" for k, v in co.items())
+            opts.append(f"video_codec_options={co}")
+        if self.crop:
+            opts.append("crop=" + ":".join(str(int(v)) for v in self.crop))
+        return " ".join(opts)
+
     # ———————————— 外部接口 ————————————
     def launch(self) -> None:
         self._push_jar()
@@ -55,7 +138,7 @@ class ScrcpyLauncher:
         self._adb(f"push {self.server_jar} /data/local/tmp/")
 
     def _start_server(self):
-        print("[Launcher] 启动 scrcpy-server …")
+        print(f"[Launcher] 启动 scrcpy-server … ({self.server_opts})")
         cmd = (
             f"CLASSPATH=/data/local/tmp/{self.server_jar.name} "
             "app_process / com.genymobile.scrcpy.Server "
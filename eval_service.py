@@ -0,0 +1,211 @@
+"""
+eval_service.py
+~~~~~~~~~~~~~~~
+独立进程的非阻塞评估服务，替代挂在训练环境上的 EvalCallback：
+
+* 轮询检查点目录（AsyncCheckpointCallback 的 *.pt，兼容 SB3 的 *.zip），发现新检查点就加载评估
+* mode="device"：在专用评估设备上跑确定性对局，统计回合奖励
+* mode="replay"：在录制帧上离线评估（预测价值、动作熵与分布），不占用设备；没有真实回报，不更新 best_models/
+* 结果经队列回传，EvalReportCallback 在训练进程里非阻塞地写入 TensorBoard，
+  同时追加到 results.jsonl
+"""
+from __future__ import annotations
+import json
+import queue
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+from telemetry import setup_logging
+
+_STEP_RE = re.compile(r"_(\d+)_steps")
+
+
+def checkpoint_step(path: Path) -> int:
+    """brawl_model_1500_steps.zip → 1500；无法解析时返回 -1。"""
+    m = _STEP_RE.search(path.stem)
+    return int(m.group(1)) if m else -1
+
+
+# ───────────────────── 评估方式 ─────────────────────
+def _load_policy(path: Path):
+    if path.suffix == ".pt":
+        from checkpoint import load_policy
+        return load_policy(path)
+    from stable_baselines3 import PPO
+    return PPO.load(str(path), device="cpu").policy
+
+
+def evaluate_on_device(policy, env, n_episodes: int) -> Dict:
+    returns, lengths = [], []
+    for _ in range(n_episodes):
+        obs, _ = env.reset()
+        done, ep_ret, ep_len = False, 0.0, 0
+        while not done:
+            action, _ = policy.predict(obs, deterministic=True)
+            obs, r, terminated, truncated, _ = env.step(action)
+            done = terminated or truncated
+            ep_ret += r
+            ep_len += 1
+        returns.append(ep_ret)
+        lengths.append(ep_len)
+    return {
+        "mean_reward": float(np.mean(returns)),
+        "std_reward": float(np.std(returns)),
+        "mean_ep_length": float(np.mean(lengths)),
+    }
+
+
+def load_replay_obs(folder: Path, frame_stack: int, resize, limit: int = 256, obs_mode=None) -> np.ndarray:
+    """把录制的 PNG 序列按环境相同的方式预处理并堆叠成 (N, k*C, H, W)。"""
+    import cv2
+    from scrcpy_env import ObservationMode
+    obs_mode = obs_mode or ObservationMode()
+    paths = sorted(folder.glob("*.png"), key=lambda p: [int(t) if t.isdigit() else t
+                                                         for t in re.split(r"(\d+)", p.stem)])
+    frames = []
+    for p in paths[: limit + frame_stack - 1]:
+        img = cv2.imread(str(p))
+        if img is None:
+            continue
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        if (img.shape[1], img.shape[0]) != tuple(resize):
+            img = cv2.resize(img, tuple(resize), interpolation=cv2.INTER_AREA)
+        frames.append(obs_mode.apply(img).transpose(2, 0, 1))
+    stacks = [np.concatenate(frames[i:i + frame_stack], axis=0)
+              for i in range(len(frames) - frame_stack + 1)]
+    return np.stack(stacks) if stacks else np.empty((0,))
+
+
+def evaluate_on_replay(policy, replay_obs: np.ndarray, batch: int = 32) -> Dict:
+    import torch
+    policy.set_training_mode(False)
+    values, entropies, actions = [], [], []
+    with torch.no_grad():
+        for i in range(0, len(replay_obs), batch):
+            obs_t = policy.obs_to_tensor(replay_obs[i:i + batch])[0]
+            dist = policy.get_distribution(obs_t)
+            values.append(policy.predict_values(obs_t).cpu().numpy().ravel())
+            entropies.append(dist.entropy().cpu().numpy().ravel())
+            actions.append(dist.mode().cpu().numpy().reshape(len(obs_t), -1))
+    # MultiDiscrete 按各分量的组合统计（与轨迹里的整数动作编码一致），Discrete 即动作本身
+    actions = np.concatenate(actions).astype(np.int64)
+    nvec = getattr(policy.action_space, "nvec", None)
+    if nvec is not None:
+        flat, n = np.ravel_multi_index(actions.T, nvec), int(np.prod(nvec))
+    else:
+        flat, n = actions[:, 0], int(policy.action_space.n)
+    hist = np.bincount(flat, minlength=n)
+    return {
+        "replay_value_mean": float(np.concatenate(values).mean()),
+        "replay_entropy_mean": float(np.concatenate(entropies).mean()),
+        "replay_action_top_frac": float(hist.max() / max(1, hist.sum())),
+    }
+
+
+# ───────────────────── 服务进程 ─────────────────────
+def eval_service_main(config, checkpoint_dir: str, result_queue, stop_event) -> None:
+    setup_logging(config.get("logging", {}).get("level", "INFO"))     # 子进程不继承日志配置
+    cfg = config.get("eval", {}) or {}
+    mode = cfg.get("mode", "replay")
+    poll_s = cfg.get("poll_interval", 10.0)
+    ckpt_dir = Path(checkpoint_dir)
+    results_path = ckpt_dir / "results.jsonl"
+    seen = set()
+
+    env, launcher, replay_obs = None, None, None
+    if mode == "device":
+        from env_launcher import ScrcpyLauncher
+        from train_agent import build_env
+        launcher = ScrcpyLauncher.from_config(config, serial=cfg.get("serial"), port=cfg["port"])
+        launcher.launch()
+        env = build_env(config, launcher, serial=cfg.get("serial"), port=cfg["port"])
+    else:
+        frame = config["display"]["frame"]
+        from scrcpy_env import ObservationMode
+        frame_stack = (config.get("observation") or {}).get("frame_stack", 4)      # 须与训练环境一致
+        replay_obs = load_replay_obs(Path(cfg.get("replay_dir", "./frames")), frame_stack, frame,
+                                     limit=cfg.get("replay_limit", 256),
+                                     obs_mode=ObservationMode.from_config(config.get("observation")))
+        print(f"[eval_service] 回放样本 {len(replay_obs)} 个")
+
+    best = -float("inf")
+    try:
+        while not stop_event.is_set():
+            pending = sorted((p for ext in ("*.pt", "*.zip") for p in ckpt_dir.glob(ext) if p not in seen),
+                             key=checkpoint_step)
+            if not pending:
+                stop_event.wait(poll_s)
+                continue
+            # 积压时只评估最新的检查点，评估永远不拖后训练
+            for p in pending[:-1]:
+                seen.add(p)
+            path = pending[-1]
+            seen.add(path)
+
+            t0 = time.time()
+            try:
+                policy = _load_policy(path)
+            except FileNotFoundError:
+                continue        # 已被 keep_last 轮转删除
+            if mode == "device":
+                res = evaluate_on_device(policy, env, cfg.get("n_episodes", 3))
+            elif len(replay_obs):
+                res = evaluate_on_replay(policy, replay_obs)
+            else:
+                print("[eval_service] ⚠️ 没有可用的回放帧，跳过评估")
+                continue
+            res.update(step=checkpoint_step(path), checkpoint=path.name, eval_seconds=time.time() - t0)
+
+            # 只按真实对局回报选最优模型；回放模式只有价值头自己的预测，不能用来挑模型
+            score = res.get("mean_reward")
+            if score is not None and score > best:
+                best = score
+                best_dir = Path(cfg.get("best_model_save_path", "./best_models/"))
+                best_dir.mkdir(parents=True, exist_ok=True)
+                shutil.copy(path, best_dir / ("best_model" + path.suffix))
+
+            with results_path.open("a") as f:
+                f.write(json.dumps(res, ensure_ascii=False) + "\n")
+            result_queue.put(res)
+            print(f"[eval_service] {path.name}: {res}")
+    finally:
+        if launcher is not None:
+            launcher.stop()
+
+
+def start_eval_service(config, checkpoint_dir: str):
+    """启动评估子进程，返回 (process, result_queue, stop_event)。"""
+    import multiprocessing as mp
+    ctx = mp.get_context("spawn")
+    result_queue = ctx.Queue()
+    stop_event = ctx.Event()
+    proc = ctx.Process(target=eval_service_main,
+                       args=(config, checkpoint_dir, result_queue, stop_event), daemon=True)
+    proc.start()
+    return proc, result_queue, stop_event
+
+
+# ───────────────────── 训练侧回调 ─────────────────────
+class EvalReportCallback(BaseCallback):
+    """每步非阻塞地取回评估结果，写入 SB3 logger（eval/…）。"""
+
+    def __init__(self, result_queue, verbose: int = 0):
+        super().__init__(verbose)
+        self.result_queue = result_queue
+
+    def _on_step(self) -> bool:
+        while True:
+            try:
+                res = self.result_queue.get_nowait()
+            except queue.Empty:
+                return True
+            for k, v in res.items():
+                if isinstance(v, (int, float)) and k != "step":
+                    self.logger.record(f"eval/{k}", v)
+            self.logger.record("eval/checkpoint_step", res["step"])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+fake_adb.py
+~~~~~~~~~~~
+adb 替身：被 AdbControl / ScrcpyLauncher 当作 `adb` 调用。
+
+* `shell input ...` 转成控制消息发给 FakeDevice 的 UDP 口
+* push / forward / 启动 scrcpy-server 等一律成功（server 命令阻塞到被 terminate）
+* 每条命令追加一行日志（时间戳 + argv），可配置人为延迟
+
+环境变量:
+    FAKE_DEVICE_CTRL     控制口，"port" 或 "host:port"，默认 127.0.0.1:1240
+    FAKE_ADB_LATENCY_MS  每次 adb 调用的额外延迟（模拟 adb 进程启动 + 连接握手）
+    FAKE_ADB_INPUT_MS    每条 `input` 命令在“设备”上的执行耗时（真机上 input 本身要起 app_process）
+    FAKE_ADB_LOG         日志文件；不设则不记录
+    FAKE_ADB_OFFLINE     设为 1 时所有命令返回非零，模拟设备掉线
+
+用法::
+
+    from fake_adb import install_shim
+    os.environ["PATH"] = install_shim("./.fake_adb") + os.pathsep + os.environ["PATH"]
+"""
+from __future__ import annotations
+import os
+import shlex
+import socket
+import stat
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+__all__ = ["install_shim", "to_ctrl_message", "main"]
+
+
+def _ctrl_addr():
+    val = os.environ.get("FAKE_DEVICE_CTRL", "1240")
+    host, _, port = val.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def to_ctrl_message(shell_args: List[str]) -> Optional[str]:
+    """`input motionevent MOVE x y` → "move x y"；不涉及触摸的命令返回 None。"""
+    if len(shell_args) == 1:
+        shell_args = shlex.split(shell_args[0])      # adb shell "input tap 1 2"
+    if len(shell_args) < 2 or shell_args[0] != "input":
+        return None
+    sub, rest = shell_args[1], shell_args[2:]
+    if sub == "tap" and len(rest) >= 2:
+        return f"tap {rest[0]} {rest[1]}"
+    if sub == "motionevent" and rest:
+        kind = rest[0].lower()
+        if kind == "up":
+            return "up"
+        return f"{kind} {rest[1]} {rest[2]}" if len(rest) >= 3 else None
+    if sub == "swipe" and len(rest) >= 4:
+        return f"move {rest[2]} {rest[3]}"
+    if sub == "keyevent" and rest:
+        return f"key {rest[0]}"
+    return None
+
+
+def _run_shell(text: str) -> None:
+    """执行一行 shell 命令；支持 "a; b; c" 形式的批量命令。"""
+    input_ms = float(os.environ.get("FAKE_ADB_INPUT_MS", "0"))
+    for part in text.split(";"):
+        msg = to_ctrl_message(shlex.split(part))
+        if msg is None:
+            continue
+        if input_ms:
+            time.sleep(input_ms / 1000)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(msg.encode(), _ctrl_addr())
+
+
+def _log(argv: List[str]) -> None:
+    path = os.environ.get("FAKE_ADB_LOG")
+    if path:
+        with open(path, "a") as f:
+            f.write(f"{time.monotonic_ns()} {shlex.join(argv)}\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    _log(argv)
+    latency = float(os.environ.get("FAKE_ADB_LATENCY_MS", "0"))
+    if latency:
+        time.sleep(latency / 1000)
+    if os.environ.get("FAKE_ADB_OFFLINE") == "1":
+        print("error: device offline", file=sys.stderr)
+        return 1
+
+    while argv and argv[0] in ("-s", "-P", "-H"):       # 忽略设备/服务器选择
+        argv = argv[2:]
+    if not argv:
+        return 0
+    cmd, rest = argv[0], argv[1:]
+
+    if cmd == "devices":
+        print("List of devices attached\nfake-device\tdevice")
+    elif cmd == "shell":
+        text = " ".join(rest)
+        if "app_process" in text:
+            # scrcpy-server：真机上会一直运行，直到 launcher.stop() terminate
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return 0
+        if rest and rest[0] == "echo":
+            print(" ".join(rest[1:]))
+            return 0
+        if not rest:
+            # 交互式会话（AdbShellControl）：逐行读取命令
+            for line in sys.stdin:
+                _run_shell(line)
+            return 0
+        _run_shell(text)
+    # push / forward / --remove / reverse 等：直接成功
+    return 0
+
+
+def install_shim(directory: str | Path = ".fake_adb") -> str:
+    """在 directory 下生成名为 adb 的可执行包装脚本，返回该目录（放到 PATH 最前面）。"""
+    d = Path(directory).resolve()
+    d.mkdir(parents=True, exist_ok=True)
+    shim = d / "adb"
+    shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{Path(__file__).resolve()}" "$@"\n')
+    shim.chmod(shim.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return str(d)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
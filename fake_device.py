@@ -0,0 +1,309 @@
+"""
+fake_device.py
+~~~~~~~~~~~~~~
+没有手机时的替身设备：
+
+* 本地 TCP 服务，按 scrcpy raw_stream 的格式推送 H.264 Annex-B 码流，VideoDecoder 可直接连接
+* 画面按“触摸状态”实时绘制：按下处画一个圆点，tap 闪一下，摇杆移动即可在帧上看到变化
+* 输入从 UDP 控制口进来（fake_adb.py 发送），可设置显示延迟，用于校验延迟测量工具
+* 也可以直接回放录好的 / 合成的 .h264 裸流（h264=...），fps=0 时不限速，用于解码吞吐基准
+* protocol="scrcpy" 时按 scrcpy 协议发送 dummy byte、codec meta 与逐包帧头（ScrcpyProtocolDecoder）
+
+Usage:
+    python fake_device.py --port 1234 --ctrl-port 1240
+    python fake_device.py --make-clip synthetic.h264 && python fake_device.py --h264 synthetic.h264 --fps 0
+    FAKE_DEVICE_CTRL=1240 PATH=./.fake_adb:$PATH python test_adb.py
+"""
+from __future__ import annotations
+import argparse
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from fractions import Fraction
+from typing import Deque, Optional, Tuple
+
+import av
+import cv2
+import numpy as np
+
+__all__ = ["FakeDevice", "DEFAULT_CTRL_PORT", "make_synthetic_clip"]
+
+DEFAULT_CTRL_PORT = 1240
+
+
+def _even_size(wh: Tuple[int, int]) -> Tuple[int, int]:
+    """libx264 + yuv420p 要求宽高为偶数（1088x489 会在 avcodec_open2 失败），向上取整。"""
+    w, h = wh
+    return w + (w & 1), h + (h & 1)
+
+
+class FakeDevice:
+    def __init__(
+        self,
+        port: int = 1234,
+        ctrl_port: int = DEFAULT_CTRL_PORT,
+        screen: Tuple[int, int] = (2712, 1220),
+        frame: Tuple[int, int] = (1088, 489),
+        fps: int = 60,
+        display_latency_ms: float = 0.0,
+        host: str = "127.0.0.1",
+        clip: Optional[str] = None,
+        h264: Optional[str] = None,
+        protocol: str = "raw",
+    ):
+        """
+        参数:
+            screen            : 设备逻辑分辨率，触摸坐标使用它
+            frame             : 推流分辨率（相当于 scrcpy max_size 之后的尺寸）；
+                                奇数宽高按偶数编码，解码端的 _ALIGN_SLACK 会裁回原尺寸
+            display_latency_ms: 输入到达后延迟多久才画到屏幕上，模拟游戏渲染滞后
+            clip              : 可选背景视频，循环播放；默认是静态灰底
+            h264              : Annex-B 裸流文件，设置后原样循环推送，不再实时绘制（忽略输入）
+            fps               : 推流帧率；<= 0 表示不限速（只受 TCP 背压约束）
+            protocol          : "raw" 裸流 / "scrcpy" 带帧头的 scrcpy 协议
+        """
+        self.host, self.port, self.ctrl_port = host, port, ctrl_port
+        self.screen = screen
+        self.frame_wh = frame
+        self.encode_wh = _even_size(frame)       # 实际绘制 / 编码的尺寸
+        self.fps = fps
+        self.display_latency_ns = int(display_latency_ms * 1e6)
+        self.clip = clip
+        self.h264 = h264
+        self.protocol = protocol
+
+        self._events: Deque[Tuple[int, str, Tuple[int, ...]]] = deque()
+        self._touch: Optional[Tuple[int, int]] = None
+        self._flash_until = 0
+        self.n_events = 0
+        self.n_frames = 0
+
+        self._running = False
+        self._threads = []
+        self._video_sock: Optional[socket.socket] = None
+        self._ctrl_sock: Optional[socket.socket] = None
+
+    # ---------------- 生命周期 ----------------
+    def start(self) -> "FakeDevice":
+        self._running = True
+        self._video_sock = socket.create_server((self.host, self.port))
+        self._video_sock.settimeout(0.5)
+        self._ctrl_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._ctrl_sock.bind((self.host, self.ctrl_port))
+        self._ctrl_sock.settimeout(0.5)
+        for fn in (self._accept_loop, self._ctrl_loop):
+            t = threading.Thread(target=fn, daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[FakeDevice] 视频 tcp://{self.host}:{self.port}  控制 udp://{self.host}:{self.ctrl_port}")
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        for t in self._threads:
+            t.join(timeout=2)
+        for s in (self._video_sock, self._ctrl_sock):
+            if s is not None:
+                s.close()
+        print("[FakeDevice] 已停止")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # ---------------- 输入 ----------------
+    def _ctrl_loop(self) -> None:
+        while self._running:
+            try:
+                data, _ = self._ctrl_sock.recvfrom(256)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.inject(data.decode(errors="ignore"))
+
+    def inject(self, line: str) -> None:
+        """控制消息: "down x y" / "move x y" / "up" / "tap x y" / "key n"（屏幕坐标）。"""
+        parts = line.split()
+        if not parts:
+            return
+        try:
+            args = tuple(int(float(p)) for p in parts[1:])
+        except ValueError:
+            return
+        self._events.append((time.monotonic_ns() + self.display_latency_ns, parts[0].lower(), args))
+        self.n_events += 1
+
+    def _apply_due_events(self, now_ns: int) -> None:
+        while self._events and self._events[0][0] <= now_ns:
+            _, kind, args = self._events.popleft()
+            if kind in ("down", "move") and len(args) >= 2:
+                self._touch = args[:2]
+            elif kind == "up":
+                self._touch = None
+            elif kind == "tap" and len(args) >= 2:
+                self._touch = args[:2]
+                self._flash_until = now_ns + 100_000_000
+
+    # ---------------- 画面 ----------------
+    def _background(self):
+        w, h = self.encode_wh
+        if not self.clip:
+            bg = np.full((h, w, 3), 64, np.uint8)
+            cv2.putText(bg, "fake device", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 200), 2)
+            while True:
+                yield bg
+        while True:
+            with av.open(self.clip) as c:
+                for f in c.decode(video=0):
+                    yield cv2.resize(f.to_ndarray(format="rgb24"), (w, h), interpolation=cv2.INTER_AREA)
+
+    def render(self, bg: np.ndarray, now_ns: int) -> np.ndarray:
+        self._apply_due_events(now_ns)
+        img = bg.copy()
+        if self._touch is not None:
+            sx = self.encode_wh[0] / self.screen[0]
+            sy = self.encode_wh[1] / self.screen[1]
+            cx, cy = int(self._touch[0] * sx), int(self._touch[1] * sy)
+            color = (255, 255, 0) if now_ns < self._flash_until else (255, 255, 255)
+            cv2.circle(img, (cx, cy), 18, color, -1)
+        return img
+
+    # ---------------- 推流 ----------------
+    def _encoder(self):
+        codec = av.CodecContext.create("libx264", "w")
+        codec.width, codec.height = self.encode_wh
+        codec.pix_fmt = "yuv420p"
+        codec.time_base = Fraction(1, self.fps)
+        codec.framerate = Fraction(self.fps, 1)
+        codec.options = {"preset": "ultrafast", "tune": "zerolatency", "g": str(self.fps)}
+        return codec
+
+    def _accept_loop(self) -> None:
+        while self._running:
+            try:
+                conn, _ = self._video_sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            # 一次只服务一个客户端，与 scrcpy-server 相同；断开后等待下一次 link_av
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                if self.protocol == "scrcpy":
+                    w, h = self.encode_wh
+                    conn.sendall(b"\x00" + struct.pack(">III", 0x68323634, w, h))   # dummy byte + codec meta
+                payloads = self._h264_packets() if self.h264 else self._live_packets()
+                self._send_paced(conn, payloads)
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+            finally:
+                conn.close()
+
+    def _live_packets(self):
+        """实时绘制 + 编码；每次 yield 一帧对应的码流字节。"""
+        codec = self._encoder()
+        backgrounds = self._background()
+        pts = 0
+        while True:
+            img = self.render(next(backgrounds), time.monotonic_ns())
+            vf = av.VideoFrame.from_ndarray(img, format="rgb24")
+            vf.pts = pts
+            pts += 1
+            packets = codec.encode(vf)
+            yield b"".join(bytes(p) for p in packets), any(p.is_keyframe for p in packets)
+
+    def _h264_packets(self):
+        """裸流按访问单元切分后预读进内存，循环回放。"""
+        with av.open(self.h264, format="h264") as c:
+            packets = [(bytes(p), p.is_keyframe) for p in c.demux(video=0) if p.size]
+        if not packets:
+            raise RuntimeError(f"[FakeDevice] {self.h264} 中没有 H.264 数据")
+        while True:
+            yield from packets
+
+    def _send_paced(self, conn: socket.socket, payloads) -> None:
+        period = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_t = t_start = time.monotonic()
+        framed = self.protocol == "scrcpy"
+        for data, key in payloads:
+            if not self._running:
+                break
+            if data and framed:
+                pts_us = int((time.monotonic() - t_start) * 1e6)
+                flags = pts_us | (1 << 62 if key else 0)
+                conn.sendall(struct.pack(">QI", flags, len(data)) + data)
+            elif data:
+                conn.sendall(data)
+            self.n_frames += 1
+            if not period:
+                continue
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_t = time.monotonic()       # 编码跟不上时不追帧
+
+
+def make_synthetic_clip(path: str, n_frames: int = 240, size: Tuple[int, int] = (1088, 489),
+                        fps: int = 60) -> str:
+    """
+    生成一段带运动内容的 Annex-B .h264 裸流（首帧为 IDR，可无缝循环）。
+    奇数宽高按偶数编码（见 _even_size），解码端按 _ALIGN_SLACK 裁回 size。
+    """
+    w, h = _even_size(size)
+    codec = av.CodecContext.create("libx264", "w")
+    codec.width, codec.height = w, h
+    codec.pix_fmt = "yuv420p"
+    codec.time_base = Fraction(1, fps)
+    codec.options = {"preset": "ultrafast", "tune": "zerolatency", "g": str(fps)}
+    yy, xx = np.mgrid[0:h, 0:w]
+    with open(path, "wb") as f:
+        for i in range(n_frames):
+            img = np.empty((h, w, 3), np.uint8)
+            img[..., 0] = (xx + i * 4) % 256
+            img[..., 1] = (yy + i * 2) % 256
+            img[..., 2] = 96
+            cx = int(w / 2 + w / 3 * np.cos(2 * np.pi * i / n_frames))
+            cv2.circle(img, (cx, h // 2), 40, (255, 255, 255), -1)
+            vf = av.VideoFrame.from_ndarray(img, format="rgb24")
+            vf.pts = i
+            for p in codec.encode(vf):
+                f.write(bytes(p))
+        for p in codec.encode(None):
+            f.write(bytes(p))
+    return path
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="替身设备：本地 H.264 推流 + UDP 触摸输入")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--ctrl-port", type=int, default=DEFAULT_CTRL_PORT)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--display-latency-ms", type=float, default=0.0)
+    parser.add_argument("--clip", default=None, help="循环播放的背景视频")
+    parser.add_argument("--h264", default=None, help="直接回放的 Annex-B 裸流")
+    parser.add_argument("--make-clip", default=None, help="生成合成 .h264 裸流后退出")
+    parser.add_argument("--protocol", choices=("raw", "scrcpy"), default="raw")
+    args = parser.parse_args(argv)
+
+    if args.make_clip:
+        print(f"[FakeDevice] 已生成 {make_synthetic_clip(args.make_clip)}")
+        return
+
+    with FakeDevice(args.port, args.ctrl_port, fps=args.fps, display_latency_ms=args.display_latency_ms,
+                    clip=args.clip, h264=args.h264, protocol=args.protocol):
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
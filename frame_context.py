@@ -0,0 +1,109 @@
+"""
+frame_context.py
+~~~~~~~~~~~~~~~~
+每个解码帧一个 FrameContext：按需计算并缓存派生视图（BGR / 灰度 / 缩放 / ROI / letterbox），
+检测器、移动监测、状态分类器共用同一份，同一帧的每种变换最多做一次。
+
+颜色约定：VideoDecoder 输出的是 RGB，FrameContext.rgb 即原始帧；
+需要 OpenCV 习惯的 BGR（imwrite 等）时一律取 .bgr。
+"""
+from __future__ import annotations
+from typing import Dict, Hashable, Optional, Tuple
+import time
+import cv2
+import numpy as np
+
+__all__ = ["FrameContext"]
+
+
+class FrameContext:
+    def __init__(self, rgb: np.ndarray, frame_id: Optional[int] = None, ts: Optional[float] = None):
+        self.rgb = rgb
+        self.frame_id = frame_id
+        self.ts = time.monotonic() if ts is None else ts
+        self._cache: Dict[Hashable, object] = {}
+
+    @classmethod
+    def wrap(cls, frame) -> "FrameContext":
+        """兼容旧接口：传入 ndarray 时临时包一层。"""
+        return frame if isinstance(frame, cls) else cls(frame)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.rgb.shape
+
+    def _memo(self, key, fn):
+        val = self._cache.get(key)
+        if val is None:
+            val = fn()
+            self._cache[key] = val
+        return val
+
+    # ---------------- 颜色空间 ----------------
+    @property
+    def bgr(self) -> np.ndarray:
+        return self._memo("bgr", lambda: cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR))
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self._memo("gray", lambda: cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY))
+
+    # ---------------- 区域 ----------------
+    def rgb_roi(self, roi: Tuple[int, int, int, int]) -> np.ndarray:
+        """roi = (x, y, w, h)，返回视图，不拷贝。"""
+        x, y, w, h = roi
+        return self.rgb[y:y+h, x:x+w]
+
+    def gray_roi(self, roi: Tuple[int, int, int, int]) -> np.ndarray:
+        """
+        ROI 灰度图。整帧灰度已算过就直接切片；否则只转换这一块，
+        避免为了一个小 ROI 转整帧。
+        """
+        x, y, w, h = roi
+        if "gray" in self._cache:
+            return self._cache["gray"][y:y+h, x:x+w]
+        return self._memo(("gray_roi", tuple(roi)),
+                          lambda: cv2.cvtColor(self.rgb_roi(roi), cv2.COLOR_RGB2GRAY))
+
+    # ---------------- 缩放 ----------------
+    def downscaled(self, factor: int = 2, gray: bool = False) -> np.ndarray:
+        def fn():
+            src = self.gray if gray else self.rgb
+            h, w = src.shape[:2]
+            return cv2.resize(src, (w // factor, h // factor), interpolation=cv2.INTER_AREA)
+        return self._memo(("down", factor, gray), fn)
+
+    def processed(self, crop: Optional[Tuple[int, int, int, int]] = None,
+                  downscale: int = 1, gray: bool = False) -> np.ndarray:
+        """观测用视图：先裁剪 (x, y, w, h)，再转灰度，最后按整数倍缩小。"""
+        def fn():
+            if gray:
+                src = self.gray_roi(crop) if crop else self.gray
+            else:
+                src = self.rgb_roi(crop) if crop else self.rgb
+            if downscale > 1:
+                h, w = src.shape[:2]
+                src = cv2.resize(src, (w // downscale, h // downscale), interpolation=cv2.INTER_AREA)
+            return src
+        key = ("processed", tuple(crop) if crop else None, downscale, gray)
+        return self._memo(key, fn)
+
+    def letterbox(self, imgsz: int = 1088, stride: int = 32, order: str = "bgr"):
+        """
+        与 ultralytics LetterBox(auto=True) 相同的等比缩放 + 最小填充。
+        返回 (img, ratio, (pad_w, pad_h))；把结果交给 YOLO 时它自己的 letterbox 退化为空操作。
+        """
+        def fn():
+            src = self.bgr if order == "bgr" else self.rgb
+            h, w = src.shape[:2]
+            r = min(imgsz / h, imgsz / w)
+            new_w, new_h = int(round(w * r)), int(round(h * r))
+            dw, dh = (imgsz - new_w) % stride, (imgsz - new_h) % stride
+            img = src if (new_w, new_h) == (w, h) else cv2.resize(
+                src, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+            top, left = dh // 2, dw // 2
+            if dw or dh:
+                img = cv2.copyMakeBorder(img, top, dh - top, left, dw - left,
+                                         cv2.BORDER_CONSTANT, value=(114, 114, 114))
+            return img, r, (left, top)
+        return self._memo(("letterbox", imgsz, stride, order), fn)
@@ -1,6 +1,8 @@
 # game_detector.py
-from ultralytics import YOLO
 from enum import Enum
+import numpy as np
+
+from frame_context import FrameContext
 
 # ───────────────────── 枚举定义 ─────────────────────
 class GameState(str, Enum):
@@ -14,28 +16,74 @@ class GameState(str, Enum):
     LOBBY = "lobby"
 
 class GameDetector:
-    def __init__(self, weight="best.pt", device=0, k=1):
+    def __init__(self, weight="best.pt", device=0, k=1, input_order="rgb"):
+        # ultralytics 会连带 import torch，放到构造时再加载，
+        # 只 import 本模块（如 collect_frames.py）不必付出这笔启动开销
+        from ultralytics import YOLO
+
         self.device = device            # 0 / "0,1" / "cpu"
         self.model = YOLO(weight)       # 不再手动 .to()
         self.k = k                      # 屏幕分辨率与帧图片分辨率的比例
+        # 送入模型的通道顺序。旧版 save_frame 把 RGB 帧当 BGR 写盘，
+        # 用这些图片训练出的 best.pt 实际吃的是 RGB 排列，故默认 "rgb"；
+        # 用修正后（真 BGR）图片训练的新权重应配置为 "bgr"
+        self.input_order = input_order
+
+    def warmup(self, frame_shape=(489, 1088, 3), n=2, imgsz=1088):
+        """
+        用全零帧跑 n 次推理，提前触发模型融合、内存分配与算子初始化，
+        避免第一步真实 step 承担这部分延迟。
+        """
+        dummy = np.zeros(frame_shape, dtype=np.uint8)
+        for _ in range(n):
+            self.detect(dummy, imgsz=imgsz)
+
+    @property
+    def names(self):
+        """类别 id → 名称（模型自带的类别表）。"""
+        return self.model.names
 
     def detect(self, frame, conf=0.4, imgsz=1088):
+        ctx = FrameContext.wrap(frame)
+        # letterbox 结果缓存在 FrameContext 上，YOLO 内部的 letterbox 变为空操作
+        img, r, pad = ctx.letterbox(imgsz, order=self.input_order)
         result = self.model.predict(
-            source=frame,
+            source=img,
             imgsz=imgsz,
             conf=conf,
             # device=self.device,
             verbose=False
         )[0]
+        return self._to_dets(result, ctx, r, pad)
+
+    def detect_batch(self, frames, conf=0.4, imgsz=1088):
+        """一次前向处理多帧（离线标注用），返回与 frames 对应的检测列表。"""
+        ctxs = [FrameContext.wrap(f) for f in frames]
+        boxes = [c.letterbox(imgsz, order=self.input_order) for c in ctxs]
+        results = self.model.predict(
+            source=[img for img, _, _ in boxes],
+            imgsz=imgsz,
+            conf=conf,
+            verbose=False
+        )
+        return [self._to_dets(res, c, r, pad) for res, c, (_, r, pad) in zip(results, ctxs, boxes)]
 
-        return [
-            {
+    @staticmethod
+    def _to_dets(result, ctx, r, pad):
+        pad_w, pad_h = pad
+        h, w = ctx.shape[:2]
+        dets = []
+        for b in result.boxes:
+            x1, y1, x2, y2 = b.xyxy[0].tolist()
+            # 从 letterbox 坐标映射回原帧坐标
+            x1, x2 = (x1 - pad_w) / r, (x2 - pad_w) / r
+            y1, y2 = (y1 - pad_h) / r, (y2 - pad_h) / r
+            dets.append({
                 "cls":  result.names[int(b.cls)],
                 "conf": float(b.conf),
-                "xyxy": tuple(int(v) for v in b.xyxy[0])
-            }
-            for b in result.boxes
-        ]
+                "xyxy": (int(max(0, x1)), int(max(0, y1)), int(min(w, x2)), int(min(h, y2))),
+            })
+        return dets
 
     def bbox_center2screen_pos(self, bbox):
         # 中心点（图片坐标系）
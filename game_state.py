@@ -3,9 +3,14 @@ import cv2
 import numpy as np
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 
-__all__ = ["GameState", "get_game_state", "load_templates"]
+from frame_context import FrameContext
+
+__all__ = [
+    "GameState", "StateClassifier", "STATE_REGISTRY",
+    "register_state", "get_game_state", "load_templates",
+]
 
 # ───────────────────── 枚举定义 ─────────────────────
 class GameState(str, Enum):
@@ -17,31 +22,36 @@ class GameState(str, Enum):
     LOBBY = "lobby"
 
 
-# ───────────────────── 模板资源 ─────────────────────
+# ───────────────────── 状态注册表 ─────────────────────
 _ASSET_DIR = Path(__file__).parent / "assets"
-_DEFAULT_TEMPLATES = {
-    # GameState.VICTORY: _ASSET_DIR / "victory_tpl.png",
-    GameState.DEFEAT:  _ASSET_DIR / "defeat_tpl.png",
-    GameState.SETTLE:  _ASSET_DIR / "settle_tpl.png",
-    GameState.GO_ON:  _ASSET_DIR / "go_on.png",
-    GameState.LOBBY:  _ASSET_DIR / "loby.png",
-}
 
-_ROI = {
-    # GameState.VICTORY: (slice(0, 600), slice(1400, 2712)),   # (y_slice, x_slice)
-    GameState.DEFEAT:  (slice(765, 835), slice(930, 1045)),
-    GameState.SETTLE:  (slice(752, 844), slice(1260, 1560)),
-    GameState.GO_ON:  (slice(752, 844), slice(1590, 1890)),
-    GameState.LOBBY:  (slice(720, 844), slice(1516, 1905)),
+# 模板与 ROI 都是按手机屏幕分辨率采集的，使用时再缩放到实际帧尺寸
+SCREEN_SIZE: Tuple[int, int] = (2712, 1220)
+
+# state → {template: 路径, roi: (x1, y1, x2, y2) 屏幕坐标, thresh: 匹配阈值}
+# 字典顺序即冷启动时的判别顺序
+STATE_REGISTRY: Dict[GameState, Dict] = {
+    # GameState.VICTORY: {"template": _ASSET_DIR / "victory_tpl.png", "roi": (1400, 0, 2712, 600), "thresh": 0.80},
+    GameState.LOBBY:  {"template": _ASSET_DIR / "loby.png",       "roi": (1516, 720, 1905, 844), "thresh": 0.95},
+    GameState.DEFEAT: {"template": _ASSET_DIR / "defeat_tpl.png", "roi": (930, 765, 1045, 835),  "thresh": 0.95},
+    GameState.GO_ON:  {"template": _ASSET_DIR / "go_on.png",      "roi": (1590, 752, 1890, 844), "thresh": 0.95},
+    GameState.SETTLE: {"template": _ASSET_DIR / "settle_tpl.png", "roi": (1260, 752, 1560, 844), "thresh": 0.95},
 }
 
+# 屏幕分辨率下的灰度模板
 _TPL_GRAY: Dict[GameState, np.ndarray] = {}
 
-# _THRESH:   Dict[GameState, float] = {
-#     GameState.VICTORY: 0.80,
-#     GameState.DEFEAT:  0.80,
-#     GameState.SETTLE:  0.80,
-# }
+
+def register_state(
+    state: GameState,
+    template: Path | str,
+    roi: Tuple[int, int, int, int],
+    thresh: float = 0.95,
+) -> None:
+    """新增或覆盖一个模板状态。roi 为屏幕坐标 (x1, y1, x2, y2)。"""
+    STATE_REGISTRY[state] = {"template": Path(template), "roi": tuple(roi), "thresh": thresh}
+    _TPL_GRAY.pop(state, None)
+    _default_classifier.invalidate()
 
 
 def load_templates(custom_map: Dict[GameState, Path | str] | None = None) -> None:
@@ -52,70 +62,154 @@ def load_templates(custom_map: Dict[GameState, Path | str] | None = None) -> Non
     custom_map : dict
         可传入 {GameState: "path/to/file.png"} 覆盖默认路径。
     """
-    path_map = _DEFAULT_TEMPLATES.copy()
     if custom_map:
-        path_map.update({k: Path(v) for k, v in custom_map.items()})
-
-    for state, p in path_map.items():
+        for k, v in custom_map.items():
+            if k not in STATE_REGISTRY:
+                print(f"[game_state] ⚠️ 未注册的状态 {k}，忽略其模板 {v}")
+                continue
+            STATE_REGISTRY[k]["template"] = Path(v)
+
+    for state, spec in STATE_REGISTRY.items():
+        p = spec["template"]
         img = cv2.imread(str(p), cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise FileNotFoundError(f"[game_state] 模板不存在或无法读取: {p}")
         _TPL_GRAY[state] = img
         print(f"[game_state] 模板尺寸: {state} {img.shape}")
     print(f"[game_state] 模板加载完毕: {', '.join(s.name for s in _TPL_GRAY)}")
+    _default_classifier.invalidate()
 
 
-# 在 import 时就尝试加载默认模板；找不到会在首次调用时抛错误
-try:
-    load_templates()
-except FileNotFoundError as e:
-    print(e)
-    print("[game_state] ⚠️ 未找到默认模板，请调用 load_templates() 指定路径后再用 get_game_state().")
+def _ensure_templates() -> None:
+    """首次调用 get_game_state() 时才从磁盘读取默认模板，import 不再触发 IO。"""
+    if _TPL_GRAY:
+        return
+    try:
+        load_templates()
+    except FileNotFoundError as e:
+        print(e)
+        print("[game_state] ⚠️ 未找到默认模板，请调用 load_templates() 指定路径后再用 get_game_state().")
 
 
-# ───────────────────── 主判别函数 ─────────────────────
-def _match(gray: np.ndarray, tpl: np.ndarray) -> float:
-    """返回模板匹配最大相似度（0~1）。"""
-    res = cv2.matchTemplate(gray, tpl, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, _ = cv2.minMaxLoc(res)
-    print(f"[game_state] _match value :  {max_val:.3f}")
-    return max_val
-
-def _roi(gray: np.ndarray, state: GameState) -> np.ndarray:
-    print(f"[game_state] 模板匹配区域: {state}")
-    ys, xs = _ROI[state]
-    return gray[ys, xs]
+# ───────────────────── 预编译分类器 ─────────────────────
+class StateClassifier:
+    """
+    模板匹配状态分类器，可作为 YOLO 之前的亚毫秒级预筛。
+
+    * 首帧按实际帧尺寸把模板与 ROI 一次性缩放好（compile）
+    * 每帧只对所有 ROI 的并集做一次灰度转换
+    * 按最近命中频率排序判别顺序，命中即提前返回
+    """
+
+    def __init__(self, screen_size: Tuple[int, int] = SCREEN_SIZE, decay: float = 0.9):
+        self.screen_size = screen_size
+        self.decay = decay                        # 命中频率的指数衰减系数
+        self._frame_hw: Optional[Tuple[int, int]] = None
+        self._union: Tuple[int, int, int, int] = (0, 0, 0, 0)
+        self._compiled: Dict[GameState, Tuple[Tuple[slice, slice], np.ndarray, float]] = {}
+        self._order: List[GameState] = []
+        self._score: Dict[GameState, float] = {}
+
+    def invalidate(self) -> None:
+        """模板或注册表变化后，下一帧重新编译。"""
+        self._frame_hw = None
+
+    def compile(self, frame_hw: Tuple[int, int]) -> None:
+        h, w = frame_hw
+        sx = w / self.screen_size[0]
+        sy = h / self.screen_size[1]
+
+        boxes, tpls = {}, {}
+        for state, spec in STATE_REGISTRY.items():
+            tpl = _TPL_GRAY.get(state)
+            if tpl is None:
+                continue
+            tw = min(w, max(1, round(tpl.shape[1] * sx)))
+            th = min(h, max(1, round(tpl.shape[0] * sy)))
+            tpls[state] = cv2.resize(tpl, (tw, th), interpolation=cv2.INTER_AREA)
+
+            x1, y1, x2, y2 = spec["roi"]
+            x1, x2 = int(x1 * sx), int(np.ceil(x2 * sx))
+            y1, y2 = int(y1 * sy), int(np.ceil(y2 * sy))
+            # 取整后 ROI 不能比模板还小；贴着右 / 下边缘时把起点往回挪，而不是截短终点
+            x1, y1 = max(0, min(x1, w - tw)), max(0, min(y1, h - th))
+            x2 = min(w, max(x2, x1 + tw))
+            y2 = min(h, max(y2, y1 + th))
+            boxes[state] = (x1, y1, x2, y2)
+
+        if boxes:
+            arr = np.array(list(boxes.values()))
+            ux1, uy1 = arr[:, 0].min(), arr[:, 1].min()
+            ux2, uy2 = arr[:, 2].max(), arr[:, 3].max()
+        else:
+            ux1 = uy1 = ux2 = uy2 = 0
+        self._union = (int(ux1), int(uy1), int(ux2), int(uy2))
+
+        # ROI 改写为相对并集区域的切片
+        self._compiled = {
+            state: (
+                (slice(y1 - uy1, y2 - uy1), slice(x1 - ux1, x2 - ux1)),
+                tpls[state],
+                STATE_REGISTRY[state]["thresh"],
+            )
+            for state, (x1, y1, x2, y2) in boxes.items()
+        }
+        self._score = {s: self._score.get(s, 0.0) for s in self._compiled}
+        self._order = list(self._compiled)
+        self._frame_hw = (h, w)
+
+    def set_threshold(self, state: GameState, thresh: float) -> None:
+        STATE_REGISTRY[state]["thresh"] = thresh
+        self.invalidate()
+
+    def scores(self, frame_rgb: np.ndarray) -> Dict[GameState, float]:
+        """调试用：返回每个状态的匹配得分，不提前退出。"""
+        gray = self._union_gray(frame_rgb)
+        return {s: self._match(gray, s) for s in self._order}
+
+    def classify(self, frame_rgb: np.ndarray) -> GameState:
+        gray = self._union_gray(frame_rgb)
+        for state in self._order:
+            _, _, thresh = self._compiled[state]
+            if self._match(gray, state) > thresh:
+                self._hit(state)
+                return state
+        self._hit(GameState.BATTLE)
+        return GameState.BATTLE
+
+    # ---------------- 内部 ----------------
+    def _union_gray(self, frame_rgb) -> np.ndarray:
+        ctx = FrameContext.wrap(frame_rgb)
+        if self._frame_hw != ctx.shape[:2]:
+            self.compile(ctx.shape[:2])
+        x1, y1, x2, y2 = self._union
+        return ctx.gray_roi((x1, y1, x2 - x1, y2 - y1))
+
+    def _match(self, gray: np.ndarray, state: GameState) -> float:
+        """返回模板匹配最大相似度（0~1）。"""
+        (ys, xs), tpl, _ = self._compiled[state]
+        res = cv2.matchTemplate(gray[ys, xs], tpl, cv2.TM_CCOEFF_NORMED)
+        return cv2.minMaxLoc(res)[1]
+
+    def _hit(self, state: GameState) -> None:
+        for s in self._score:
+            self._score[s] *= self.decay
+        if state in self._score:
+            self._score[state] += 1.0
+        # list.sort 是稳定排序：得分相同时保持原有先后
+        self._order.sort(key=lambda s: -self._score[s])
+
+
+_default_classifier = StateClassifier()
+
 
+# ───────────────────── 主判别函数 ─────────────────────
 def get_game_state(frame_rgb: np.ndarray) -> GameState:
     """
-    根据 RGB ndarray 判别当前状态。
+    根据 RGB ndarray（或 FrameContext）判别当前状态。
     返回 GameState 枚举值。
     """
+    _ensure_templates()
     if not _TPL_GRAY:
         raise RuntimeError("模板未加载，请先调用 load_templates().")
-
-    gray = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2GRAY)   # ← 正确的颜色码
-
-    # 1) 失败检测
-    roi = _roi(gray, GameState.LOBBY)
-    if _match(roi, _TPL_GRAY[GameState.LOBBY]) > 0.95:
-        return GameState.LOBBY
-
-    # 1) 失败检测
-    roi = _roi(gray, GameState.DEFEAT)
-    if _match(roi, _TPL_GRAY[GameState.DEFEAT]) > 0.95:
-        return GameState.DEFEAT
-
-    # 2) 继续按钮
-    roi = _roi(gray, GameState.GO_ON)
-    if _match(roi, _TPL_GRAY[GameState.GO_ON]) > 0.95:
-        return GameState.GO_ON
-
-    # 3) 结算检测
-    roi = _roi(gray, GameState.SETTLE)
-    if _match(roi, _TPL_GRAY[GameState.SETTLE]) > 0.95:
-        return GameState.SETTLE
-
-
-
-    return GameState.BATTLE
+    return _default_classifier.classify(frame_rgb)
@@ -0,0 +1,214 @@
+"""
+latency_probe.py
+~~~~~~~~~~~~~~~~
+动作 → 画面（action-to-photon）延迟标定：
+
+按 test_adb.py 的方式绕摇杆中心扫动，每次注入前记下时间戳，
+然后在 VideoDecoder 的新帧里等摇杆区域出现明显变化，
+两者之差即“这个动作多久之后才体现在观测里”。
+按 控制后端 × 解码线程模式 分组报告分位数。
+
+没有手机时加 --fake：进程内启动 FakeDevice，并把 fake_adb 放到 PATH 最前面。
+
+Usage:
+    python latency_probe.py --fake --n 40
+    python latency_probe.py --serial XXXX --backends adb adb_shell --decode AUTO SLICE
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import yaml
+
+from adb_control import AdbControl, AdbShellControl
+from scrcpy_protocol import make_decoder
+from scrcpy_video import VideoDecoder
+from scrcpy_env import JOY_CX, JOY_CY, JOY_R
+
+BACKENDS = {"adb": AdbControl, "adb_shell": AdbShellControl}
+DECODE_MODES = ("AUTO", "SLICE", "NONE")
+
+
+class Probe:
+    def __init__(self, decoder: VideoDecoder, ctrl: AdbControl, screen, frame,
+                 thresh: float = 8.0, timeout: float = 1.0):
+        self.decoder = decoder
+        self.ctrl = ctrl
+        self.thresh = thresh
+        self.timeout = timeout
+        sx, sy = frame[0] / screen[0], frame[1] / screen[1]
+        r = JOY_R + 60                                  # 摇杆外圈再留一点余量
+        x0, y0 = int((JOY_CX - r) * sx), int((JOY_CY - r) * sy)
+        x1, y1 = int((JOY_CX + r) * sx), int((JOY_CY + r) * sy)
+        self.roi = (max(0, x0), max(0, y0), min(frame[0], x1), min(frame[1], y1))
+
+    def _roi_gray(self, frame: np.ndarray) -> np.ndarray:
+        x0, y0, x1, y1 = self.roi
+        g = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_RGB2GRAY)
+        return cv2.resize(g, (g.shape[1] // 2, g.shape[0] // 2), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def _diff(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.abs(a - b).mean())
+
+    def noise_floor(self, seconds: float = 1.0) -> float:
+        """不注入任何输入时相邻帧的 ROI 差异（p99），用来校验阈值。"""
+        diffs, prev, last_ts = [], None, 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            frame, ts = self.decoder.read_stamped()
+            if frame is None or ts == last_ts:
+                time.sleep(0.001)
+                continue
+            last_ts = ts
+            cur = self._roi_gray(frame)
+            if prev is not None:
+                diffs.append(self._diff(cur, prev))
+            prev = cur
+        return float(np.percentile(diffs, 99)) if diffs else 0.0
+
+    def measure_once(self, x: int, y: int) -> Optional[Dict[str, float]]:
+        frame, _ = self.decoder.read_stamped()
+        if frame is None:
+            return None
+        ref = self._roi_gray(frame)
+
+        t0 = time.monotonic_ns()
+        self.ctrl.touch_move(x, y)
+        t_inject = time.monotonic_ns()
+
+        last_ts = 0
+        deadline = t0 + int(self.timeout * 1e9)
+        while time.monotonic_ns() < deadline:
+            frame, ts = self.decoder.read_stamped(block=False)
+            if frame is None or ts == last_ts or ts <= t0:
+                time.sleep(0.001)
+                continue
+            last_ts = ts
+            if self._diff(self._roi_gray(frame), ref) > self.thresh:
+                return {"inject_ms": (t_inject - t0) / 1e6, "photon_ms": (ts - t0) / 1e6}
+        return None
+
+    def sweep(self, n: int, gap: float, angle_step: float) -> Dict[str, List[float]]:
+        self.ctrl.touch_down(JOY_CX, JOY_CY)
+        time.sleep(0.5)
+        out = {"inject_ms": [], "photon_ms": [], "misses": 0}
+        angle = 0.0
+        for _ in range(n):
+            angle += angle_step
+            x = int(JOY_CX + JOY_R * math.cos(angle))
+            y = int(JOY_CY + JOY_R * math.sin(angle))
+            res = self.measure_once(x, y)
+            if res is None:
+                out["misses"] += 1
+            else:
+                out["inject_ms"].append(res["inject_ms"])
+                out["photon_ms"].append(res["photon_ms"])
+            time.sleep(gap)                 # 等画面稳定，避免两次注入的效果叠在一起
+        self.ctrl.touch_up()
+        return out
+
+
+def _pct(xs: List[float], q: float) -> float:
+    return float(np.percentile(xs, q)) if xs else float("nan")
+
+
+@contextlib.contextmanager
+def fake_environment(args, config):
+    from fake_adb import install_shim
+    from fake_device import FakeDevice
+
+    os.environ["PATH"] = install_shim(".fake_adb") + os.pathsep + os.environ["PATH"]
+    os.environ["FAKE_DEVICE_CTRL"] = str(args.ctrl_port)
+    os.environ["FAKE_ADB_LATENCY_MS"] = str(args.fake_adb_ms)
+    os.environ["FAKE_ADB_INPUT_MS"] = str(args.fake_input_ms)
+    protocol = (config.get("stream", {}) or {}).get("protocol", "raw")
+    with FakeDevice(args.port, args.ctrl_port, screen=tuple(config["display"]["screen"]),
+                    frame=tuple(config["display"]["frame"]), fps=args.fake_fps,
+                    display_latency_ms=args.fake_display_ms, protocol=protocol):
+        time.sleep(0.2)
+        yield
+
+
+def _stream(args, config):
+    """真机模式下每个组合重新拉起 scrcpy-server（它只接受一次连接）。"""
+    if args.fake:
+        return contextlib.nullcontext()
+    from env_launcher import ScrcpyLauncher
+    return ScrcpyLauncher.from_config(config, serial=args.serial, port=args.port)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="动作 → 画面延迟标定")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--serial", default=None)
+    parser.add_argument("--port", type=int, default=None, help="视频端口，默认 adb_bridge.port")
+    parser.add_argument("--backends", nargs="*", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--decode", nargs="*", default=["AUTO", "SLICE"], choices=DECODE_MODES)
+    parser.add_argument("--n", type=int, default=30, help="每组注入次数")
+    parser.add_argument("--gap", type=float, default=0.3, help="两次注入间隔（秒）")
+    parser.add_argument("--angle-step", type=float, default=math.pi / 4)
+    parser.add_argument("--thresh", type=float, default=8.0, help="ROI 平均灰度差阈值")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--json", default=None, help="保存原始样本")
+    fake = parser.add_argument_group("替身设备")
+    fake.add_argument("--fake", action="store_true")
+    fake.add_argument("--ctrl-port", type=int, default=1240)
+    fake.add_argument("--fake-fps", type=int, default=60)
+    fake.add_argument("--fake-adb-ms", type=float, default=30.0)
+    fake.add_argument("--fake-input-ms", type=float, default=20.0)
+    fake.add_argument("--fake-display-ms", type=float, default=16.0)
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    screen, frame = config["display"]["screen"], config["display"]["frame"]
+    host = config["adb_bridge"]["host"]
+    args.port = args.port or config["adb_bridge"]["port"]
+
+    results = {}
+    env = fake_environment(args, config) if args.fake else contextlib.nullcontext()
+    with env:
+        for mode in args.decode:
+            for name in args.backends:
+                with _stream(args, config):
+                    decoder = make_decoder(config, host, args.port, resize=tuple(frame), thread_type=mode)
+                    ctrl = BACKENDS[name](args.serial)
+                    try:
+                        probe = Probe(decoder, ctrl, screen, frame, args.thresh, args.timeout)
+                        decoder.read(timeout=5.0)
+                        noise = probe.noise_floor()
+                        if noise * 2 > probe.thresh:
+                            probe.thresh = noise * 2
+                            print(f"[probe] 画面噪声 p99={noise:.2f}，阈值提高到 {probe.thresh:.2f}")
+                        res = probe.sweep(args.n, args.gap, args.angle_step)
+                    finally:
+                        if hasattr(ctrl, "close"):
+                            ctrl.close()
+                        decoder.close()
+                res["noise_p99"] = noise
+                results[f"{name}/{mode}"] = res
+                print(f"[probe] {name}/{mode} 完成: {len(res['photon_ms'])} 次命中, {res['misses']} 次超时")
+
+    print(f"\n{'backend/decode':<18} {'n':>4} {'miss':>5} {'inject p50':>11} "
+          f"{'photon p50':>11} {'p90':>8} {'p99':>8} {'max':>8}")
+    for key, r in results.items():
+        ph = r["photon_ms"]
+        print(f"{key:<18} {len(ph):>4} {r['misses']:>5} {_pct(r['inject_ms'], 50):>11.1f} "
+              f"{_pct(ph, 50):>11.1f} {_pct(ph, 90):>8.1f} {_pct(ph, 99):>8.1f} "
+              f"{max(ph) if ph else float('nan'):>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    return 0 if any(r["photon_ms"] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+"""
+live_viewer.py
+~~~~~~~~~~~~~~
+无窗口的实时画面查看：把解码器的最新帧（叠加检测框与每步统计）以 MJPEG over HTTP 提供给浏览器。
+
+* 只监听 localhost；远程查看用 ssh -L 8090:127.0.0.1:8090 转发
+* JPEG 编码在独立线程，按 fps 限频；没有客户端连接时编码线程挂起，不占 CPU
+* 一帧只编码一次，多个客户端共享
+* 训练循环里只调用 update(dets, stats)：替换一个引用，不做任何绘制
+
+路径:
+    /          内嵌 <img> 的页面
+    /stream    multipart/x-mixed-replace MJPEG 流
+    /frame.jpg 单张快照
+    /stats     最近一次 update 的统计（JSON）
+
+Usage:
+    python live_viewer.py            # 单独拉流查看，浏览器打开 http://127.0.0.1:8090/
+"""
+from __future__ import annotations
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+__all__ = ["LiveViewer", "DEFAULT_VIEWER_CONFIG"]
+
+DEFAULT_VIEWER_CONFIG = {
+    "enabled": False,
+    "host": "127.0.0.1",
+    "port": 8090,
+    "fps": 10,              # 编码帧率上限
+    "quality": 70,          # JPEG 质量
+    "overlay_ttl": 1.0,     # 超过这么久没更新的检测框不再绘制（大厅 / 结算时不残留）
+}
+
+_BOUNDARY = "frame"
+_PAGE = b"""<!doctype html><html><head><meta charset="utf-8"><title>brawlbot</title></head>
+<body style="margin:0;background:#111"><img src="/stream" style="width:100%"></body></html>"""
+
+
+class LiveViewer:
+    def __init__(self, decoder, host: str = "127.0.0.1", port: int = 8090, fps: float = 10,
+                 quality: int = 70, overlay_ttl: float = 1.0):
+        self.decoder = decoder
+        self.host, self.port = host, port
+        self.period = 1.0 / max(fps, 0.1)
+        self.quality = quality
+        self.overlay_ttl = overlay_ttl
+
+        self._overlay: Dict = {"dets": [], "stats": {}, "t": 0.0}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)     # 客户端数变化 / 新 JPEG 都在这里通知
+        self._clients = 0
+        self._jpeg: Optional[bytes] = None
+        self._seq = 0
+        self._running = False
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.n_encoded = 0
+
+    @classmethod
+    def from_config(cls, decoder, cfg: Optional[Dict]) -> "LiveViewer":
+        cfg = {**DEFAULT_VIEWER_CONFIG, **(cfg or {})}
+        return cls(decoder, cfg["host"], cfg["port"], cfg["fps"], cfg["quality"], cfg["overlay_ttl"])
+
+    # ---------------- 训练侧接口 ----------------
+    def update(self, dets: Optional[List[Dict]] = None, stats: Optional[Dict] = None) -> None:
+        """记录最新检测结果与统计；只替换引用，绘制留给编码线程。"""
+        self._overlay = {"dets": dets or [], "stats": stats or {}, "t": time.monotonic()}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    # ---------------- 生命周期 ----------------
+    def start(self) -> "LiveViewer":
+        if self._running:
+            return self
+        self._running = True
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="viewer-http").start()
+        threading.Thread(target=self._encode_loop, daemon=True, name="viewer-encode").start()
+        print(f"[LiveViewer] {self.url}")
+        return self
+
+    def close(self) -> None:
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- 编码线程 ----------------
+    def _encode_loop(self) -> None:
+        last_ts = last_overlay = None
+        while self._running:
+            with self._cond:
+                # 没人看时挂起，不取帧不编码
+                self._cond.wait_for(lambda: self._clients > 0 or not self._running)
+            if not self._running:
+                break
+            t0 = time.monotonic()
+            frame, ts = self.decoder.read_stamped(block=False)
+            overlay = self._overlay
+            if frame is not None and (ts != last_ts or overlay is not last_overlay):
+                last_ts, last_overlay = ts, overlay
+                jpeg = self._encode(frame, overlay)
+                with self._cond:
+                    self._jpeg = jpeg
+                    self._seq += 1
+                    self._cond.notify_all()
+                self.n_encoded += 1
+            time.sleep(max(0.0, self.period - (time.monotonic() - t0)))
+
+    def _encode(self, frame: np.ndarray, overlay: Dict) -> bytes:
+        img = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if time.monotonic() - overlay["t"] < self.overlay_ttl:
+            for d in overlay["dets"]:
+                x1, y1, x2, y2 = map(int, d["xyxy"])
+                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 1)
+                cv2.putText(img, f"{d['cls']} {d['conf']:.2f}", (x1, max(10, y1 - 3)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
+        for i, (k, v) in enumerate(overlay["stats"].items()):
+            text = f"{k}: {v:.2f}" if isinstance(v, float) else f"{k}: {v}"
+            cv2.putText(img, text, (8, 18 + 16 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buf.tobytes() if ok else b""
+
+    def _wait_jpeg(self, after_seq: int, timeout: float = 2.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or not self._running, timeout)
+            return self._seq, self._jpeg
+
+    # ---------------- HTTP ----------------
+    def _handler_class(self):
+        viewer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):       # 不往训练日志里刷访问记录
+                pass
+
+            def _send(self, body: bytes, ctype: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/":
+                    self._send(_PAGE, "text/html; charset=utf-8")
+                elif path == "/stats":
+                    self._send(json.dumps(viewer._overlay["stats"], default=str).encode(), "application/json")
+                elif path in ("/stream", "/frame.jpg"):
+                    viewer._connect(+1)
+                    try:
+                        if path == "/stream":
+                            self._stream()
+                        else:
+                            _, jpeg = viewer._wait_jpeg(viewer._seq)      # 等编码线程醒来出一张新的
+                            if jpeg:
+                                self._send(jpeg, "image/jpeg")
+                            else:
+                                self.send_error(503, "no frame yet")
+                    finally:
+                        viewer._connect(-1)
+                else:
+                    self.send_error(404)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={_BOUNDARY}")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                seq = 0
+                try:
+                    while viewer._running:
+                        seq, jpeg = viewer._wait_jpeg(seq)
+                        if not jpeg:
+                            continue
+                        self.wfile.write(f"--{_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass                        # 浏览器关闭页面
+
+        return Handler
+
+    def _connect(self, delta: int) -> None:
+        with self._cond:
+            self._clients += delta
+            self._cond.notify_all()
+
+
+def main(argv=None) -> int:
+    import argparse
+    import yaml
+
+    from env_launcher import ScrcpyLauncher
+    from scrcpy_protocol import make_decoder
+
+    parser = argparse.ArgumentParser(description="MJPEG 实时画面查看")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args(argv)
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    cfg = {**(config.get("viewer") or {}), **({"port": args.port} if args.port else {})}
+
+    with ScrcpyLauncher.from_config(config) as launcher:
+        decoder = make_decoder(config, config["adb_bridge"]["host"], launcher.video_port,
+                               resize=tuple(config["display"]["frame"]))
+        try:
+            with LiveViewer.from_config(decoder, cfg):
+                while True:
+                    time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            decoder.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,278 @@
+"""
+match_lifecycle.py
+~~~~~~~~~~~~~~~~~~
+对局生命周期状态机：大厅 → 匹配 → 战斗 → 失败 / 结算 → 大厅。
+
+* 每来一帧新画面推进一次（VideoDecoder.wait_frame 唤醒，不睡眠轮询）
+* 先用模板分类器（亚毫秒）判别画面；模板认不出时才跑 YOLO，且按 detect_interval 限频
+* 每个状态有超时，超时后执行恢复动作（返回键）；整体超时抛 LifecycleTimeout，由调用方重连；
+  设备断开抛 DeviceDisconnected，由调用方等待设备回来
+* 记录每次状态切换及各状态停留时长
+* 战斗之外把解码器切到 idle（跳帧 + 限频转换），进入战斗时切回 active
+"""
+from __future__ import annotations
+import logging
+import time
+from enum import Enum
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from frame_context import FrameContext
+from game_state import STATE_REGISTRY, GameState, get_game_state
+from telemetry import kv
+
+__all__ = ["Phase", "MatchLifecycle", "LifecycleTimeout", "DeviceDisconnected", "DEFAULT_LIFECYCLE_CONFIG"]
+
+log = logging.getLogger("brawlbot.lifecycle")
+
+
+class Phase(str, Enum):
+    LOBBY = "lobby"
+    MATCHMAKING = "matchmaking"
+    BATTLE = "battle"
+    DEFEAT = "defeat"
+    SETTLEMENT = "settlement"
+    UNKNOWN = "unknown"
+
+
+class LifecycleTimeout(RuntimeError):
+    pass
+
+
+class DeviceDisconnected(RuntimeError):
+    """等待画面时 adb 连接断开；此时重新拉起 scrcpy 没有意义，应先等设备回来。"""
+
+
+DEFAULT_LIFECYCLE_CONFIG = {
+    "timeouts": {"lobby": 15, "matchmaking": 180, "defeat": 20, "settlement": 30, "unknown": 20},
+    "reset_timeout": 300,       # reset() 等待进入战斗的总时长
+    "settle_timeout": 60,       # 对局结束后等待名次的总时长
+    "detect_interval": 0.5,     # 模板认不出的画面，YOLO 最多每隔这么久跑一次
+    "tap_cooldown": 0.8,        # 同一状态下两次点击的最小间隔
+    "min_conf": 0.8,
+}
+
+# YOLO 类别 → 状态；按优先级排列，先命中先返回
+BATTLE_CLASSES = ("SkillCD", "SkillFull", "InBattle")
+_CLASS_PHASE: Tuple[Tuple[Tuple[str, ...], Phase], ...] = (
+    (BATTLE_CLASSES, Phase.BATTLE),
+    (("DefeatTips", "QuitBtn"), Phase.DEFEAT),
+    (("ContinueBtn", "ExitCheckout", "AgainBtn", "RankedFirst", "RankedSecond"), Phase.SETTLEMENT),
+    (("BattleBtn",), Phase.LOBBY),
+)
+
+# 模板状态 → 生命周期状态；GameState.BATTLE 是模板分类器的兜底结果，表示“认不出”
+_TEMPLATE_PHASE = {
+    GameState.LOBBY: Phase.LOBBY,
+    GameState.DEFEAT: Phase.DEFEAT,
+    GameState.GO_ON: Phase.SETTLEMENT,
+    GameState.SETTLE: Phase.SETTLEMENT,
+}
+
+# 各状态下要点的按钮（优先级从高到低）
+_TAP_CLASSES: Dict[Phase, Tuple[str, ...]] = {
+    Phase.LOBBY: ("BattleBtn",),
+    Phase.DEFEAT: ("QuitBtn",),
+    Phase.SETTLEMENT: ("ContinueBtn", "ExitCheckout", "AgainBtn"),
+    Phase.UNKNOWN: ("QuitBtn", "ExitCheckout", "ContinueBtn", "AgainBtn"),
+}
+
+# 模板本身就是按钮的状态：直接点 ROI 中心，不必跑 YOLO 找按钮
+_TEMPLATE_TAP = (GameState.LOBBY, GameState.GO_ON)
+
+KEY_BACK = 4
+
+
+class MatchLifecycle:
+    def __init__(self, decoder, ctrl, detector, cfg: Optional[Dict] = None):
+        cfg = {**DEFAULT_LIFECYCLE_CONFIG, **(cfg or {})}
+        self.decoder = decoder
+        self.ctrl = ctrl
+        self.detector = detector
+        self.timeouts = {Phase(k): float(v) for k, v in
+                         {**DEFAULT_LIFECYCLE_CONFIG["timeouts"], **(cfg.get("timeouts") or {})}.items()}
+        self.reset_timeout = float(cfg["reset_timeout"])
+        self.settle_timeout = float(cfg["settle_timeout"])
+        self.detect_interval = float(cfg["detect_interval"])
+        self.tap_cooldown = float(cfg["tap_cooldown"])
+        self.min_conf = float(cfg["min_conf"])
+
+        self.phase = Phase.UNKNOWN
+        self._phase_t0 = time.monotonic()
+        self._last_tap = 0.0
+        self._last_detect = 0.0
+        self._last_ts = 0
+        self._templates_ok = True
+        self.transitions: List[Dict] = []           # 每次切换：from / to / 停留秒数
+        self.phase_time: Dict[Phase, float] = {p: 0.0 for p in Phase}
+
+    # ---------------- 判别 ----------------
+    def _template_state(self, ctx: FrameContext) -> Optional[GameState]:
+        if not self._templates_ok:
+            return None
+        try:
+            return get_game_state(ctx)
+        except RuntimeError:
+            # 没有模板文件时只用 YOLO
+            self._templates_ok = False
+            return None
+
+    def _detect(self, ctx: FrameContext, force: bool = False) -> Optional[List[Dict]]:
+        now = time.monotonic()
+        if not force and now - self._last_detect < self.detect_interval:
+            return None
+        self._last_detect = now
+        detect_now = getattr(self.detector, "detect_now", None)
+        dets = (detect_now or self.detector.detect)(ctx)
+        return [d for d in dets if d["conf"] >= self.min_conf]
+
+    @staticmethod
+    def phase_from_dets(dets: Sequence[Dict]) -> Phase:
+        names = {d["cls"] for d in dets}
+        for classes, phase in _CLASS_PHASE:
+            if names.intersection(classes):
+                return phase
+        return Phase.UNKNOWN
+
+    def observe(self, ctx: FrameContext) -> Tuple[Optional[Phase], Optional[GameState], Optional[List[Dict]]]:
+        """返回 (状态, 模板状态, 检测结果)；YOLO 被限频跳过时状态为 None。"""
+        tpl = self._template_state(ctx)
+        if tpl in _TEMPLATE_PHASE:
+            return _TEMPLATE_PHASE[tpl], tpl, None
+        dets = self._detect(ctx)
+        if dets is None:
+            return None, tpl, None
+        return self.phase_from_dets(dets), tpl, dets
+
+    # ---------------- 状态切换 ----------------
+    def _enter(self, phase: Phase) -> None:
+        if phase == self.phase:
+            return
+        now = time.monotonic()
+        dt = now - self._phase_t0
+        self.phase_time[self.phase] += dt
+        self.transitions.append({"from": self.phase.value, "to": phase.value, "dwell_s": round(dt, 3)})
+        log.info("状态切换", extra=kv(src=self.phase.value, dst=phase.value, dwell_s=round(dt, 2)))
+        self.phase = phase
+        self._phase_t0 = now
+
+    def _timed_out(self) -> bool:
+        return time.monotonic() - self._phase_t0 > self.timeouts.get(self.phase, 30.0)
+
+    def _recover(self) -> None:
+        """当前状态停留过久：按返回键，并把状态计时清零重新判别。"""
+        log.warning("状态超时，执行恢复", extra=kv(phase=self.phase.value))
+        self.ctrl.key(KEY_BACK)
+        self._enter(Phase.UNKNOWN)
+        self._phase_t0 = time.monotonic()
+
+    def _tap(self, x: int, y: int) -> None:
+        self.ctrl.tap(x, y)
+        self._last_tap = time.monotonic()
+
+    def _act(self, ctx: FrameContext, tpl: Optional[GameState], dets: Optional[List[Dict]]) -> bool:
+        """在当前状态执行一次点击；返回是否点了。"""
+        if time.monotonic() - self._last_tap < self.tap_cooldown:
+            return False
+        if tpl in _TEMPLATE_TAP:
+            x1, y1, x2, y2 = STATE_REGISTRY[tpl]["roi"]
+            self._tap((x1 + x2) // 2, (y1 + y2) // 2)
+            return True
+        classes = _TAP_CLASSES.get(self.phase)
+        if not classes:
+            return False
+        if dets is None:
+            dets = self._detect(ctx, force=True)
+        by_cls = {d["cls"]: d for d in dets}
+        for cls_name in classes:
+            d = by_cls.get(cls_name)
+            if d is not None:
+                self._tap(*self.detector.bbox_center2screen_pos(d["xyxy"]))
+                return True
+        return False
+
+    def _decoder_mode(self, mode: str) -> None:
+        set_mode = getattr(self.decoder, "set_mode", None)
+        if set_mode is not None:
+            set_mode(mode)
+
+    def _next_frame(self, timeout: float = 1.0) -> Optional[FrameContext]:
+        frame, ts = self.decoder.wait_frame(self._last_ts, timeout)
+        if frame is None:
+            return None
+        self._last_ts = ts
+        return FrameContext(frame, ts=ts / 1e9)
+
+    # ---------------- 外部接口 ----------------
+    def wait_for_battle(self, timeout: Optional[float] = None) -> Dict:
+        """
+        从任意画面推进到战斗开始。返回本次过程的统计；
+        超过 timeout（默认 reset_timeout）抛 LifecycleTimeout；设备断开抛 DeviceDisconnected。
+        """
+        timeout = self.reset_timeout if timeout is None else timeout
+        t0 = time.monotonic()
+        n_before = len(self.transitions)
+        self._enter(Phase.UNKNOWN)
+        self._decoder_mode("idle")
+        while time.monotonic() - t0 < timeout:
+            ctx = self._next_frame()
+            if ctx is None:
+                if not self.ctrl.check_adb_link():
+                    raise DeviceDisconnected("设备断开")
+                continue
+
+            phase, tpl, dets = self.observe(ctx)
+            if phase == Phase.BATTLE:
+                self._enter(Phase.BATTLE)
+                self._decoder_mode("active")
+                return {"time_to_battle_s": round(time.monotonic() - t0, 3),
+                        "transitions": self.transitions[n_before:]}
+            if phase is not None and phase != Phase.UNKNOWN:
+                # 匹配中的画面可能仍被认成大厅：点过开战后一段时间内不退回大厅，
+                # 超过大厅超时仍是大厅画面，说明点击没生效，回到大厅重新点
+                waiting = self.phase == Phase.MATCHMAKING and phase == Phase.LOBBY \
+                    and time.monotonic() - self._phase_t0 < self.timeouts[Phase.LOBBY]
+                if not waiting:
+                    self._enter(phase)
+
+            if self._timed_out():
+                self._recover()
+                continue
+            if self._act(ctx, tpl, dets) and self.phase == Phase.LOBBY:
+                self._enter(Phase.MATCHMAKING)
+        raise LifecycleTimeout(f"{timeout:.0f}s 内未进入战斗（停在 {self.phase.value}）")
+
+    def settle(self, rank_classes: Sequence[str], timeout: Optional[float] = None) -> Optional[List[Dict]]:
+        """
+        对局结束后等待结算画面：见到 ContinueBtn 之后的下一次检测结果即名次帧。
+        失败画面上点退出。返回名次帧的检测结果；超时或断开返回 None。
+        """
+        timeout = self.settle_timeout if timeout is None else timeout
+        t0 = time.monotonic()
+        seen_continue = False
+        self._decoder_mode("idle")
+        while time.monotonic() - t0 < timeout:
+            ctx = self._next_frame()
+            if ctx is None:
+                if not self.ctrl.check_adb_link():
+                    return None
+                continue
+            dets = self._detect(ctx)
+            if dets is None:
+                continue
+            names = {d["cls"] for d in dets}
+            if names.intersection(rank_classes) or (seen_continue and dets):
+                self._enter(Phase.SETTLEMENT)
+                return dets
+            if "ContinueBtn" in names:
+                seen_continue = True
+                self._enter(Phase.SETTLEMENT)
+            elif names.intersection(("DefeatTips", "QuitBtn")):
+                self._enter(Phase.DEFEAT)
+                self._act(ctx, None, dets)
+        log.warning("等待结算超时", extra=kv(timeout_s=timeout))
+        return None
+
+    def stats(self) -> Dict:
+        return {"phase": self.phase.value,
+                "phase_time_s": {p.value: round(t, 2) for p, t in self.phase_time.items() if t},
+                "n_transitions": len(self.transitions)}
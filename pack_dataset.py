@@ -0,0 +1,301 @@
+"""
+pack_dataset.py
+~~~~~~~~~~~~~~~
+把大量小图片 + YOLO 标签打包成少数几个大分片文件，训练 / 标注时顺序读取、零拷贝随机访问。
+
+目录结构::
+
+    root/
+      index.json                 # 元数据：存储模式、原始尺寸、类别表、分片列表
+      records.npy  (N,) 结构化数组   分片号 / 偏移 / 字节数 / 形状 / 标签范围
+      labels.npy   (B, 5) float32   cls cx cy w h（YOLO 归一化坐标）
+      names.json                 # 每条记录对应的源文件相对路径
+      shard_00000.bin ...        # 图片数据首尾相接，每条按 64 字节对齐
+
+存储模式:
+    encoded : 原样保存 png / jpg 字节，读取时 cv2.imdecode
+    raw     : 解码并缩放到固定尺寸的 RGB uint8 数组，读取时直接 reshape 成视图，不需解码
+
+分片以 np.memmap 只读打开；按 records 顺序遍历即按文件顺序读，
+一个 epoch 只是对几个大文件的顺序读取。
+
+Usage:
+    python pack_dataset.py frames/20260101-120000 packed/ --labels frames/20260101-120000_labels
+    python pack_dataset.py images/ packed_raw/ --raw 1088x489 --prefix m_ --workers 8
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = ["PackWriter", "PackedDataset", "RECORD_DTYPE"]
+
+RECORD_DTYPE = np.dtype([
+    ("shard", np.int32),
+    ("offset", np.int64),
+    ("nbytes", np.int64),
+    ("h", np.int32),            # raw 模式为存储尺寸；encoded 模式为原图尺寸
+    ("w", np.int32),
+    ("c", np.int32),
+    ("label_start", np.int64),
+    ("label_count", np.int32),
+])
+
+ALIGN = 64
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+def _write_json_atomic(path: Path, obj) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=1))
+    os.replace(tmp, path)
+
+
+# ───────────────────── 写入 ─────────────────────
+class PackWriter:
+    def __init__(self, root: str | Path, mode: str = "encoded", shard_bytes: int = 1 << 30,
+                 size: Optional[Tuple[int, int]] = None, classes: Sequence[str] = ()):
+        """
+        参数:
+            mode        : encoded / raw
+            shard_bytes : 单个分片的目标大小，写满后换新分片
+            size        : raw 模式的存储尺寸 (W, H)，仅记录到 index.json
+        """
+        if mode not in ("encoded", "raw"):
+            raise ValueError(f"未知存储模式: {mode}")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        if (self.root / "index.json").exists():
+            raise FileExistsError(f"[pack] {self.root} 已有打包数据，请换一个输出目录")
+        self.mode = mode
+        self.shard_bytes = shard_bytes
+        self.size = list(size) if size else None
+        self.classes = list(classes)
+
+        self._records: List[tuple] = []
+        self._labels: List[np.ndarray] = []
+        self._names: List[str] = []
+        self._n_labels = 0
+        self._shard = -1
+        self._f = None
+        self._pos = 0
+        self._shards: List[dict] = []
+
+    def _roll(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._shards[-1]["nbytes"] = self._pos
+        self._shard += 1
+        name = f"shard_{self._shard:05d}.bin"
+        self._f = open(self.root / name, "wb")
+        self._pos = 0
+        self._shards.append({"file": name, "nbytes": 0})
+
+    def add(self, name: str, payload, shape: Tuple[int, int, int], labels: np.ndarray) -> int:
+        """追加一条记录；payload 为编码字节或 uint8 数组，labels 为 (k, 5)。返回记录下标。"""
+        buf = memoryview(payload).cast("B")
+        if self._f is None or (self._pos and self._pos + buf.nbytes > self.shard_bytes):
+            self._roll()
+        offset = self._pos
+        self._f.write(buf)
+        pad = -buf.nbytes % ALIGN
+        if pad:
+            self._f.write(b"\0" * pad)
+        self._pos += buf.nbytes + pad
+
+        labels = np.asarray(labels, dtype=np.float32).reshape(-1, 5)
+        h, w, c = shape
+        self._records.append((self._shard, offset, buf.nbytes, h, w, c, self._n_labels, len(labels)))
+        self._labels.append(labels)
+        self._n_labels += len(labels)
+        self._names.append(name)
+        return len(self._records) - 1
+
+    @property
+    def n_shards(self) -> int:
+        return len(self._shards)
+
+    def _close_shard(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._shards[-1]["nbytes"] = self._pos
+            self._f = None
+
+    def close(self) -> None:
+        self._close_shard()
+        np.save(self.root / "records.npy", np.array(self._records, dtype=RECORD_DTYPE))
+        labels = np.concatenate(self._labels) if self._labels else np.zeros((0, 5), np.float32)
+        np.save(self.root / "labels.npy", labels)
+        _write_json_atomic(self.root / "names.json", self._names)
+        # index.json 最后写：它存在即表示打包完整
+        _write_json_atomic(self.root / "index.json", {
+            "mode": self.mode, "size": self.size, "classes": self.classes,
+            "n_records": len(self._records), "n_labels": self._n_labels, "shards": self._shards,
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 出错中断时不写 index.json：目录保持“未完成”状态，PackedDataset 打不开，重跑也不会被拒
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_shard()
+
+
+# ───────────────────── 读取 ─────────────────────
+class PackedDataset:
+    """随机访问：raw(i) 是分片上的零拷贝视图；image(i) 在 raw 模式下也是视图。"""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.meta = json.loads((self.root / "index.json").read_text())
+        self.mode = self.meta["mode"]
+        self.classes = self.meta["classes"]
+        self.records = np.load(self.root / "records.npy", mmap_mode="r")
+        self.labels_all = np.load(self.root / "labels.npy", mmap_mode="r")
+        self._shards = [np.memmap(self.root / s["file"], dtype=np.uint8, mode="r") if s["nbytes"] else
+                        np.zeros(0, np.uint8) for s in self.meta["shards"]]
+        self._names: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def raw(self, i: int) -> np.ndarray:
+        r = self.records[i]
+        off = int(r["offset"])
+        return self._shards[int(r["shard"])][off: off + int(r["nbytes"])]
+
+    def image(self, i: int) -> np.ndarray:
+        """RGB uint8 (H, W, 3)。"""
+        data = self.raw(i)
+        if self.mode == "raw":
+            r = self.records[i]
+            return data.reshape(int(r["h"]), int(r["w"]), int(r["c"]))
+        import cv2
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    def labels(self, i: int) -> np.ndarray:
+        r = self.records[i]
+        s = int(r["label_start"])
+        return self.labels_all[s: s + int(r["label_count"])]
+
+    def name(self, i: int) -> str:
+        if self._names is None:
+            self._names = json.loads((self.root / "names.json").read_text())
+        return self._names[i]
+
+    def __getitem__(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.image(i), self.labels(i)
+
+    def epoch_order(self, seed: Optional[int] = None, block: int = 256) -> np.ndarray:
+        """
+        一个 epoch 的访问顺序。seed 为 None 时即文件顺序；
+        否则打乱大小为 block 的连续块的顺序，再在块内打乱，读盘仍以整块顺序为主。
+        """
+        n = len(self)
+        if seed is None:
+            return np.arange(n)
+        rng = np.random.default_rng(seed)
+        starts = np.arange(0, n, block)
+        rng.shuffle(starts)
+        return np.concatenate([rng.permutation(np.arange(s, min(s + block, n))) for s in starts]) \
+            if n else np.arange(0)
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+# ───────────────────── 打包 CLI ─────────────────────
+def _find_images(root: Path, prefix: Optional[str]) -> List[Path]:
+    out = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(IMAGE_EXTS) and (prefix is None or name.startswith(prefix)):
+                out.append(Path(dirpath, name).relative_to(root))
+    return sorted(out)
+
+
+def _read_labels(path: Path) -> np.ndarray:
+    if not path.exists():
+        return np.zeros((0, 5), np.float32)
+    rows = [line.split() for line in path.read_text().splitlines() if line.strip()]
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def _load(task: Tuple[str, Optional[Tuple[int, int]]]):
+    """worker：返回 (payload, shape)；encoded 模式只读字节并解析文件头尺寸。"""
+    path, size = task
+    if size is None:
+        from PIL import Image
+        try:
+            data = Path(path).read_bytes()
+            with Image.open(io.BytesIO(data)) as im:      # 只解析文件头
+                w, h = im.size
+        except Exception:           # 截断 / 损坏的图片：和 raw 模式一样按无法读取跳过，不中断整个 pool.map
+            return None, None
+        return data, (h, w, 3)
+    import cv2
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        return None, None
+    if (img.shape[1], img.shape[0]) != tuple(size):
+        img = cv2.resize(img, tuple(size), interpolation=cv2.INTER_AREA)
+    img = np.ascontiguousarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return img, img.shape
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="图片 + YOLO 标签打包成分片文件")
+    parser.add_argument("src", type=Path, help="图片目录（递归）")
+    parser.add_argument("out", type=Path, help="输出目录")
+    parser.add_argument("--labels", type=Path, default=None,
+                        help="标签目录（与图片相对路径一致的 .txt）；默认 <src>_labels，不存在则找图片同目录的 .txt")
+    parser.add_argument("--raw", default=None, metavar="WxH", help="存为缩放后的 RGB 数组而不是原始编码")
+    parser.add_argument("--prefix", default=None, help="只打包该前缀的图片，如 m_")
+    parser.add_argument("--shard-mb", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    labels_dir = args.labels or args.src.with_name(args.src.name + "_labels")
+    if not labels_dir.is_dir():
+        labels_dir = args.src
+    classes: List[str] = []
+    if (labels_dir / "classes.txt").exists():
+        classes = [c for c in (labels_dir / "classes.txt").read_text().splitlines() if c]
+    size = tuple(int(v) for v in args.raw.lower().split("x")) if args.raw else None
+
+    images = _find_images(args.src, args.prefix)
+    print(f"[pack] {len(images)} 张图片，标签目录 {labels_dir}，模式 {'raw ' + args.raw if size else 'encoded'}")
+
+    t0 = time.perf_counter()
+    n_bytes = skipped = 0
+    with PackWriter(args.out, "raw" if size else "encoded", args.shard_mb << 20, size, classes) as writer, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        tasks = [(str(args.src / rel), size) for rel in images]
+        for rel, (payload, shape) in zip(images, pool.map(_load, tasks, chunksize=32)):
+            if payload is None:
+                skipped += 1
+                print(f"⚠️ 无法读取 {rel}")
+                continue
+            labels = _read_labels((labels_dir / rel).with_suffix(".txt"))
+            writer.add(rel.as_posix(), payload, shape, labels)
+            n_bytes += len(memoryview(payload).cast("B"))
+    dt = time.perf_counter() - t0
+    print(f"[pack] 完成：{len(images) - skipped} 条记录，{writer.n_shards} 个分片，"
+          f"{n_bytes / 2**20:.1f} MiB，{dt:.1f}s（{(len(images) - skipped) / max(dt, 1e-9):.0f} 张/s）→ {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
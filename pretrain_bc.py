@@ -0,0 +1,225 @@
+"""
+pretrain_bc.py
+~~~~~~~~~~~~~~
+行为克隆预训练：用 TrajectoryWriter 录下的 (帧, 动作) 训练 SB3 CnnPolicy，
+保存为 PPO 可直接加载的 zip（train_agent --init-from）。
+
+* 多 worker DataLoader + 预取；帧堆叠与数据增强都在 worker 里即时完成
+* 可选用蒙特卡洛回报同时预训练价值头
+* --bench 只跑数据加载，报告 CPU 上的 samples/s
+
+Usage:
+    python pretrain_bc.py ./trajectories/default_1234 --epochs 5 --out bc_policy
+    python pretrain_bc.py ./trajectories/default_1234 --bench 200 --workers 4
+"""
+from __future__ import annotations
+import argparse
+import time
+from pathlib import Path
+from typing import Optional
+
+import gymnasium as gym
+import numpy as np
+import torch
+import yaml
+from gymnasium.spaces import Box
+from torch.utils.data import DataLoader, Dataset
+
+from scrcpy_env import ObservationMode, make_action_space, unflatten_actions
+from trajectory_store import TrajectoryDataset
+
+
+# ───────────────────── 数据 ─────────────────────
+def discounted_returns(steps: np.ndarray, gamma: float) -> np.ndarray:
+    """按回合反向累计折扣回报；回合边界由 terminated / episode 变化决定。"""
+    ret = np.zeros(len(steps), dtype=np.float32)
+    acc = 0.0
+    for i in range(len(steps) - 1, -1, -1):
+        last_of_ep = i == len(steps) - 1 or steps["episode"][i + 1] != steps["episode"][i]
+        if steps["terminated"][i] or last_of_ep:
+            acc = 0.0
+        acc = steps["reward"][i] + gamma * acc
+        ret[i] = acc
+    return ret
+
+
+class BCDataset(Dataset):
+    """
+    memmap 不能跨进程 pickle：每个 worker 在首次取样时自己打开数据集。
+    返回 (obs uint8 (k*C, H, W), action, return)，预处理与 ScrcpyEnv 的 obs_mode 一致；
+    action_mode 为 multi 时 action 是 (方向, 按钮)。
+    """
+
+    def __init__(self, root: str | Path, frame_stack: int = 4, augment: bool = True,
+                 gamma: float = 0.95, max_shift: int = 8,
+                 obs_mode: Optional[ObservationMode] = None, action_mode: str = "discrete"):
+        self.root = Path(root)
+        self.frame_stack = frame_stack
+        self.obs_mode = obs_mode or ObservationMode()
+        self.augment = augment
+        self.max_shift = max_shift
+        ds = TrajectoryDataset(self.root, frame_stack)
+        self._len = len(ds)
+        h, w, _ = ds.index["frame_shape"]
+        self.obs_shape = (frame_stack * self.obs_mode.channels, *self.obs_mode.frame_shape((w, h)))
+        self.action_space = make_action_space(action_mode)
+        flat = ds.steps["action"]
+        space = self.action_space
+        n_flat = int(np.prod(space.nvec)) if hasattr(space, "nvec") else int(space.n)
+        if len(flat) and (flat.min() < 0 or flat.max() >= n_flat):
+            raise ValueError(f"[pretrain_bc] 轨迹动作取值 {flat.min()}..{flat.max()} 超出 action.mode={action_mode} "
+                             f"的 {n_flat} 个动作，录制时的 action.mode 与 --config 不一致")
+        self.actions = unflatten_actions(flat, action_mode)
+        self.returns = discounted_returns(ds.steps, gamma)
+        self._ds: Optional[TrajectoryDataset] = None
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _dataset(self) -> TrajectoryDataset:
+        if self._ds is None:
+            self._ds = TrajectoryDataset(self.root, self.frame_stack)
+        return self._ds
+
+    def _augment(self, stack: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        # 整个堆叠使用同一组随机参数，保持帧间一致
+        out = stack.astype(np.float32)
+        out = out * rng.uniform(0.8, 1.2) + rng.uniform(-20, 20)      # 对比度 / 亮度
+        if self.max_shift:
+            # 轻微平移：边缘复制填充后裁回原尺寸；np.roll 会把 HUD / 屏幕边缘卷到对侧
+            m = self.max_shift
+            dx, dy = rng.integers(-m, m + 1, size=2)
+            h, w = out.shape[1:3]
+            out = np.pad(out, ((0, 0), (m, m), (m, m), (0, 0)), mode="edge")
+            out = out[:, m + dy: m + dy + h, m + dx: m + dx + w]
+        return np.clip(out, 0, 255).astype(np.uint8)
+
+    def __getitem__(self, i: int):
+        stack = self._dataset().stacked(i)                           # (k, H, W, 3) mmap 视图
+        stack = np.stack([self.obs_mode.apply(f) for f in stack])    # (k, H', W', C)
+        if self.augment:
+            stack = self._augment(stack, np.random.default_rng())
+        obs = np.ascontiguousarray(stack.transpose(0, 3, 1, 2)).reshape(-1, *stack.shape[1:3])
+        return torch.from_numpy(obs), torch.as_tensor(self.actions[i]), float(self.returns[i])
+
+
+def make_loader(ds: BCDataset, batch_size: int, workers: int, prefetch: int = 4) -> DataLoader:
+    return DataLoader(
+        ds,
+        batch_size=batch_size,
+        shuffle=True,
+        num_workers=workers,
+        prefetch_factor=prefetch if workers > 0 else None,
+        persistent_workers=workers > 0,
+        drop_last=True,
+    )
+
+
+# ───────────────────── 模型 ─────────────────────
+class _SpacesOnlyEnv(gym.Env):
+    """只为构造 PPO 提供观测 / 动作空间；step 是空操作，每步即结束回合。"""
+
+    def __init__(self, observation_space, action_space):
+        self.observation_space = observation_space
+        self.action_space = action_space
+
+    def reset(self, *, seed=None, options=None):
+        return self.observation_space.sample(), {}
+
+    def step(self, action):
+        return self.observation_space.sample(), 0.0, True, False, {}
+
+
+def build_model(obs_shape, action_space, learning_rate: float, policy_kwargs=None):
+    from stable_baselines3 import PPO
+    env = _SpacesOnlyEnv(Box(0, 255, obs_shape, np.uint8), action_space)
+    return PPO("CnnPolicy", env, learning_rate=learning_rate, policy_kwargs=policy_kwargs, verbose=0)
+
+
+def bench_loader(loader: DataLoader, n_batches: int) -> float:
+    it = iter(loader)
+    next(it)                        # 首批包含 worker 启动开销，不计入
+    t0 = time.perf_counter()
+    n = 0
+    for _ in range(n_batches):
+        try:
+            obs, _, _ = next(it)
+        except StopIteration:
+            it = iter(loader)
+            obs, _, _ = next(it)
+        n += len(obs)
+    return n / (time.perf_counter() - t0)
+
+
+def train(model, loader: DataLoader, epochs: int, ent_coef: float, vf_coef: float) -> None:
+    policy = model.policy
+    policy.set_training_mode(True)
+    for epoch in range(epochs):
+        t0, n, tot_loss, correct = time.perf_counter(), 0, 0.0, 0
+        for obs, actions, returns in loader:
+            obs = obs.to(policy.device)
+            actions = actions.to(policy.device)
+            returns = returns.to(policy.device).float()
+
+            values, logp, entropy = policy.evaluate_actions(obs, actions)
+            loss = -logp.mean() - ent_coef * entropy.mean()
+            if vf_coef:
+                loss = loss + vf_coef * torch.nn.functional.mse_loss(values.flatten(), returns)
+
+            policy.optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), 0.5)
+            policy.optimizer.step()
+
+            with torch.no_grad():
+                pred = policy.get_distribution(obs).mode()
+            correct += int((pred == actions).reshape(len(obs), -1).all(dim=1).sum())
+            tot_loss += float(loss) * len(obs)
+            n += len(obs)
+        dt = time.perf_counter() - t0
+        print(f"[pretrain_bc] epoch {epoch + 1}/{epochs}  loss {tot_loss / max(1, n):.4f}  "
+              f"acc {correct / max(1, n):.3f}  {n / dt:.1f} samples/s")
+
+
+# ───────────────────── 入口 ─────────────────────
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="行为克隆预训练 CnnPolicy")
+    parser.add_argument("data", type=Path, help="TrajectoryWriter 输出目录")
+    parser.add_argument("--config", default="config.yaml", help="读取 observation / action / policy 配置，须与训练一致")
+    parser.add_argument("--out", default="bc_policy", help="输出路径（PPO zip）")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--ent-coef", type=float, default=0.01)
+    parser.add_argument("--vf-coef", type=float, default=0.5, help="0 表示不预训练价值头")
+    parser.add_argument("--no-augment", action="store_true")
+    parser.add_argument("--bench", type=int, default=0, help="只测数据加载吞吐，跑 N 个 batch")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+
+    ds = BCDataset(args.data, frame_stack=(config.get("observation") or {}).get("frame_stack", 4),
+                   augment=not args.no_augment,
+                   obs_mode=ObservationMode.from_config(config.get("observation")),
+                   action_mode=(config.get("action") or {}).get("mode", "discrete"))
+    loader = make_loader(ds, args.batch_size, args.workers, args.prefetch)
+    print(f"[pretrain_bc] 样本 {len(ds)}  观测尺寸 {ds.obs_shape}")
+
+    if args.bench:
+        sps = bench_loader(loader, args.bench)
+        print(f"[pretrain_bc] 数据加载吞吐: {sps:.1f} samples/s "
+              f"(workers={args.workers}, batch={args.batch_size})")
+        return
+
+    from train_agent import policy_kwargs_from_config
+    model = build_model(ds.obs_shape, ds.action_space, args.lr, policy_kwargs_from_config(config))
+    train(model, loader, args.epochs, args.ent_coef, args.vf_coef)
+    model.save(args.out)
+    print(f"[pretrain_bc] 已保存 {args.out}.zip，可用 train_agent --init-from {args.out}.zip 加载")
+
+
+if __name__ == "__main__":
+    main()
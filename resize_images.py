@@ -2,13 +2,27 @@
 # -*- coding: utf-8 -*-
 """
 批量压缩图片到最长边 ≤ 1080 像素，并以 m_ 前缀保存到原目录
+
+* 进程池并行处理
+* 增量：目录下 .resize_manifest.json 记录每个源文件的 size / mtime / 哈希，
+  未变化的文件只做一次 stat 就跳过；mtime 变了但内容哈希没变的也不重做
+* JPEG 用 draft() 在解码阶段直接按 1/2、1/4、1/8 缩小，不必解出全尺寸
+* 已满足尺寸且无需旋转的图片直接拷贝字节，不重新编码
 Usage:
     python resize_images.py /path/to/folder
+    python resize_images.py /path/to/folder --workers 8 --max 1080
 """
 
 import argparse
+import hashlib
+import json
+import os
+import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 from PIL import Image, ExifTags
 
@@ -54,48 +68,137 @@ def _auto_orient(img: Image.Image) -> Image.Image:
         return img
 
 
-# --------- 主逻辑 ---------- #
-def resize_images(folder: Path, max_size: int = 1080) -> None:
-    """遍历并压缩 folder 中的图片."""
-    if not folder.is_dir():
-        print(f"❌ 路径不存在或不是文件夹: {folder}")
-        sys.exit(1)
+# --------- 单张处理（在 worker 进程中运行） ---------- #
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+MANIFEST_NAME = ".resize_manifest.json"
+PREFIX = "m_"
 
-    img_exts = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
 
-    processed = 0
-    skipped  = 0
+def _file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
-    for p in folder.rglob("*"):
-        if p.suffix.lower() not in img_exts:
-            continue
-        if p.name.startswith("m_"):
-            skipped += 1
-            continue
 
-        try:
-            with Image.open(p) as im:
-                im = _auto_orient(im)
+def _needs_orient(im: Image.Image) -> bool:
+    if not _EXIF_ORIENTATION_TAG or not hasattr(im, "_getexif"):
+        return False
+    try:
+        exif = im._getexif()
+    except Exception:
+        return False
+    return bool(exif) and exif.get(_EXIF_ORIENTATION_TAG, 1) != 1
+
+
+def _process_one(task: Tuple[str, int, Optional[str]]) -> Dict:
+    """
+    task = (源路径, max_size, 上次记录的哈希)。返回 manifest 记录；
+    action 为 resized / copied / unchanged（内容未变）/ failed。
+    """
+    src, max_size, old_hash = task
+    p = Path(src)
+    st = p.stat()
+    rec = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    out_path = p.with_name(PREFIX + p.name)
+    try:
+        digest = _file_hash(p)
+        rec["hash"] = digest
+        if digest == old_hash and out_path.exists():
+            return {**rec, "action": "unchanged"}
+
+        with Image.open(p) as im:
+            # 只读了文件头：尺寸够小且没有旋转标记时，输出就是原文件
+            if max(im.size) <= max_size and not _needs_orient(im):
+                shutil.copyfile(p, out_path)
+                return {**rec, "action": "copied", "out": list(im.size)}
+
+            if im.format == "JPEG":
+                # 解码时直接按 2 的幂缩小到不小于目标尺寸，再用 LANCZOS 精确缩放
+                im.draft("RGB", (max_size, max_size))
+            im = _auto_orient(im)
+            im.thumbnail((max_size, max_size), Image.LANCZOS)
+            im.save(out_path, optimize=True, quality=90)
+            return {**rec, "action": "resized", "out": list(im.size)}
+    except Exception as e:
+        return {**rec, "action": "failed", "error": str(e)}
+
+
+# --------- manifest ---------- #
+def _load_manifest(folder: Path) -> Dict[str, Dict]:
+    path = folder / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        print("⚠️ manifest 损坏，全部重新检查")
+        return {}
+
 
-                # 已满足尺寸要求时直接拷贝
-                if max(im.size) <= max_size:
-                    out_path = p.with_name("m_" + p.name)
-                    im.save(out_path, optimize=True, quality=90)
-                    processed += 1
-                    continue
+def _save_manifest(folder: Path, manifest: Dict[str, Dict]) -> None:
+    path = folder / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False))
+    os.replace(tmp, path)
 
-                # 根据较长边等比缩放
-                im.thumbnail((max_size, max_size), Image.LANCZOS)
 
-                out_path = p.with_name("m_" + p.name)
-                im.save(out_path, optimize=True, quality=90)
-                processed += 1
-                print(f"✅ {p.name} → {out_path.name}   {im.size}")
+# --------- 主逻辑 ---------- #
+def resize_images(folder: Path, max_size: int = 1080, workers: Optional[int] = None,
+                  force: bool = False) -> Dict[str, int]:
+    """遍历并压缩 folder 中的图片；返回各类处理结果的计数。"""
+    if not folder.is_dir():
+        print(f"❌ 路径不存在或不是文件夹: {folder}")
+        sys.exit(1)
 
-        except Exception as e:
-            print(f"⚠️ 处理失败 {p}: {e}")
+    t0 = time.perf_counter()
+    manifest = {} if force else _load_manifest(folder)
+    counts = {"resized": 0, "copied": 0, "unchanged": 0, "skipped": 0, "failed": 0}
 
-    print(f"\n完成！处理 {processed} 张，跳过 {skipped} 张。")
+    # 1) 只做 stat 的快速筛选：size、mtime、最大边限制都没变且输出存在的直接跳过
+    tasks = []
+    for p in folder.rglob("*"):
+        if p.suffix.lower() not in IMG_EXTS or p.name.startswith(PREFIX):
+            continue
+        rel = p.relative_to(folder).as_posix()
+        st = p.stat()
+        old = manifest.get(rel)
+        if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns \
+                and old.get("max_size") == max_size and old.get("action") != "failed" \
+                and p.with_name(PREFIX + p.name).exists():
+            counts["skipped"] += 1
+            continue
+        # max_size 变了时不能只凭哈希判定未变化
+        old_hash = old.get("hash") if old and old.get("max_size") == max_size else None
+        tasks.append((rel, str(p), old_hash))
+    t_scan = time.perf_counter() - t0
+
+    # 2) 变化的文件交给进程池
+    in_bytes = 0
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_process_one, [(src, max_size, h) for _, src, h in tasks], chunksize=16)
+            for i, ((rel, src, _), rec) in enumerate(zip(tasks, results), 1):
+                rec["max_size"] = max_size
+                counts[rec["action"]] += 1
+                in_bytes += rec["size"]
+                if rec["action"] == "failed":
+                    print(f"⚠️ 处理失败 {src}: {rec['error']}")
+                elif rec["action"] == "resized":
+                    print(f"✅ {rel} → {tuple(rec['out'])}")
+                manifest[rel] = rec
+                if i % 1000 == 0:
+                    _save_manifest(folder, manifest)        # 中途中断也不丢已完成的部分
+    _save_manifest(folder, manifest)
+
+    dt = time.perf_counter() - t0
+    n = len(tasks)
+    print(f"\n完成！缩放 {counts['resized']} 张，拷贝 {counts['copied']} 张，"
+          f"内容未变 {counts['unchanged']} 张，跳过 {counts['skipped']} 张，失败 {counts['failed']} 张。")
+    print(f"耗时 {dt:.1f}s（扫描 {t_scan:.1f}s）；处理 {n} 张，"
+          f"{n / max(dt - t_scan, 1e-9):.1f} 张/s，{in_bytes / 2**20 / max(dt - t_scan, 1e-9):.1f} MiB/s")
+    return counts
 
 
 if __name__ == "__main__":
@@ -108,5 +211,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--max", type=int, default=1080, help="最长边限制 (默认 1080)"
     )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="进程数 (默认 CPU 核数)"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="忽略 manifest，全部重新处理"
+    )
     args = parser.parse_args()
-    resize_images(args.folder, max_size=args.max)
+    resize_images(args.folder, max_size=args.max, workers=args.workers, force=args.force)
@@ -0,0 +1,187 @@
+"""
+reward_engine.py
+~~~~~~~~~~~~~~~~
+声明式奖励：规则写在 config.yaml 的 reward 段，构造时编译成 NumPy 数组，
+每步对数组形式的检测结果做一次向量化匹配，并给出逐条规则的奖励分解。
+
+规则字段::
+
+    - cls: KillEnemy      # 检测类别
+      value: 50           # 每个满足条件的框的奖励
+      min_conf: 0.95      # 最低置信度，默认 0
+      event: true         # 同一条轨迹（track_id）只在条件首次成立时计分一次；未跟踪的框每步都算
+      cooldown: 0         # 触发后冷却的步数
+      debounce: 1         # 连续 N 步都匹配才触发
+      actions: [10]       # 只在这些动作下生效；缺省为所有动作
+      name: kill          # 分解里的键名，缺省为 cls
+
+动作既可以是 Discrete(11) 的整数，也可以是复合动作 (方向 0-8, 按钮 0-2)：
+复合动作按其包含的离散动作计分，例如 (3, 1) = 移动 + 攻击，基础奖励相加，规则任一匹配即生效。
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = ["RewardEngine", "DEFAULT_REWARD_CONFIG", "detections_to_arrays", "discrete_actions"]
+
+N_ACTIONS = 11
+MOVE_ACTIONS = range(1, 9)
+ATTACK_ACTION, SKILL_ACTION = 9, 10
+BUTTON_ACTIONS = (0, ATTACK_ACTION, SKILL_ACTION)     # 复合动作的按钮维 → 离散动作
+
+# 与原 _compute_reward / _settlement_reward 中硬编码的数值一致
+DEFAULT_REWARD_CONFIG = {
+    "action": {"move": 1.0, "attack": 0.5, "skill": 0.0, "idle": 0.0},
+    "repeat_penalty": {"step": 0.0, "max": 10.0},
+    "no_move_penalty": -1.0,
+    "rules": [
+        {"cls": "EnemyBloodLoss", "value": 5, "event": True},
+        {"cls": "HeroBloodLoss", "value": -5, "event": True},
+        {"cls": "SkillCD", "value": -1, "actions": [SKILL_ACTION]},
+        {"cls": "LowHP", "value": -1},
+        {"cls": "KillEnemy", "value": 50, "min_conf": 0.95, "event": True},
+    ],
+    "settlement": {"RankedFirst": 1000, "RankedSecond": 100, "default": -1000},
+}
+
+
+def detections_to_arrays(dets: Sequence[Dict], class_ids: Dict[str, int]):
+    """list[dict] → (cls_id, conf, track_id)；规则里没出现的类别、未经跟踪的框都记为 -1。"""
+    n = len(dets)
+    cls = np.fromiter((class_ids.get(d["cls"], -1) for d in dets), dtype=np.int32, count=n)
+    conf = np.fromiter((d["conf"] for d in dets), dtype=np.float32, count=n)
+    track_id = np.fromiter((d.get("track_id", -1) for d in dets), dtype=np.int64, count=n)
+    return cls, conf, track_id
+
+
+def discrete_actions(action) -> Tuple[int, ...]:
+    """离散动作 a → (a,)；复合动作 (d, b) → 它包含的离散动作，如 (3, 1) → (3, 9)，(0, 0) → (0,)。"""
+    if np.ndim(action) == 0:
+        return (int(action),)
+    acts = tuple(a for a in (int(action[0]), BUTTON_ACTIONS[int(action[1])]) if a)
+    return acts or (0,)
+
+
+class RewardEngine:
+    def __init__(self, cfg: Optional[Dict] = None, n_actions: int = N_ACTIONS):
+        cfg = {**DEFAULT_REWARD_CONFIG, **(cfg or {})}
+        self.n_actions = n_actions
+
+        # ---------- 动作基础奖励 ----------
+        act = {**DEFAULT_REWARD_CONFIG["action"], **(cfg.get("action") or {})}
+        self.action_values = np.full(n_actions, float(act["idle"]), dtype=np.float32)
+        self.action_values[list(MOVE_ACTIONS)] = act["move"]
+        self.action_values[ATTACK_ACTION] = act["attack"]
+        self.action_values[SKILL_ACTION] = act["skill"]
+
+        rep = {**DEFAULT_REWARD_CONFIG["repeat_penalty"], **(cfg.get("repeat_penalty") or {})}
+        self.repeat_step = float(rep["step"])
+        self.repeat_max = float(rep["max"])
+        self.no_move_penalty = float(cfg["no_move_penalty"])
+
+        # ---------- 检测规则 → 数组 ----------
+        rules: List[Dict] = cfg["rules"]
+        self.rule_names = [r.get("name", r["cls"]) for r in rules]
+        self.class_ids: Dict[str, int] = {}
+        for r in rules:
+            self.class_ids.setdefault(r["cls"], len(self.class_ids))
+        R = len(rules)
+        self.rule_cls = np.array([self.class_ids[r["cls"]] for r in rules], dtype=np.int32)
+        self.rule_value = np.array([r["value"] for r in rules], dtype=np.float32)
+        self.rule_min_conf = np.array([r.get("min_conf", 0.0) for r in rules], dtype=np.float32)
+        self.rule_event = np.array([r.get("event", False) for r in rules], dtype=bool)
+        self._event_rules = np.flatnonzero(self.rule_event)
+        self.rule_cooldown = np.array([r.get("cooldown", 0) for r in rules], dtype=np.int64)
+        self.rule_debounce = np.array([max(1, r.get("debounce", 1)) for r in rules], dtype=np.int64)
+        self.rule_actions = np.ones((R, n_actions), dtype=bool)
+        for i, r in enumerate(rules):
+            if r.get("actions") is not None:
+                self.rule_actions[i] = False
+                self.rule_actions[i, r["actions"]] = True
+
+        # ---------- 结算 ----------
+        settle = dict(cfg["settlement"])
+        self.settlement_default = float(settle.pop("default", 0.0))
+        self.settlement_values = {k: float(v) for k, v in settle.items()}
+
+        self.reset()
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict]) -> "RewardEngine":
+        return cls(cfg)
+
+    def reset(self) -> None:
+        """新的一局：清空冷却、连续计数与重复动作计数。"""
+        self.step_idx = 0
+        self.last_fired = np.full(len(self.rule_cls), -(1 << 40), dtype=np.int64)
+        self.streak = np.zeros(len(self.rule_cls), dtype=np.int64)
+        self.last_action: Optional[Tuple[int, ...]] = None
+        self.repeat_count = 0
+        # 事件规则：每条规则已计过分的 track_id
+        self.rewarded: List[set] = [set() for _ in range(len(self.rule_cls))]
+
+    # ---------------- 每步 ----------------
+    def compute(self, dets: Sequence[Dict], action) -> Tuple[float, Dict[str, float]]:
+        """返回 (总奖励, 分解)；分解只含非零项。action 为离散动作或复合动作 (方向, 按钮)。"""
+        self.step_idx += 1
+        terms: Dict[str, float] = {}
+        action = discrete_actions(action)
+
+        base = float(self.action_values[list(action)].sum())
+        if base:
+            terms["action"] = base
+
+        if action == self.last_action:
+            self.repeat_count += 1
+            # 阶梯式惩罚：重复次数越多惩罚越重
+            penalty = min(self.repeat_step * self.repeat_count, self.repeat_max)
+            if penalty:
+                terms["repeat"] = -penalty
+        else:
+            self.repeat_count = 0
+        self.last_action = action
+
+        if len(self.rule_cls):
+            per_rule = self._eval_rules(dets, action)
+            for i in np.flatnonzero(per_rule):
+                name = self.rule_names[i]
+                terms[name] = terms.get(name, 0.0) + float(per_rule[i])
+
+        return float(sum(terms.values())), terms
+
+    def _eval_rules(self, dets: Sequence[Dict], action: Tuple[int, ...]) -> np.ndarray:
+        if len(dets):
+            cls, conf, track_id = detections_to_arrays(dets, self.class_ids)
+            # (R, D)：类别、置信度一次判定
+            match = (cls[None, :] == self.rule_cls[:, None]) \
+                & (conf[None, :] >= self.rule_min_conf[:, None])
+            # 事件去重：已计过分的轨迹不再匹配。不按轨迹诞生帧判定，
+            # 诞生时置信度不够、之后才达到 min_conf 的轨迹仍会计分一次
+            tracked = track_id >= 0
+            for i in self._event_rules:
+                if self.rewarded[i]:
+                    match[i] &= ~(tracked & np.isin(track_id, list(self.rewarded[i])))
+            counts = match.sum(axis=1)
+        else:
+            counts = np.zeros(len(self.rule_cls), dtype=np.int64)
+
+        self.streak = np.where(counts > 0, self.streak + 1, 0)
+        fired = (counts > 0) \
+            & self.rule_actions[:, list(action)].any(axis=1) \
+            & (self.streak >= self.rule_debounce) \
+            & (self.step_idx - self.last_fired > self.rule_cooldown)
+        self.last_fired[fired] = self.step_idx
+        if len(dets):
+            for i in self._event_rules[fired[self._event_rules]]:
+                self.rewarded[i].update(track_id[match[i] & tracked].tolist())
+        return np.where(fired, counts * self.rule_value, 0.0)
+
+    # ---------------- 结算 ----------------
+    def settlement(self, dets: Sequence[Dict]) -> Tuple[float, str]:
+        """结算界面上的名次奖励；没有识别到名次类别时返回 default。"""
+        for d in dets:
+            v = self.settlement_values.get(d["cls"])
+            if v is not None:
+                return v, d["cls"]
+        return self.settlement_default, "default"
@@ -1,17 +1,25 @@
 from __future__ import annotations
+import logging
+import subprocess
 import time
 import numpy as np
 import cv2
 from collections import deque
 from typing import Deque, Tuple, Optional
 import gymnasium as gym
-from gymnasium.spaces import Box, Discrete
+from gymnasium.spaces import Box, Discrete, MultiDiscrete
 
 from scrcpy_video import VideoDecoder
 from adb_control import AdbControl
 from env_launcher import ScrcpyLauncher
 from checker_monitor import ColorCheckerMonitor
 from game_detector import GameDetector, GameState
+from frame_context import FrameContext
+from telemetry import StageTimer, kv
+from reward_engine import RewardEngine, discrete_actions
+from match_lifecycle import DeviceDisconnected, LifecycleTimeout, MatchLifecycle
+
+log = logging.getLogger("brawlbot.env")
 
 # ——————————— 屏幕&摇杆参数 ———————————
 # SCREEN_W, SCREEN_H = 2712, 1220
@@ -29,6 +37,64 @@ DIR_VECS /= np.linalg.norm(DIR_VECS, axis=1, keepdims=True)
 ATTACK_BTN = (2280, 750)
 SKILL_BTN  = (1940, 890)
 
+# ——————————— 复合动作（方向 × 按钮）的注入命令查表 ———————————
+# 方向 0 = 回中，1-8 同 DIR_VECS；按钮 0 = 无，1 = 攻击，2 = 技能
+JOY_LUT = np.array([(JOY_CX, JOY_CY)] + [(int(JOY_CX + dx * JOY_R), int(JOY_CY + dy * JOY_R))
+                                         for dx, dy in DIR_VECS], dtype=np.int32)
+JOY_DOWN_CMD = f"input motionevent DOWN {JOY_CX} {JOY_CY}"
+MOVE_CMDS = [JOY_DOWN_CMD] + [f"input motionevent MOVE {x} {y}" for x, y in JOY_LUT[1:]]
+BUTTON_CMDS = [None, f"input tap {ATTACK_BTN[0]} {ATTACK_BTN[1]}", f"input tap {SKILL_BTN[0]} {SKILL_BTN[1]}"]
+N_DIRS, N_BUTTONS = len(MOVE_CMDS), len(BUTTON_CMDS)
+ACTION_MODES = ("discrete", "multi")
+
+
+def make_action_space(mode: str = "discrete"):
+    """config.yaml action.mode → 动作空间；离线训练（pretrain_bc）据此与 ScrcpyEnv 保持一致。"""
+    if mode not in ACTION_MODES:
+        raise ValueError(f"未知动作模式: {mode}")
+    return Discrete(11) if mode == "discrete" else MultiDiscrete([N_DIRS, N_BUTTONS])
+
+
+def unflatten_actions(flat, mode: str = "discrete") -> np.ndarray:
+    """轨迹里的整数动作（ScrcpyEnv._flat_action）还原成 env 动作；multi 模式末维为 (方向, 按钮)。"""
+    flat = np.asarray(flat, dtype=np.int64)
+    if mode == "multi":
+        return np.stack(np.divmod(flat, N_BUTTONS), axis=-1)
+    return flat
+
+
+class ObservationMode:
+    """
+    观测预处理：HUD 裁剪 → 灰度 → 整数倍缩小。默认参数等价于原始全分辨率 RGB。
+    hud_crop 为帧坐标 (x, y, w, h)。
+    """
+
+    def __init__(self, grayscale: bool = False, downscale: int = 1,
+                 hud_crop: Optional[Tuple[int, int, int, int]] = None):
+        self.grayscale = grayscale
+        self.downscale = max(1, int(downscale))
+        self.hud_crop = tuple(hud_crop) if hud_crop else None
+
+    @classmethod
+    def from_config(cls, cfg) -> "ObservationMode":
+        cfg = cfg or {}
+        return cls(cfg.get("grayscale", False), cfg.get("downscale", 1), cfg.get("hud_crop"))
+
+    @property
+    def channels(self) -> int:
+        return 1 if self.grayscale else 3
+
+    def frame_shape(self, frame_wh: Tuple[int, int]) -> Tuple[int, int]:
+        """返回处理后单帧的 (H, W)。"""
+        w, h = self.hud_crop[2:] if self.hud_crop else frame_wh
+        return h // self.downscale, w // self.downscale
+
+    def apply(self, frame) -> np.ndarray:
+        """返回 (H, W, C)，C 为 1 或 3。"""
+        img = FrameContext.wrap(frame).processed(self.hud_crop, self.downscale, self.grayscale)
+        return img[..., None] if img.ndim == 2 else img
+
+
 class ScrcpyEnv(gym.Env):
     metadata = {"render_modes": ["human"], "render_fps": 30}
 
@@ -38,7 +104,20 @@ class ScrcpyEnv(gym.Env):
                  detector: GameDetector,
                  launch:ScrcpyLauncher,
                  resize: Tuple[int, int],
-                 frame_stack: int = 4):
+                 frame_stack: int = 4,
+                 motion_method: str = "orb",
+                 recorder=None,
+                 obs_mode: Optional[ObservationMode] = None,
+                 reward_engine: Optional[RewardEngine] = None,
+                 lifecycle_cfg: Optional[dict] = None,
+                 action_mode: str = "discrete",
+                 viewer=None):
+        """
+        action_mode : discrete —— Discrete(11)，移动 / 攻击 / 技能三选一；
+                      multi    —— MultiDiscrete([9, 3])，同一步内移动并攻击 / 放技能，
+                                  每步的触控命令合成一次 shell_batch 注入
+        viewer      : 可选 LiveViewer；每步把检测框与统计交给它，render() 时才按需创建
+        """
         super().__init__()
         self.decoder = decoder #VideoDecoder(host, video_port, resize=resize)
         self.ctrl = ctrl #AdbControl(serial)
@@ -46,114 +125,106 @@ class ScrcpyEnv(gym.Env):
         self.launch = launch
         self.resize = resize
         self.frame_stack = frame_stack          # ← 保存一下，后面要用
+        self.recorder = recorder                # 可选 TrajectoryWriter，记录离线数据
+        self.viewer = viewer
+        self.obs_mode = obs_mode or ObservationMode()
+        self.rewards = reward_engine or RewardEngine()   # 奖励规则见 config.yaml 的 reward 段
+        # 大厅 / 匹配 / 结算流程，见 config.yaml 的 lifecycle 段
+        self.lifecycle = MatchLifecycle(decoder, ctrl, detector, lifecycle_cfg)
+        lc = lifecycle_cfg or {}
+        self.max_reset_attempts = int(lc.get("max_reset_attempts", 3))
+        self.reconnect_timeout = float(lc.get("reconnect_timeout", 600))
 
         self.batel_num = 0
 
-        # === 动作空间同原来 ===
-        self.action_space = Discrete(11)
-
-        self.last_action = None  # 新增：记录上一个有效动作
-        self.action_counter = 0  # 新增：连续执行同一动作的计数器
+        self.action_space = make_action_space(action_mode)
+        self.action_mode = action_mode
 
         # —— 关键：把 observation_space 改成 (C, H, W) ——
         h, w = self.resize[1], self.resize[0]
-        c = frame_stack * 3                     # 3 通道 × 堆叠帧
-        self.observation_space = Box(0, 255, (c, h, w), np.uint8)
+        oh, ow = self.obs_mode.frame_shape((w, h))
+        c = frame_stack * self.obs_mode.channels  # 通道 × 堆叠帧
+        self.observation_space = Box(0, 255, (c, oh, ow), np.uint8)
 
-        self.frames: Deque[np.ndarray] = deque(maxlen=frame_stack)
+        self.frames: Deque[np.ndarray] = deque(maxlen=frame_stack)   # 预处理后的观测帧
+        self._last_frame: Optional[np.ndarray] = None                 # 最近一张原始帧
         self.frame_num = 0
         # 动作计数器（长度=动作空间大小）
         self.action_counts = [0] * 11
         self.step_counter = 0  # 当前窗口步数计数器
 
         roi = (int(w/2), int(h/2), 300, 150)
-        self.monitor = ColorCheckerMonitor(roi)
-
-    def execute_battle_flow(self):
-        isStart = False
-        while not isStart:  # 等待游戏开始
-            time.sleep(0.1)
-            if not self.ctrl.check_adb_link() :
-                break
-
-            frame = self.decoder.read()
-            if frame is None: continue
-            dets = self.detector.detect(frame)
-
-            if len(dets) == 0:
-                continue
-            for d in dets:
-                cls_name = d["cls"]
-                if d["conf"] < 0.8:
-                    continue
-                pot = self.detector.bbox_center2screen_pos(d["xyxy"])
-                if cls_name == "BattleBtn" :
-                    self.ctrl.tap(*pot)
-                    continue
-
-                if cls_name == "QuitBtn":
-                    self.ctrl.tap(*pot)
-                    continue
-
-                if cls_name == "ContinueBtn":
-                    self.ctrl.tap(*pot)
-                    continue
-
-                if cls_name == "ExitCheckout":
-                    self.ctrl.tap(*pot)
-                    continue
-
-                if cls_name == "AgainBtn":
-                    self.ctrl.tap(*pot)
-                    continue
-
-                if cls_name in ["SkillCD", "SkillFull", "InBattle"]:
-                    isStart =True
-                    break
+        self.monitor = ColorCheckerMonitor(roi, method=motion_method)
+        self.timer = StageTimer()               # 每步分阶段耗时，写入 info["timings"]
 
     # -------------- Gym API --------------
     def reset(self, *, seed=None, options=None):
-        print("重置环境")
+        log.info("重置环境")
         super().reset(seed=seed)
 
-        while True:
-            time.sleep(1)
-            # 加入循环体？等待重连
-            if not self.ctrl.check_adb_link() :
-                print("等待设备重新连接")
-                while True :
-                    time.sleep(1)
-                    if self.ctrl.check_adb_link() :
-                        print("设备已连接")
-                        time.sleep(10)
-                        self.launch.launch()
-                        self.decoder.link_av()
-                        break
-
-            self.frames.clear()
-            print("尝试启动战斗")
-            self.execute_battle_flow()
-            f = self.decoder.read()
-            for _ in range(self.frames.maxlen):
-                self.frames.append(f)
-
-            self.last_action = None  # 新增：重置动作记录
-            self.action_counter = 0  # 新增：重置计数器
-
-            if self.ctrl.check_adb_link() :
+        info = {}
+        for attempt in range(1, self.max_reset_attempts + 1):
+            self._wait_device()
+            try:
+                info = self.lifecycle.wait_for_battle()
                 break
-            else:
-                print("设备已断开连接 ")
+            except DeviceDisconnected:
+                # 不在这里重连：下一轮的 _wait_device() 等设备回来后再重新拉起 scrcpy
+                log.warning("设备断开，等待重连", extra=kv(attempt=attempt))
+            except LifecycleTimeout as e:
+                log.warning("进入战斗失败，重连后重试", extra=kv(attempt=attempt, reason=str(e)))
+                self._relaunch()
+        else:
+            raise RuntimeError(f"[ScrcpyEnv] 连续 {self.max_reset_attempts} 次未能进入战斗")
+
+        self.frames.clear()
+        f = self.decoder.read()
+        self._last_frame = f
+        obs_f = self.obs_mode.apply(f) if f is not None else None
+        for _ in range(self.frames.maxlen):
+            self.frames.append(obs_f)
+
+        if hasattr(self.detector, "reset"):
+            self.detector.reset()            # 新的一局，清空跟踪轨迹
+        self.monitor.reset()
+        self.rewards.reset()
+        if self.recorder is not None and self._last_frame is not None:
+            self.recorder.start_episode(self._last_frame)
 
         self.batel_num +=1
         self.ctrl.touch_down(JOY_CX, JOY_CY)
-        print("开始战斗... 场次", self.batel_num)
-        return self._obs(), {}
-
-    def step(self, action: int):
+        log.info("开始战斗", extra=kv(battle=self.batel_num, time_to_battle_s=info.get("time_to_battle_s")))
+        return self._obs(), {"lifecycle": {**info, **self.lifecycle.stats()}}
+
+    def _wait_device(self):
+        """设备断开时等待重连（有上限），重连后重新拉起 scrcpy。"""
+        if self.ctrl.check_adb_link():
+            return
+        log.warning("等待设备重新连接")
+        deadline = time.monotonic() + self.reconnect_timeout
+        while not self.ctrl.check_adb_link():
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"[ScrcpyEnv] {self.reconnect_timeout:.0f}s 内设备未重新连接")
+            time.sleep(1)
+        log.info("设备已连接")
+        time.sleep(10)
+        self._relaunch()
+
+    def _relaunch(self):
+        """先关掉旧的解码线程与 scrcpy-server，再重新拉起，避免残留进程和第二个读线程。"""
+        self.decoder.close()
+        try:
+            self.launch.stop()
+        except subprocess.CalledProcessError as e:
+            # 设备刚重连时旧的 forward 可能已经不在了
+            log.warning("停止旧的 scrcpy-server 失败", extra=kv(error=str(e)))
+        self.launch.launch()
+        self.decoder.link_av()
+
+    def step(self, action):
         self.frame_num +=1
-        print(f"Setp: {self.frame_num} --------------------------")
-        print(f"执行动作: {action}")
+        timer = self.timer
+        timer.begin()
 
         terminated = False
         truncated = False
@@ -161,153 +232,119 @@ class ScrcpyEnv(gym.Env):
         reward = 0.0
 
         # —— 动作 → 触控 ——
-        if 1 <= action <= 8:                       # 摇杆方向
-            dx, dy = DIR_VECS[action - 1]
-            x = int(JOY_CX + dx * JOY_R)
-            y = int(JOY_CY + dy * JOY_R)
-            self.ctrl.touch_move(x, y)
-        elif action == 9:                          # 普通攻击
-            self.ctrl.tap(*ATTACK_BTN)
-        elif action == 10:                         # 技能
-            self.ctrl.tap(*SKILL_BTN)
-
-        if action == 0 or action > 8:
-            self.ctrl.touch_down(JOY_CX, JOY_CY)
-
-
-        # 更新动作计数器
-        self.action_counts[action] += 1
+        with timer.stage("action"):
+            if self.action_mode == "multi":
+                self._inject_composite(action)
+            elif 1 <= action <= 8:                     # 摇杆方向
+                dx, dy = DIR_VECS[action - 1]
+                x = int(JOY_CX + dx * JOY_R)
+                y = int(JOY_CY + dy * JOY_R)
+                self.ctrl.touch_move(x, y)
+            elif action == 9:                          # 普通攻击
+                self.ctrl.tap(*ATTACK_BTN)
+            elif action == 10:                         # 技能
+                self.ctrl.tap(*SKILL_BTN)
+
+            if self.action_mode == "discrete" and (action == 0 or action > 8):
+                self.ctrl.touch_down(JOY_CX, JOY_CY)
+
+
+        # 更新动作计数器（复合动作按其包含的离散动作计数）
+        for a in discrete_actions(action):
+            self.action_counts[a] += 1
         self.step_counter += 1
 
-        if  not self.ctrl.check_adb_link() :
+        with timer.stage("adb_check"):
+            linked = self.ctrl.check_adb_link()
+        if not linked:
             terminated = True
             obs = self._obs()
             self.decoder.close()
-            print("[train_agent] ADB连接已断开，已安全退出。")
+            log.error("ADB连接已断开，已安全退出。")
+            info["timings"] = timer.end()
             return obs, reward, terminated, truncated, info
 
         # time.sleep(0.1)
 
 
         # —— 获取新帧 ——
-        frame = self.decoder.read()
+        with timer.stage("frame_fetch"):
+            frame = self.decoder.read()
         if frame is None:
-            print("帧读取失败")
-
-        self.save_frame(self.frame_num, frame)
-        self.frames.append(frame)
-
-        dets = self.detector.detect(frame)
+            log.warning("帧读取失败", extra=kv(step=self.frame_num))
+        frame_ts = getattr(self.decoder, "last_frame_ts_ns", 0)
+        if frame_ts:
+            # 帧龄：解码线程拿到这帧到现在过了多久，反映画面滞后
+            timer.record("frame_age", time.monotonic_ns() - frame_ts)
+
+        # 每帧只建一次上下文，检测 / 移动监测 / 存图共用派生视图
+        ctx = FrameContext(frame, frame_id=self.frame_num)
+        with timer.stage("save_frame"):
+            self.save_frame(self.frame_num, ctx)
+        self._last_frame = frame
+        self.frames.append(self.obs_mode.apply(ctx))
+
+        with timer.stage("detect"):
+            dets = self.detector.detect(ctx)
         terminated =  self._is_game_over(dets)
 
         if terminated:
-            reward += self._settlement_reward()
+            terms = {"settlement": self._settlement_reward()}
         else:
-            reward += self._compute_reward(dets, action)
-            moved, offset, cur_center =  self.monitor.check_movement(frame)
-            if not moved:
-                print("未移动, 扣分")
-                reward -= 1
-
+            with timer.stage("reward"):
+                _, terms = self.rewards.compute(dets, action)
+            with timer.stage("motion"):
+                moved, offset, cur_center =  self.monitor.check_movement(ctx)
+            if not moved and self.rewards.no_move_penalty:
+                terms["no_move"] = self.rewards.no_move_penalty
+        reward += sum(terms.values())
+        info["reward_terms"] = terms
+
+        if self.recorder is not None and frame is not None:
+            self.recorder.record(self._flat_action(action), reward, terminated, dets, frame)
+
+        info["timings"] = timings = timer.end()
+        if self.viewer is not None:
+            self.viewer.update(dets, {"battle": self.batel_num, "step": self.frame_num,
+                                      "action": self._flat_action(action), "reward": float(reward),
+                                      "step_ms": float(timings["total"])})
+        log.debug("step", extra=kv(step=self.frame_num, action=self._flat_action(action), reward=reward, terms=terms,
+                                   n_dets=len(dets), total_ms=round(timings["total"], 2)))
         return self._obs(), reward, terminated, truncated, info
 
     # -------------- 工具 --------------
+    def _inject_composite(self, action) -> None:
+        """复合动作 → 一行批量 shell 命令：先点按钮，再按住摇杆移到目标方向。"""
+        d, b = int(action[0]), int(action[1])
+        cmds = []
+        if b:
+            cmds.append(BUTTON_CMDS[b])
+            if d:
+                # input tap 是单指注入，会打断摇杆的按住状态：同一批里重新按下
+                cmds.append(JOY_DOWN_CMD)
+        cmds.append(MOVE_CMDS[d])
+        self.ctrl.shell_batch(cmds)
+
+    def _flat_action(self, action) -> int:
+        """写入轨迹 / 日志的整数动作；复合动作编码为 方向 × 3 + 按钮。"""
+        if self.action_mode == "multi":
+            return int(action[0]) * N_BUTTONS + int(action[1])
+        return int(action)
+
     def _obs(self) -> np.ndarray:
-        arr = np.stack(self.frames, axis=0)               # (k, H, W, 3)
-        arr = arr.transpose(0, 3, 1, 2)                   # (k, 3, H, W)
+        arr = np.stack(self.frames, axis=0)               # (k, H, W, C)
+        arr = arr.transpose(0, 3, 1, 2)                   # (k, C, H, W)
         c, h, w = arr.shape[0] * arr.shape[1], arr.shape[2], arr.shape[3]
-        return arr.reshape(c, h, w)                       # (k*3, H, W)
+        return arr.reshape(c, h, w)                       # (k*C, H, W)
 
     def _settlement_reward(self)->float:
-        print("进入奖励结算环节")
-        is_settlement_status = False
-        while True:
-            time.sleep(1)
-            if not self.ctrl.check_adb_link() :
-                break
-            frame = self.decoder.read()
-            dets = self.detector.detect(frame)
-
-            if len(dets) == 0:
-                continue
-
-            for d in dets:
-                cls_name = d["cls"]
-                if is_settlement_status:
-                    if cls_name == "RankedFirst":
-                        print("战斗胜利， 加分!")
-                        return 1000
-                    elif cls_name == "RankedSecond":
-                        print("位列第二名， 加分!")
-                        return 100
-                    else:
-                        print("战斗失败， 扣分!")
-                        return -1000
-
-                pot = self.detector.bbox_center2screen_pos(d["xyxy"])
-                if cls_name == "QuitBtn":
-                    self.ctrl.tap(*pot)
-                    continue
-
-                if cls_name == "ContinueBtn":
-                    is_settlement_status = True
-                    continue
-        return 0
-
-    def _compute_reward(self, dets, action:int) -> float:
-        reward = 0
-
-        # 所有移动方向均给予基础奖励
-        if 1 <= action <= 8:
-            reward += 1.0  # 鼓励移动
-
-        # 攻击动作给予适度奖励（即使未命中）
-        if action == 9:
-            reward += 0.5
-
-        # 调整重复惩罚机制
-        if action == self.last_action:
-            self.action_counter += 1
-            # 阶梯式惩罚：重复次数越多惩罚越重
-            reward -= min(2 * self.action_counter, 10)
-        else:
-            self.action_counter = 0
-
-        if len(dets) == 0:
-            return reward
-
-        for d in dets:
-            cls_name = d["cls"]
-            if cls_name == "DefeatTips":
-                continue
-
-            if cls_name == "EnemyBloodLoss":
-                print("敌方掉血，加分")
-                reward += 5
-                continue
-
-            if cls_name == "HeroBloodLoss":
-                print("玩家掉血，扣分")
-                reward -= 5
-                continue
-
-            if cls_name == "SkillCD" and action == 10:
-                print("操作冷却中的技能，扣分!")
-                reward -= 1
-                continue
-
-            if cls_name == "LowHP":
-                print("血量过低， 扣分!")
-                reward -= 1
-                continue
-
-            if cls_name == "KillEnemy" and d["conf"] >=0.95:
-                print("击杀敌人， 加分!")
-                reward += 50
-                print(d)
-                continue
-
-        return reward
+        log.info("进入奖励结算环节")
+        dets = self.lifecycle.settle(self.rewards.settlement_values)
+        if dets is None:
+            return 0.0
+        value, rank = self.rewards.settlement(dets)
+        log.info("结算奖励", extra=kv(rank=rank, reward=value))
+        return value
 
     def _is_game_over(self, dets) -> bool:
         if len(dets) == 0:
@@ -319,7 +356,7 @@ class ScrcpyEnv(gym.Env):
             if cls_name in ["DefeatTips", "ContinueBtn"]:
                 # 游戏失败会直接跳转到失败界面，然后需要确认退出
                 # 游戏胜利时候会直接出现有继续的按钮的页面
-                print("游戏结束")
+                log.info("游戏结束")
                 return True
 
             if cls_name in ["SkillCD", "SkillFull"]:
@@ -330,11 +367,21 @@ class ScrcpyEnv(gym.Env):
     def render(self, mode="human"):
         if mode != "human":
             raise NotImplementedError
-        cv2.imshow("ScrcpyEnv", self.frames[-1])
-        cv2.waitKey(1)
+        # 不在训练进程里开窗口：画面由 LiveViewer 线程按需编码，浏览器打开其 URL 查看
+        if self.viewer is None:
+            from live_viewer import LiveViewer
+            self.viewer = LiveViewer(self.decoder)
+        self.viewer.start()
     def save_frame(self, frame_num, frame):
         path = "./frames/frame_" + str(frame_num) + ".png"
-        cv2.imwrite(path, frame)
+        # imwrite 期望 BGR；解码帧是 RGB
+        cv2.imwrite(path, FrameContext.wrap(frame).bgr)
 
     def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+        if hasattr(self.ctrl, "close"):
+            self.ctrl.close()               # AdbShellControl 的常驻 shell 会话
+        if self.viewer is not None:
+            self.viewer.close()
         self.decoder = None
@@ -0,0 +1,182 @@
+"""
+scrcpy_protocol.py
+~~~~~~~~~~~~~~~~~~
+直接解析 scrcpy 视频协议（raw_stream=false, send_frame_meta=true）：
+
+    dummy byte (1)                          forward 模式下连接建立的确认
+    codec meta: codec_id u32 | width u32 | height u32
+    每个包: pts_and_flags u64 | size u32 | payload
+            bit63 = 配置包（SPS/PPS），bit62 = 关键帧，低 62 位 = PTS（µs，设备采集时刻）
+
+包直接送进 PyAV CodecContext，不经过 FFmpeg 的格式探测，连接后第一个关键帧即可出图。
+每帧附带设备端 PTS；主机与设备时钟不同步，这里用 (接收时刻 − PTS) 的滑动最小值作为
+时钟偏移估计，得到的是相对最佳一帧的额外延迟（精确到抖动与排队，不含固定的传输下限）。
+"""
+from __future__ import annotations
+import socket
+import struct
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import av
+
+from scrcpy_video import VideoDecoder
+
+__all__ = ["ScrcpyProtocolDecoder", "make_decoder", "CODEC_IDS", "PACKET_FLAG_CONFIG", "PACKET_FLAG_KEY_FRAME"]
+
+PACKET_FLAG_CONFIG = 1 << 63
+PACKET_FLAG_KEY_FRAME = 1 << 62
+PTS_MASK = PACKET_FLAG_KEY_FRAME - 1
+
+_HEADER = struct.Struct(">QI")
+_CODEC_META = struct.Struct(">III")
+
+# scrcpy codec id（ASCII）→ FFmpeg 解码器名
+CODEC_IDS = {
+    0x68323634: "h264",     # "h264"
+    0x68323635: "hevc",     # "h265"
+    0x00617631: "av1",      # "av1"
+}
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("scrcpy 视频连接已关闭")
+        got += k
+    return bytes(buf)
+
+
+class ScrcpyProtocolDecoder(VideoDecoder):
+    """
+    与 VideoDecoder 接口一致（read / read_stamped / wait_frame / stats），
+    额外在 last_frame_meta 中给出 {pts_us, key_frame, recv_ts_ns, latency_ms}。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 27183, resize: Optional[Tuple[int, int]] = None,
+                 thread_type: str = "AUTO", connect_timeout: float = 5.0, offset_window: int = 300,
+                 **kw):
+        self.host, self.port = host, port
+        self.connect_timeout = connect_timeout
+        self._offsets: Deque[int] = deque(maxlen=offset_window)
+        self._sock: Optional[socket.socket] = None
+        super().__init__(host, port, resize=resize, thread_type=thread_type, **kw)
+
+    # ---------------- 连接 ----------------
+    def _connect(self) -> socket.socket:
+        """adb forward 在 server 就绪前也会接受连接然后立刻关闭：读到 dummy byte 才算连上。"""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+            try:
+                if sock.recv(1):
+                    sock.settimeout(None)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    return sock
+            except OSError:
+                pass
+            sock.close()
+            if time.monotonic() > deadline:
+                raise ConnectionError(f"[scrcpy] {self.host}:{self.port} 未收到握手字节")
+            time.sleep(0.1)
+
+    def _open(self):
+        self._sock = self._connect()
+        codec_id, width, height = _CODEC_META.unpack(_recv_exact(self._sock, _CODEC_META.size))
+        name = CODEC_IDS.get(codec_id)
+        if name is None:
+            raise ValueError(f"[scrcpy] 未知编码 0x{codec_id:08x}")
+        self.codec = av.CodecContext.create(name, "r")
+        self.codec.thread_type = self.thread_type
+        if self.mode == "idle":
+            self._apply_skip_frame(self.idle_skip_frame)
+        self.video_size = (width, height)
+        self._offsets.clear()
+        print(f"[scrcpy] 协议连接成功: {name} {width}x{height}")
+
+    def _codec_context(self):
+        return self.codec
+
+    def _close_source(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def link_av(self):
+        # 旧连接的读线程必须先退出：否则新旧两个线程会交替读同一个 socket，帧头错位
+        if getattr(self, "_thread", None) is not None and self._thread.is_alive():
+            self.close()
+        super().link_av()
+
+    def close(self, timeout: float = 5.0):
+        self._running = False
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)      # 让阻塞中的 recv 立即返回
+            except OSError:
+                pass
+        self._thread.join(timeout)
+        self._close_source()
+
+    # ---------------- 读包 ----------------
+    @staticmethod
+    def read_packet(sock: socket.socket) -> Tuple[int, int, bytes]:
+        """返回 (pts_and_flags, 接收时刻 ns, payload)。"""
+        pts_flags, size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+        payload = _recv_exact(sock, size)
+        return pts_flags, time.monotonic_ns(), payload
+
+    def _reader_loop(self):
+        # 线程启动时绑定本次连接的 socket / 解码器，重连后不会去读新连接
+        sock, codec = self._sock, self.codec
+        config = b""
+        recv_ts: Dict[int, int] = {}
+        try:
+            while self._running:
+                pts_flags, t_recv, payload = self.read_packet(sock)
+                if pts_flags & PACKET_FLAG_CONFIG:
+                    # SPS/PPS 与下一个媒体包合并后再送解码器，与 scrcpy 客户端相同
+                    config = payload
+                    continue
+                pts = pts_flags & PTS_MASK
+                packet = av.Packet(config + payload if config else payload)
+                config = b""
+                packet.pts = pts
+                recv_ts[pts] = t_recv
+
+                t0 = time.monotonic_ns()
+                for frame in codec.decode(packet):
+                    # 帧级多线程解码时输出会滞后几个包：用帧自己的 pts 找回对应包的信息
+                    fpts = frame.pts if frame.pts is not None else pts
+                    meta = self._frame_meta(fpts, frame.key_frame, recv_ts.pop(fpts, t_recv))
+                    self._publish(frame, t0, meta)
+                    t0 = time.monotonic_ns()
+                if len(recv_ts) > 64:           # 多线程解码的在途帧不会这么多，防止异常时泄漏
+                    recv_ts.clear()
+        except (ConnectionError, OSError) as e:
+            if self._running:
+                print(f"[scrcpy] 视频流中断: {e}")
+
+    def _frame_meta(self, pts_us: int, key: bool, recv_ts_ns: int) -> Dict:
+        offset = recv_ts_ns - pts_us * 1000
+        self._offsets.append(offset)
+        latency_ms = (time.monotonic_ns() - pts_us * 1000 - min(self._offsets)) / 1e6
+        return {"pts_us": pts_us, "key_frame": bool(key), "recv_ts_ns": recv_ts_ns, "latency_ms": latency_ms}
+
+
+def make_decoder(config, host: str, port: int, **kw) -> VideoDecoder:
+    """
+    按 config 的 stream.protocol 选择解码器：raw（裸 H.264 + FFmpeg 探测）或 scrcpy（本模块）；
+    stream.idle_fps / idle_skip_frame 作为 idle 模式参数传入。
+    """
+    stream = config.get("stream", {}) or {}
+    for key in ("idle_fps", "idle_skip_frame"):
+        if stream.get(key) is not None:
+            kw.setdefault(key, stream[key])
+    cls = ScrcpyProtocolDecoder if stream.get("protocol", "raw") == "scrcpy" else VideoDecoder
+    return cls(host, port, **kw)
@@ -2,7 +2,11 @@
 from __future__ import annotations
 import av, cv2, threading, time
 import numpy as np
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
+
+DECODE_MODES = ("active", "idle")
+# 编码器按 8 像素对齐宽高；与目标尺寸相差不到这么多时不做插值缩放
+_ALIGN_SLACK = 8
 
 
 class VideoDecoder:
@@ -16,10 +20,25 @@ class VideoDecoder:
         host: str = "127.0.0.1",
         port: int = 27183,
         resize: Optional[Tuple[int, int]] = None,
+        thread_type: str = "AUTO",
+        idle_fps: float = 2.0,
+        idle_skip_frame: str = "NONREF",
     ):
+        """
+        thread_type     : PyAV 解码线程模式。AUTO 会启用帧级多线程（吞吐高、多几帧延迟），
+                          SLICE / NONE 延迟更低。
+        idle_fps        : idle 模式下 RGB 转换 + 缩放的最高频率
+        idle_skip_frame : idle 模式下解码器的 skip_frame（NONREF / NONKEY / DEFAULT）；
+                          NONKEY 只在推流关键帧间隔较短时可用（video_codec_options: i-frame-interval）
+        """
         url = f"tcp://{host}:{port}"
         self.url = url
         self.resize = resize
+        self.thread_type = thread_type
+        self.idle_fps = idle_fps
+        self.idle_skip_frame = idle_skip_frame
+        self.mode = "active"
+        self._min_interval_ns = 0
         self.link_av()
 
     # ---------------- 公共接口 ----------------
@@ -31,41 +50,174 @@ class VideoDecoder:
         block   : True 阻塞到拿到第一帧；False 立即返回 None
         timeout : 首帧最大等待秒数
         """
+        if not self._wait_first(block, timeout):
+            return None
+
+        with self._lock:
+            return self._take()
+
+    def read_stamped(self, *, block: bool = True, timeout: float = 1.0):
+        """同 read()，额外返回该帧的解码完成时刻 (frame, ts_ns)；二者在同一把锁下读取。"""
+        if not self._wait_first(block, timeout):
+            return None, 0
+        with self._lock:
+            return self._take(), self.last_frame_ts_ns
+
+    def wait_frame(self, after_ts_ns: int = 0, timeout: float = 1.0):
+        """
+        阻塞到出现比 after_ts_ns 更新的帧，返回 (frame, ts_ns)；超时返回 (None, 0)。
+        由解码线程通知唤醒，不做睡眠轮询。
+        """
+        with self._new_frame:
+            ok = self._new_frame.wait_for(lambda: self.last_frame_ts_ns > after_ts_ns, timeout)
+            if not ok:
+                return None, 0
+            return self._take(), self.last_frame_ts_ns
+
+    def set_mode(self, mode: str) -> None:
+        """
+        active：每帧都解码、转换；idle：解码器跳过非必要帧（skip_frame），
+        并把 RGB 转换 + 缩放限制在 idle_fps 以内。大厅 / 匹配 / 结算时由 MatchLifecycle 切到 idle。
+        """
+        if mode not in DECODE_MODES:
+            raise ValueError(f"未知解码模式: {mode}")
+        if mode == self.mode:
+            return
+        self.mode = mode
+        idle = mode == "idle"
+        self._min_interval_ns = int(1e9 / self.idle_fps) if idle and self.idle_fps > 0 else 0
+        self._apply_skip_frame(self.idle_skip_frame if idle else "DEFAULT")
+
+    def _codec_context(self):
+        return self.stream.codec_context
+
+    def _apply_skip_frame(self, value: str) -> None:
+        try:
+            self._codec_context().skip_frame = value
+        except (AttributeError, ValueError) as e:
+            # 老版本 PyAV 没有 skip_frame：只保留转换限频
+            print(f"[VideoDecoder] skip_frame={value} 不可用: {e}")
+
+    def stats(self, reset: bool = False) -> Dict[str, float]:
+        """
+        解码负载与消费情况（自上次 reset 起）：
+        decoded / consumed / dropped 帧数，idle 模式下未转换的 skipped 帧数，
+        decode_fps，每帧解码+转换耗时，以及 load = 解码线程忙碌时间 / 墙钟时间。
+        """
+        with self._lock:
+            wall = max(1e-9, (time.monotonic_ns() - self._stats_t0) / 1e9)
+            decoded, consumed = self._stats_decoded, self._stats_consumed
+            busy_s = self._stats_busy_ns / 1e9
+            out = {
+                "decoded": decoded,
+                "consumed": consumed,
+                "dropped": max(0, decoded - consumed),
+                "skipped": self._stats_skipped,
+                "decode_fps": decoded / wall,
+                "decode_ms": busy_s * 1000 / decoded if decoded else 0.0,
+                "load": busy_s / wall,
+            }
+            if reset:
+                self._reset_stats()
+        return out
+
+    def _reset_stats(self) -> None:
+        self._stats_t0 = time.monotonic_ns()
+        self._stats_decoded = self._stats_consumed = self._stats_busy_ns = self._stats_skipped = 0
+
+    def _take(self) -> np.ndarray:
+        """持锁调用：复制最新帧（防止外部修改原帧），并统计被消费的新帧。"""
+        if self.last_frame_ts_ns != self._last_taken_ts:
+            self._last_taken_ts = self.last_frame_ts_ns
+            self._stats_consumed += 1
+        return self._last_frame.copy()
+
+    def _wait_first(self, block: bool, timeout: float) -> bool:
         start = time.time()
         while self._last_frame is None:
             if not block or (time.time() - start) > timeout:
-                return None
+                return False
             time.sleep(0.005)
+        return True
 
-        with self._lock:
-            return self._last_frame.copy()       # 防止外部修改原帧
-
-    def close(self):
+    def close(self, timeout: float = 5.0):
         self._running = False
-        self._thread.join()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # 流已停滞、demux 一直阻塞：不能在线程还在读时关容器，留给线程在连接断开后自行退出
+            print(f"[VideoDecoder] 解码线程 {timeout:.0f}s 内未退出，跳过关闭容器")
+            return
+        self._close_source()
+
+    def _close_source(self):
         self.container.close()
 
     def link_av(self):
+        self._open()
+        self._init_state()
+        self._running = True
+        self._thread = threading.Thread(target=self._reader_loop, daemon=True)
+        self._thread.start()
+
+    def _open(self):
         self.container = av.open(self.url, options={"fflags": "nobuffer"})
         self.stream = self.container.streams.video[0]
-        self.stream.thread_type = "AUTO"
+        self.stream.thread_type = self.thread_type
+        if self.mode == "idle":                     # 重连后保持当前模式
+            self._apply_skip_frame(self.idle_skip_frame)
 
+    def _init_state(self):
         self._last_frame: Optional[np.ndarray] = None
+        self.last_frame_ts_ns = 0        # 最新帧解码完成时刻（monotonic ns），用于计算帧龄
+        self.n_frames = 0                # 自连接以来解码的帧数
+        self.last_frame_meta: Optional[Dict] = None
         self._lock = threading.Lock()
-
-        self._running = True
-        self._thread = threading.Thread(target=self._reader_loop, daemon=True)
-        self._thread.start()
+        self._new_frame = threading.Condition(self._lock)
+        self._last_taken_ts = 0
+        self._reset_stats()
 
     # ---------------- 内部线程 ----------------
     def _reader_loop(self):
-        for packet in self.container.demux(self.stream):
-            if not self._running:
-                break
-            for frame in packet.decode():
-                img = frame.to_ndarray(format="rgb24")
-                if self.resize:
-                    img = cv2.resize(img, self.resize,
-                                     interpolation=cv2.INTER_AREA)
-                with self._lock:
-                    self._last_frame = img
+        try:
+            for packet in self.container.demux(self.stream):
+                if not self._running:
+                    break
+                t0 = time.monotonic_ns()
+                for frame in packet.decode():
+                    self._publish(frame, t0)
+                    t0 = time.monotonic_ns()
+        except Exception as e:          # 连接被关闭 / 设备断开
+            if self._running:
+                print(f"[VideoDecoder] 视频流中断: {e}")
+
+    def _publish(self, frame, t0: int, meta: Optional[Dict] = None) -> int:
+        """
+        把解码出的 av.VideoFrame 转成 RGB ndarray 存为最新帧；t0 为这一帧开始解码的时刻，
+        meta 为协议层附带的帧信息（见 scrcpy_protocol），与帧在同一把锁下更新。
+        idle 模式下距上一帧不足 1/idle_fps 的帧不转换，直接丢弃，返回 0。
+        """
+        if self._min_interval_ns and t0 - self.last_frame_ts_ns < self._min_interval_ns:
+            self._stats_skipped += 1
+            return 0
+        img = frame.to_ndarray(format="rgb24")
+        # 推流已按观测尺寸编码（launcher max_size）时不必再缩放；
+        # 编码器把宽高向下取整到 8 的倍数（1088x489 → 1088x488），差几个像素时只补边 / 裁边
+        if self.resize and (img.shape[1], img.shape[0]) != tuple(self.resize):
+            dw, dh = self.resize[0] - img.shape[1], self.resize[1] - img.shape[0]
+            if abs(dw) < _ALIGN_SLACK and abs(dh) < _ALIGN_SLACK:
+                img = img[:self.resize[1], :self.resize[0]]
+                if dw > 0 or dh > 0:
+                    img = cv2.copyMakeBorder(img, 0, max(dh, 0), 0, max(dw, 0), cv2.BORDER_REPLICATE)
+            else:
+                img = cv2.resize(img, self.resize,
+                                 interpolation=cv2.INTER_AREA)
+        now = time.monotonic_ns()
+        with self._lock:
+            self._last_frame = img
+            self.last_frame_ts_ns = now
+            self.last_frame_meta = meta
+            self.n_frames += 1
+            self._stats_decoded += 1
+            self._stats_busy_ns += now - t0
+            self._new_frame.notify_all()
+        return now
@@ -0,0 +1,90 @@
+"""
+stream_tune.py
+~~~~~~~~~~~~~~
+推流参数自动调优：对若干 max_fps 候选各推流一段时间，按 env 的控制频率消费帧，
+同时记录解码负载（VideoDecoder.stats）与消费时的帧龄，
+选出帧龄满足预算的最低帧率——解码 CPU 只为 agent 真正用到的帧付费。
+
+Usage:
+    python stream_tune.py --fps 15 20 30 45 60 --seconds 8 --max-age-ms 50
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+import yaml
+
+from env_launcher import ScrcpyLauncher, derive_stream_options
+from scrcpy_protocol import make_decoder
+
+
+def _bit_rate_for(config, fps: int) -> int:
+    stream = {**(config.get("stream") or {}), "max_fps": fps}
+    return derive_stream_options({**config, "stream": stream})["video_bit_rate"]
+
+
+def measure(config, fps: int, control_hz: float, seconds: float, warmup: float = 2.0) -> Dict[str, float]:
+    frame = config["display"]["frame"]
+    host = config["adb_bridge"]["host"]
+    # 码率随候选帧率一起推导，否则各候选都用 config 的 max_fps 算出的码率，比较的不是同一画质
+    bit_rate = _bit_rate_for(config, fps)
+    with ScrcpyLauncher.from_config(config, max_fps=fps, video_bit_rate=bit_rate) as launcher:
+        dec = make_decoder(config, host, launcher.video_port, resize=tuple(frame))
+        try:
+            if dec.read(timeout=5.0) is None:
+                raise RuntimeError("推流没有画面")
+            time.sleep(warmup)
+            dec.stats(reset=True)
+
+            ages: List[float] = []
+            period = 1.0 / control_hz
+            end = time.monotonic() + seconds
+            next_t = time.monotonic()
+            while time.monotonic() < end:
+                _, ts = dec.read_stamped()
+                ages.append((time.monotonic_ns() - ts) / 1e6)
+                next_t += period
+                time.sleep(max(0.0, next_t - time.monotonic()))
+            st = dec.stats()
+        finally:
+            dec.close()
+    return {**st, "age_p50_ms": float(np.percentile(ages, 50)), "age_p90_ms": float(np.percentile(ages, 90))}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="scrcpy 推流帧率 / 码率自动调优")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--fps", type=int, nargs="*", default=[15, 20, 30, 45, 60])
+    parser.add_argument("--control-hz", type=float, default=None, help="默认取 stream.control_hz")
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--max-age-ms", type=float, default=50.0, help="消费时帧龄 p90 的预算")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    control_hz = args.control_hz or (config.get("stream", {}) or {}).get("control_hz", 15)
+
+    print(f"控制频率 {control_hz} Hz，帧龄预算 p90 ≤ {args.max_age_ms} ms")
+    print(f"{'max_fps':>7} {'decode fps':>10} {'decode ms':>9} {'load':>6} {'dropped':>8} "
+          f"{'age p50':>8} {'age p90':>8}")
+    results = {}
+    for fps in sorted(args.fps):
+        r = results[fps] = measure(config, fps, control_hz, args.seconds)
+        print(f"{fps:>7} {r['decode_fps']:>10.1f} {r['decode_ms']:>9.2f} {r['load']:>6.1%} "
+              f"{r['dropped']:>8} {r['age_p50_ms']:>8.1f} {r['age_p90_ms']:>8.1f}")
+
+    ok = [fps for fps, r in sorted(results.items()) if r["age_p90_ms"] <= args.max_age_ms]
+    if not ok:
+        print("❌ 没有候选帧率满足帧龄预算，请放宽 --max-age-ms 或检查设备 / 网络")
+        return 1
+    best = ok[0]
+    bit_rate = _bit_rate_for(config, best)
+    print(f"\n推荐 max_fps={best}（解码负载 {results[best]['load']:.1%}），写入 config.yaml:")
+    print(yaml.safe_dump({"stream": {"max_fps": best, "video_bit_rate": bit_rate}}, sort_keys=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
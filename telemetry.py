@@ -0,0 +1,139 @@
+"""
+telemetry.py
+~~~~~~~~~~~~
+热路径延迟埋点与结构化日志：
+
+* StageTimer：perf_counter_ns 计时，每个阶段一个预分配的上下文对象，开销约 1µs
+* LatencyHistogram：固定的对数分桶直方图，累计常数内存，随时给出分位数
+* 汇总到 SB3 logger 由 train_agent.StepTimingCallback 完成（本模块不依赖 torch）
+* setup_logging()：key=value 结构化输出，按级别开关；逐步日志用 DEBUG
+"""
+from __future__ import annotations
+import logging
+import sys
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+
+__all__ = [
+    "STEP_STAGES", "LatencyHistogram", "StageTimer", "setup_logging", "kv",
+]
+
+# ScrcpyEnv.step 的埋点阶段
+STEP_STAGES = (
+    "action", "adb_check", "frame_fetch", "detect", "motion", "reward", "save_frame", "total",
+)
+
+
+# ───────────────────── 直方图 ─────────────────────
+class LatencyHistogram:
+    """10µs ~ 100s 对数分桶（每 10 倍 16 桶），单位 ns。"""
+
+    EDGES = np.logspace(4, 11, num=7 * 16 + 1)
+
+    def __init__(self):
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+        self.total_ns = 0
+        self.n = 0
+        self.max_ns = 0
+
+    def add(self, ns: int) -> None:
+        self.counts[np.searchsorted(self.EDGES, ns)] += 1
+        self.total_ns += ns
+        self.n += 1
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q: float) -> float:
+        """返回分位数（ms），取所在桶的上沿。"""
+        if self.n == 0:
+            return 0.0
+        idx = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.n))
+        edge = self.EDGES[min(idx, len(self.EDGES) - 1)]
+        return float(min(edge, self.max_ns)) / 1e6
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ns / self.n / 1e6 if self.n else 0.0
+
+    def reset(self) -> None:
+        self.counts[:] = 0
+        self.total_ns = self.n = self.max_ns = 0
+
+
+# ───────────────────── 计时器 ─────────────────────
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer: "StageTimer", name: str):
+        self.timer = timer
+        self.name = name
+        self.t0 = 0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.last[self.name] = time.perf_counter_ns() - self.t0
+        return False
+
+
+class StageTimer:
+    """
+    用法::
+
+        timer.begin()
+        with timer.stage("detect"):
+            ...
+        info["timings"] = timer.end()
+    """
+
+    def __init__(self, stages: Iterable[str] = STEP_STAGES):
+        self._stages = {name: _Stage(self, name) for name in stages}
+        self.last: Dict[str, int] = {}
+        self._t0 = 0
+
+    def stage(self, name: str) -> _Stage:
+        st = self._stages.get(name)
+        if st is None:
+            st = self._stages[name] = _Stage(self, name)
+        return st
+
+    def begin(self) -> None:
+        self.last = {}
+        self._t0 = time.perf_counter_ns()
+
+    def record(self, name: str, ns: int) -> None:
+        """非计时类的量（例如帧龄）直接记入。"""
+        self.last[name] = ns
+
+    def end(self) -> Dict[str, float]:
+        self.last["total"] = time.perf_counter_ns() - self._t0
+        return {k: v / 1e6 for k, v in self.last.items()}      # ms
+
+
+# ───────────────────── 结构化日志 ─────────────────────
+def kv(**fields) -> Dict:
+    """logger.info("step", extra=kv(step=3, action=9))"""
+    return {"kv": fields}
+
+
+class _KVFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        base = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<5} {record.name} {record.getMessage()}"
+        fields = getattr(record, "kv", None)
+        if fields:
+            base += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return base
+
+
+def setup_logging(level: str | int = "INFO", stream=None) -> None:
+    root = logging.getLogger("brawlbot")
+    root.setLevel(level if isinstance(level, int) else level.upper())
+    if not root.handlers:
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(_KVFormatter())
+        root.addHandler(handler)
+    root.propagate = False
@@ -1,11 +1,11 @@
 import time
-import cv2
 from scrcpy_env     import ScrcpyEnv
 from env_launcher   import ScrcpyLauncher
 from scrcpy_video import VideoDecoder
 from adb_control import AdbControl
 from game_detector import GameState, GameDetector
 from checker_monitor import ColorCheckerMonitor
+from live_viewer import LiveViewer
 
 import yaml  # 需要安装PyYAML: pip install PyYAML
 
@@ -38,10 +38,8 @@ try:
         start_time = time.time()
         fps = 0
 
-        # 创建可调整大小的显示窗口
-        window_name = "Movement Detection"
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, FRAME_DIM[0], FRAME_DIM[1])
+        # 浏览器打开 viewer.url 查看画面；不开本地窗口，无桌面环境也能跑
+        viewer = LiveViewer.from_config(decoder, config.get("viewer")).start()
 
         roi = (int(FRAME_DIM[0]/2), int(FRAME_DIM[1]/2), 300, 150)
         monitor= ColorCheckerMonitor(roi)
@@ -63,35 +61,16 @@ try:
             # 检测移动
             moved, offset, vis = monitor.check_movement(frame)
 
-            # 在图像上显示FPS
-            cv2.putText(vis, f"FPS: {fps:.1f}", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-            # 显示结果（窗口大小已预先设置）
-            cv2.imshow(window_name, frame)
+            # FPS 与移动检测结果叠加在画面上
+            viewer.update(stats={"FPS": fps, "moved": moved, "offset": offset})
 
             # 打印检测结果
             print(f"\r移动: {moved}, 偏移: {offset}, FPS: {fps:.1f}", end="", flush=True)
 
-            # 检测退出按键
-            key = cv2.waitKey(1)
-            if key & 0xFF == ord('q'):
-                break
-            # 可选：添加窗口大小调整快捷键
-            elif key & 0xFF == ord('1'):
-                cv2.resizeWindow(window_name, 640, 480)  # 小尺寸
-            elif key & 0xFF == ord('2'):
-                cv2.resizeWindow(window_name, 800, 600)  # 中等尺寸
-            elif key & 0xFF == ord('3'):
-                cv2.resizeWindow(window_name, 1024, 768)  # 大尺寸
-            elif key & 0xFF == ord('0'):
-                cv2.resizeWindow(window_name, FRAME_DIM[0], FRAME_DIM[1])  # 原始尺寸
-
-        cv2.destroyAllWindows()
-
 except KeyboardInterrupt:
-    cv2.destroyAllWindows()
     print("\n[train_agent] 手动中断，已安全退出。")
 
 finally:
+    if "viewer" in globals():
+        viewer.close()
     launcher.stop()
\ No newline at end of file
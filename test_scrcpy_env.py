@@ -42,13 +42,14 @@ def main(config):
                 decoder,
                 ctrl,
                 detector,
+                launcher,
                 resize,
                 )
 
             Episode = 1
             while Episode <= 5:
                 print(f"\n[train_agent] 开始训练第 {Episode} 轮。")
-                vec_env.execute_battle_flow()
+                vec_env.lifecycle.wait_for_battle()
                 start_train = True
                 while start_train:
                     obs, r, done, trunc, info = vec_env.step(vec_env.action_space.sample())
@@ -0,0 +1,12 @@
+"""
+tests/conftest.py
+~~~~~~~~~~~~~~~~~
+单元测试（不需要手机 / 模型）：
+
+    python -m pytest tests -q
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,69 @@
+"""
+tests/test_reward_engine.py
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+RewardEngine 单元测试。
+"""
+from __future__ import annotations
+
+from reward_engine import ATTACK_ACTION, RewardEngine, discrete_actions
+
+BOX = (10, 10, 50, 50)
+
+
+def _det(cls, conf, track_id=None):
+    d = {"cls": cls, "conf": conf, "xyxy": BOX}
+    if track_id is not None:
+        d["track_id"] = track_id
+        d["is_new"] = False
+    return d
+
+
+def _kill_engine():
+    return RewardEngine({"rules": [{"cls": "KillEnemy", "value": 50, "min_conf": 0.95, "event": True}]})
+
+
+def test_event_fires_when_track_first_reaches_min_conf():
+    # 轨迹诞生时置信度不够，之后的关键帧才达到 min_conf：仍应计分一次
+    eng = _kill_engine()
+    _, terms = eng.compute([_det("KillEnemy", 0.6, track_id=7)], 0)
+    assert "KillEnemy" not in terms
+    _, terms = eng.compute([_det("KillEnemy", 0.97, track_id=7)], 0)
+    assert terms["KillEnemy"] == 50
+    _, terms = eng.compute([_det("KillEnemy", 0.98, track_id=7)], 0)
+    assert "KillEnemy" not in terms
+
+
+def test_event_fires_once_per_track():
+    eng = _kill_engine()
+    assert eng.compute([_det("KillEnemy", 0.99, track_id=1)], 0)[1]["KillEnemy"] == 50
+    assert "KillEnemy" not in eng.compute([_det("KillEnemy", 0.99, track_id=1)], 0)[1]
+    # 新轨迹、以及两条轨迹同时出现时按轨迹数计分
+    terms = eng.compute([_det("KillEnemy", 0.99, track_id=1), _det("KillEnemy", 0.99, track_id=2)], 0)[1]
+    assert terms["KillEnemy"] == 50
+    eng.reset()
+    assert eng.compute([_det("KillEnemy", 0.99, track_id=1)], 0)[1]["KillEnemy"] == 50
+
+
+def test_untracked_event_counts_every_step():
+    # 不经跟踪器（detect_every: 1）时与原实现一致：每步满足条件都计分
+    eng = _kill_engine()
+    for _ in range(3):
+        assert eng.compute([_det("KillEnemy", 0.99)], 0)[1]["KillEnemy"] == 50
+
+
+def test_continuous_rule_and_action_gate():
+    eng = RewardEngine()
+    terms = eng.compute([_det("LowHP", 0.9, track_id=3)], 0)[1]
+    assert terms["LowHP"] == -1
+    assert eng.compute([_det("LowHP", 0.9, track_id=3)], 0)[1]["LowHP"] == -1
+    # SkillCD 只在放技能时惩罚
+    assert "SkillCD" not in eng.compute([_det("SkillCD", 0.9)], 0)[1]
+    assert eng.compute([_det("SkillCD", 0.9)], 10)[1]["SkillCD"] == -1
+
+
+def test_composite_action():
+    assert discrete_actions((3, 1)) == (3, ATTACK_ACTION)
+    assert discrete_actions((0, 0)) == (0,)
+    eng = RewardEngine()
+    total, terms = eng.compute([], (3, 1))
+    assert terms["action"] == 1.5 and total == 1.5
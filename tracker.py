@@ -0,0 +1,238 @@
+"""
+tracker.py
+~~~~~~~~~~
+轻量多目标跟踪（SORT / ByteTrack 风格，纯 NumPy）。
+
+* 每个目标一个常速 Kalman 滤波器，状态 (cx, cy, w, h, vx, vy, vw, vh)
+* 关键帧用 IoU 贪心关联检测框，先匹配高置信度框，再用低置信度框“续命”
+* 非关键帧只做 predict()，YOLO 可以每 k 帧跑一次
+* 每条轨迹带持久的 track_id，奖励逻辑据此对瞬时事件去重（每条轨迹只计分一次）；
+  is_new 只在诞生帧为 True
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+__all__ = ["KalmanBoxTrack", "MultiObjectTracker", "TrackedDetector", "iou_matrix"]
+
+
+# ───────────────────── 几何工具 ─────────────────────
+def _xyxy_to_cxcywh(b: Sequence[float]) -> np.ndarray:
+    x1, y1, x2, y2 = b
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float32)
+
+
+def _cxcywh_to_xyxy(s: np.ndarray) -> np.ndarray:
+    cx, cy, w, h = s[:4]
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a:(N,4)  b:(M,4)  xyxy → (N,M) IoU。"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def _greedy_match(iou: np.ndarray, thresh: float):
+    """按 IoU 从大到小贪心配对，返回 (matches, 未匹配行, 未匹配列)。"""
+    matches = []
+    if iou.size:
+        rows, cols = np.unravel_index(np.argsort(-iou, axis=None), iou.shape)
+        used_r, used_c = set(), set()
+        for r, c in zip(rows, cols):
+            if iou[r, c] < thresh:
+                break
+            if r in used_r or c in used_c:
+                continue
+            used_r.add(r)
+            used_c.add(c)
+            matches.append((int(r), int(c)))
+    mr = {m[0] for m in matches}
+    mc = {m[1] for m in matches}
+    un_r = [i for i in range(iou.shape[0]) if i not in mr]
+    un_c = [j for j in range(iou.shape[1]) if j not in mc]
+    return matches, un_r, un_c
+
+
+# ───────────────────── 单目标 Kalman ─────────────────────
+class KalmanBoxTrack:
+    """常速模型 Kalman 滤波，8 维状态。"""
+
+    # 运动模型在所有轨迹间共享
+    _F = np.eye(8, dtype=np.float32)
+    _F[:4, 4:] = np.eye(4, dtype=np.float32)
+    _H = np.eye(4, 8, dtype=np.float32)
+    _Q = np.diag([1, 1, 1, 1, 0.01, 0.01, 0.0001, 0.0001]).astype(np.float32)
+    _R = np.diag([1, 1, 10, 10]).astype(np.float32)
+
+    def __init__(self, track_id: int, det: Dict):
+        self.id = track_id
+        self.cls = det["cls"]
+        self.conf = det["conf"]
+        self.x = np.zeros(8, dtype=np.float32)
+        self.x[:4] = _xyxy_to_cxcywh(det["xyxy"])
+        self.P = np.diag([10, 10, 10, 10, 1e4, 1e4, 1e4, 1e4]).astype(np.float32)
+        self.hits = 1                 # 累计被检测命中的次数
+        self.age = 0                  # 自诞生起经过的 predict 次数
+        self.time_since_update = 0    # 距上次命中的 predict 次数
+        self.is_new = True            # 仅在诞生的那一帧为 True
+        self.visible = True           # 最近一个关键帧是否被命中；非关键帧只输出可见轨迹
+
+    def predict(self) -> np.ndarray:
+        # 宽高不能被速度推成负数
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0
+        if self.x[3] + self.x[7] <= 0:
+            self.x[7] = 0
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self._Q
+        self.age += 1
+        self.time_since_update += 1
+        return self.xyxy
+
+    def update(self, det: Dict) -> None:
+        z = _xyxy_to_cxcywh(det["xyxy"])
+        y = z - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8, dtype=np.float32) - K @ self._H) @ self.P
+        self.conf = det["conf"]
+        self.hits += 1
+        self.time_since_update = 0
+
+    @property
+    def xyxy(self) -> np.ndarray:
+        return _cxcywh_to_xyxy(self.x)
+
+    def as_det(self) -> Dict:
+        return {
+            "cls": self.cls,
+            "conf": float(self.conf),
+            "xyxy": tuple(int(v) for v in self.xyxy),
+            "track_id": self.id,
+            "is_new": self.is_new,
+        }
+
+
+# ───────────────────── 多目标跟踪器 ─────────────────────
+class MultiObjectTracker:
+    def __init__(
+        self,
+        iou_thresh: float = 0.3,
+        high_conf: float = 0.5,
+        max_age: int = 5,
+    ):
+        """
+        参数:
+            iou_thresh: 关联所需的最小 IoU
+            high_conf : 高/低置信度分界（ByteTrack 的两段式关联）
+            max_age   : 连续多少次 predict 未命中后删除轨迹
+        """
+        self.iou_thresh = iou_thresh
+        self.high_conf = high_conf
+        self.max_age = max_age
+        self.tracks: List[KalmanBoxTrack] = []
+        self._next_id = 1
+
+    def reset(self) -> None:
+        self.tracks.clear()
+
+    def predict(self) -> List[Dict]:
+        """
+        非关键帧：只做运动外推。只输出上一个关键帧命中的轨迹，与 update() 的输出一致；
+        上个关键帧已消失的框不会在中间帧重新出现。
+        """
+        for t in self.tracks:
+            t.is_new = False
+            t.predict()
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+        return [t.as_det() for t in self.tracks if t.visible]
+
+    def update(self, dets: List[Dict]) -> List[Dict]:
+        """关键帧：predict + 与检测结果关联。只输出本帧被命中的轨迹。"""
+        for t in self.tracks:
+            t.is_new = False
+            t.predict()
+
+        high = [d for d in dets if d["conf"] >= self.high_conf]
+        low = [d for d in dets if d["conf"] < self.high_conf]
+        matched_ids = set()
+
+        # 第一轮：同类别内用高置信度框关联
+        remaining = self._associate(list(self.tracks), high, matched_ids, spawn=True)
+        # 第二轮：低置信度框只用来延续已有轨迹，不新建
+        self._associate(remaining, low, matched_ids, spawn=False)
+
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+        for t in self.tracks:
+            t.visible = t.id in matched_ids
+        return [t.as_det() for t in self.tracks if t.visible]
+
+    def _associate(self, tracks, dets, matched_ids, spawn: bool):
+        unmatched_tracks = []
+        for cls in {t.cls for t in tracks} | {d["cls"] for d in dets}:
+            cls_tracks = [t for t in tracks if t.cls == cls]
+            cls_dets = [d for d in dets if d["cls"] == cls]
+            t_boxes = np.array([t.xyxy for t in cls_tracks], dtype=np.float32).reshape(-1, 4)
+            d_boxes = np.array([d["xyxy"] for d in cls_dets], dtype=np.float32).reshape(-1, 4)
+            matches, un_t, un_d = _greedy_match(iou_matrix(t_boxes, d_boxes), self.iou_thresh)
+            for ti, di in matches:
+                cls_tracks[ti].update(cls_dets[di])
+                matched_ids.add(cls_tracks[ti].id)
+            unmatched_tracks.extend(cls_tracks[i] for i in un_t)
+            if spawn:
+                for di in un_d:
+                    t = KalmanBoxTrack(self._next_id, cls_dets[di])
+                    self._next_id += 1
+                    self.tracks.append(t)
+                    matched_ids.add(t.id)
+        return unmatched_tracks
+
+
+# ───────────────────── 检测器包装 ─────────────────────
+class TrackedDetector:
+    """
+    在 GameDetector 外面套一层跟踪：每 detect_every 帧跑一次 YOLO，
+    其余帧用 Kalman 外推。接口与 GameDetector 保持一致，可直接替换。
+    """
+
+    def __init__(self, detector, detect_every: int = 3, tracker: Optional[MultiObjectTracker] = None):
+        self.detector = detector
+        self.detect_every = max(1, int(detect_every))
+        self.tracker = tracker or MultiObjectTracker()
+        self._frame_idx = 0
+
+    def detect(self, frame, **kwargs) -> List[Dict]:
+        keyframe = self._frame_idx % self.detect_every == 0
+        self._frame_idx += 1
+        if keyframe:
+            return self.tracker.update(self.detector.detect(frame, **kwargs))
+        return self.tracker.predict()
+
+    def detect_now(self, frame, **kwargs) -> List[Dict]:
+        """菜单/结算等非战斗流程：跳过跟踪，直接跑检测。"""
+        return self.detector.detect(frame, **kwargs)
+
+    def reset(self) -> None:
+        self.tracker.reset()
+        self._frame_idx = 0
+
+    def bbox_center2screen_pos(self, bbox):
+        return self.detector.bbox_center2screen_pos(bbox)
+
+    def __getattr__(self, name):
+        # 其余属性（k、model 等）透传给原检测器
+        detector = self.__dict__.get("detector")
+        if detector is None:
+            raise AttributeError(name)
+        return getattr(detector, name)
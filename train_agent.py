@@ -1,16 +1,94 @@
+import argparse
 import yaml
+import torch
+from torch import nn
+from gymnasium import spaces
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import DummyVecEnv, VecMonitor  # 新增导入
-from stable_baselines3.common.callbacks import CheckpointCallback, EvalCallback  # 新增回调函数
 
-from adb_control import AdbControl
-from scrcpy_env import ScrcpyEnv
-from scrcpy_video import VideoDecoder
+from adb_control import AdbControl, AdbShellControl
+from scrcpy_env import ScrcpyEnv, ObservationMode
+from scrcpy_protocol import make_decoder
 from env_launcher import ScrcpyLauncher
 from game_detector import GameDetector, GameState
+from tracker import TrackedDetector
+from eval_service import EvalReportCallback, start_eval_service
+from checkpoint import AsyncCheckpointCallback, latest_checkpoint, restore
+from trajectory_store import TrajectoryWriter
+from telemetry import LatencyHistogram, setup_logging
+from reward_engine import RewardEngine
+from live_viewer import LiveViewer
 
 
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+
+class CompactCNN(BaseFeaturesExtractor):
+    """
+    面向 CPU 的轻量特征提取器：大步长首层快速降采样，自适应池化固定输出尺寸，
+    参数量与计算量都远小于 NatureCNN，适合配合灰度 / 缩小后的观测。
+    """
+
+    def __init__(self, observation_space: spaces.Box, features_dim: int = 256):
+        super().__init__(observation_space, features_dim)
+        n_input = observation_space.shape[0]
+        self.cnn = nn.Sequential(
+            nn.Conv2d(n_input, 32, kernel_size=5, stride=4, padding=2),
+            nn.ReLU(),
+            nn.Conv2d(32, 64, kernel_size=3, stride=2, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(64, 64, kernel_size=3, stride=2, padding=1),
+            nn.ReLU(),
+            nn.AdaptiveAvgPool2d((4, 8)),
+            nn.Flatten(),
+        )
+        self.linear = nn.Sequential(nn.Linear(64 * 4 * 8, features_dim), nn.ReLU())
+
+    def forward(self, observations: torch.Tensor) -> torch.Tensor:
+        return self.linear(self.cnn(observations))
+
+
+FEATURE_EXTRACTORS = {"compact": CompactCNN}
+
+
+class StepTimingCallback(BaseCallback):
+    """把每步 info["timings"]（ms）累计进直方图，每次 rollout 结束写入 logger 并清零。"""
+
+    def __init__(self, percentiles=(50, 90, 99), verbose: int = 0):
+        super().__init__(verbose)
+        self.percentiles = percentiles
+        self.hists = {}
+
+    def _on_step(self) -> bool:
+        for info in self.locals.get("infos", ()):
+            for k, ms in info.get("timings", {}).items():
+                h = self.hists.get(k)
+                if h is None:
+                    h = self.hists[k] = LatencyHistogram()
+                h.add(int(ms * 1e6))
+        return True
+
+    def _on_rollout_end(self) -> None:
+        for k, h in self.hists.items():
+            if h.n == 0:
+                continue
+            self.logger.record(f"train/latency_{k}_mean_ms", h.mean_ms)
+            for q in self.percentiles:
+                self.logger.record(f"train/latency_{k}_p{q}_ms", h.percentile(q))
+            h.reset()
+
+
+def policy_kwargs_from_config(config) -> dict:
+    """policy.extractor: nature（SB3 默认）/ compact。"""
+    cfg = config.get("policy", {}) or {}
+    name = cfg.get("extractor", "nature")
+    if name == "nature":
+        return {}
+    return {
+        "features_extractor_class": FEATURE_EXTRACTORS[name],
+        "features_extractor_kwargs": {"features_dim": cfg.get("features_dim", 256)},
+    }
 
 class EntropyScheduleCallback(BaseCallback):
     def __init__(self, initial_coef=0.5, final_coef=0.01, decay_steps=10000):
@@ -26,39 +104,95 @@ class EntropyScheduleCallback(BaseCallback):
         self.logger.record("train/ent_coef", current_coef)
         return True
 
-def main(config):
+    # —— 供 AsyncCheckpointCallback 保存 / 恢复 ——
+    def state_dict(self):
+        return {
+            "initial_coef": self.initial_coef,
+            "final_coef": self.final_coef,
+            "decay_steps": self.decay_steps,
+        }
+
+    def load_state_dict(self, state):
+        self.initial_coef = state["initial_coef"]
+        self.final_coef = state["final_coef"]
+        self.decay_steps = state["decay_steps"]
+
+def build_env(config, launcher, *, serial=None, port=None) -> ScrcpyEnv:
+    """
+    在 launcher 已启动（adb forward 就绪）的前提下，按 config 组装
+    解码器 / 检测器 / 控制器并返回 ScrcpyEnv。serial / port 默认取 adb_bridge。
+    """
     SCREEN_DIM = config["display"]["screen"]
     FRAME_DIM = config["display"]["frame"]
-    ADB_BRIDGE = config["adb_bridge"]
 
     host  = config["adb_bridge"]["host"]
-    port  = config["adb_bridge"]["port"]
-    serial = config["adb_bridge"]["serial"]
+    port  = port if port is not None else config["adb_bridge"]["port"]
+    serial = serial if serial is not None else config["adb_bridge"]["serial"]
 
     k =  SCREEN_DIM[0]/FRAME_DIM[0]
 
-    # 1️⃣ 启动 scrcpy-server 与 ADB forward
-    launcher = ScrcpyLauncher(
-        serial = serial,
-        video_port = port,
+    resize = (FRAME_DIM[0], FRAME_DIM[1])
+    decoder = make_decoder(config, host, port, resize=resize)
+    detector = GameDetector(
+        k=k,
+        input_order=config.get("detector", {}).get("input_order", "rgb"),
+    )
+    detector.warmup(frame_shape=(FRAME_DIM[1], FRAME_DIM[0], 3))
+    detect_every = config.get("detector", {}).get("detect_every", 1)
+    if detect_every > 1:
+        # YOLO 每 detect_every 帧跑一次，中间帧用跟踪外推
+        detector = TrackedDetector(detector, detect_every=detect_every)
+    act_cfg = config.get("action", {}) or {}
+    # adb_shell：常驻 shell 会话，每步的批量触控只是一次 stdin 写入
+    ctrl = AdbShellControl(serial) if act_cfg.get("backend") == "adb_shell" else AdbControl(serial)
+
+    viewer = None
+    view_cfg = config.get("viewer", {}) or {}
+    if view_cfg.get("enabled"):
+        # 多设备时每台设备一个端口：viewer.port + (视频端口 - adb_bridge.port)
+        view_cfg = {**view_cfg, "port": view_cfg.get("port", 8090) + port - config["adb_bridge"]["port"]}
+        viewer = LiveViewer.from_config(decoder, view_cfg).start()
+
+    recorder = None
+    rec_cfg = config.get("recorder", {}) or {}
+    if rec_cfg.get("enabled"):
+        # 每台设备单独一个数据集目录，避免多进程写同一个索引
+        root = f"{rec_cfg.get('path', './trajectories')}/{serial or 'default'}_{port}"
+        recorder = TrajectoryWriter(root, (FRAME_DIM[1], FRAME_DIM[0], 3),
+                                    chunk_size=rec_cfg.get("chunk_size", 2048))
+
+    return ScrcpyEnv(
+        decoder,
+        ctrl,
+        detector,
+        launcher,
+        resize,
+        frame_stack=(config.get("observation") or {}).get("frame_stack", 4),
+        motion_method=config.get("monitor", {}).get("method", "orb"),
+        recorder=recorder,
+        obs_mode=ObservationMode.from_config(config.get("observation")),
+        reward_engine=RewardEngine.from_config(config.get("reward")),
+        lifecycle_cfg=config.get("lifecycle"),
+        action_mode=act_cfg.get("mode", "discrete"),
+        viewer=viewer,
     )
 
+
+def main(config, resume=None, init_from=None):
+    port  = config["adb_bridge"]["port"]
+    serial = config["adb_bridge"]["serial"]
+
+    # 1️⃣ 启动 scrcpy-server 与 ADB forward
+    launcher = ScrcpyLauncher.from_config(config, serial=serial, port=port)
+
     try:
         with launcher:
-            resize = (FRAME_DIM[0], FRAME_DIM[1])
-            decoder = VideoDecoder(host, port, resize=resize)
-            detector = GameDetector(k=k)
-            ctrl = AdbControl(serial)
+            env = build_env(config, launcher)
+            decoder = env.decoder
 
             # 2️⃣ 创建单环境（用 DummyVecEnv 适配 SB3）
             def make_env():
-                return ScrcpyEnv(
-                    decoder,
-                    ctrl,
-                    detector,
-                    launcher,
-                    resize,
-                )
+                return env
 
             vec_env = DummyVecEnv([make_env])
 
@@ -66,29 +200,28 @@ def main(config):
             # 使用默认监控
             vec_env = VecMonitor(vec_env)
 
-            # ===== 新增回调函数 =====
-            # 模型检查点回调（每500步保存一次）
-            checkpoint_callback = CheckpointCallback(
-                save_freq=500,
-                save_path="./checkpoints/",
-                name_prefix="brawl_model"
-            )
-
-            # 评估回调（每200步评估一次）
-            eval_callback = EvalCallback(
-                vec_env,
-                best_model_save_path="./best_models/",
-                eval_freq=10,
-                deterministic=True,
-                render=False
-            )
-
             # 在回调列表中添加
             entropy_callback = EntropyScheduleCallback(
                 initial_coef=0.5,
                 final_coef=0.1,  # 提高最终熵系数
                 decay_steps=30000  # 延长衰减步数
             )
+            stateful_callbacks = {"entropy": entropy_callback}
+
+            # ===== 新增回调函数 =====
+            # 模型检查点回调（每500步快照一次，后台线程写盘，保留最近 5 个）
+            checkpoint_callback = AsyncCheckpointCallback(
+                save_freq=500,
+                save_path="./checkpoints/",
+                name_prefix="brawl_model",
+                keep_last=5,
+                stateful_callbacks=stateful_callbacks,
+            )
+
+            # 评估放到独立进程（专用设备或录制回放），不占用训练设备、不暂停采样
+            eval_proc, eval_results, eval_stop = start_eval_service(config, "./checkpoints/")
+            eval_callback = EvalReportCallback(eval_results)
+            timing_callback = StepTimingCallback()
 
             steps = 2048
             total_timesteps = 100000
@@ -103,14 +236,35 @@ def main(config):
                 clip_range=0.2,
                 gamma=0.95,     # 长期回报考量
                 tensorboard_log="./runs",  # 确保TensorBoard日志目录存在
+                policy_kwargs=policy_kwargs_from_config(config),
                 verbose=1,
             )
 
+            # ===== 行为克隆热启动（pretrain_bc.py 的输出）=====
+            if init_from and not resume:
+                # 动作头形状由动作空间决定：按另一种 action.mode 预训练的权重不能加载
+                from stable_baselines3.common.save_util import load_from_zip_file
+                bc_space = (load_from_zip_file(init_from)[0] or {}).get("action_space")
+                if bc_space is not None and bc_space != env.action_space:
+                    raise ValueError(f"{init_from} 的动作空间 {bc_space} 与环境 {env.action_space} 不一致，"
+                                     "请用相同的 action.mode 重新运行 pretrain_bc.py")
+                model.set_parameters(init_from, exact_match=False)
+                print(f"[train_agent] 已从 {init_from} 加载预训练权重")
+
+            # ===== 断点续训 =====
+            if resume:
+                path = latest_checkpoint("./checkpoints/", "brawl_model") if resume == "auto" else resume
+                if path is None:
+                    print("[train_agent] 未找到可恢复的检查点，从头开始训练")
+                else:
+                    restore(model, path, stateful_callbacks)
+
             # ===== 训练时传入回调 =====
             model.learn(
-                total_timesteps=total_timesteps,
-                callback=[checkpoint_callback, eval_callback, entropy_callback],  # 添加回调
-                tb_log_name="荒野乱斗智能玩家"  # TensorBoard实验名称
+                total_timesteps=max(0, total_timesteps - model.num_timesteps),
+                callback=[checkpoint_callback, eval_callback, entropy_callback, timing_callback],  # 添加回调
+                tb_log_name="荒野乱斗智能玩家",  # TensorBoard实验名称
+                reset_num_timesteps=not resume,
             )
             model.save("BrawlStars")
             vec_env.close()
@@ -118,6 +272,9 @@ def main(config):
     except KeyboardInterrupt:
         print("\n[train_agent] 手动中断，已安全退出。")
     finally:
+        if 'eval_stop' in locals():
+            eval_stop.set()
+            eval_proc.join(timeout=10)
         decoder.close()
         launcher.stop()  # 确保环境停止
         if 'vec_env' in locals():
@@ -125,6 +282,14 @@ def main(config):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PPO 训练")
+    parser.add_argument(
+        "--resume", nargs="?", const="auto", default=None,
+        help="从检查点续训；不带参数时自动选择 ./checkpoints/ 下最新的一个",
+    )
+    parser.add_argument("--init-from", default=None, help="用 pretrain_bc.py 保存的模型初始化策略")
+    args = parser.parse_args()
     with open('config.yaml') as f:
         config = yaml.safe_load(f)
-        main(config)
+        setup_logging(config.get("logging", {}).get("level", "INFO"))
+        main(config, resume=args.resume, init_from=args.init_from)
@@ -0,0 +1,296 @@
+"""
+trajectory_store.py
+~~~~~~~~~~~~~~~~~~~
+对局轨迹的分块内存映射存储，供离线 RL / 行为克隆使用。
+
+目录结构::
+
+    root/
+      index.json                 # 元数据：帧尺寸、类别表、各分块计数
+      chunk_00000/
+        frames.npy   (N, H, W, 3) uint8     每个解码帧只存一次
+        steps.npy    (M,) 结构化数组         动作 / 奖励 / 终止 / 帧索引 / 检测范围
+        dets.npy     (D,) 结构化数组         检测框（类别 id、置信度、xyxy）
+
+帧堆叠不落盘：step 只记录观测最后一帧的全局索引，读取时按 frame_stack 回溯，
+不跨越回合起点。所有 .npy 都以 mmap 打开，连续区间切片零拷贝。
+"""
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = ["TrajectoryWriter", "TrajectoryDataset", "STEP_DTYPE", "DET_DTYPE"]
+
+STEP_DTYPE = np.dtype([
+    ("frame", np.int64),        # 观测（动作执行前）最后一帧的全局索引
+    ("next_frame", np.int64),   # 动作执行后的新帧
+    ("ep_start", np.int64),     # 本回合第一帧的全局索引，帧堆叠不越过它
+    ("action", np.int64),
+    ("reward", np.float32),
+    ("terminated", np.bool_),
+    ("episode", np.int32),
+    ("det_start", np.int64),    # 在全局检测数组中的起点
+    ("det_count", np.int32),
+])
+
+DET_DTYPE = np.dtype([
+    ("step", np.int64),
+    ("cls", np.int16),
+    ("conf", np.float32),
+    ("xyxy", np.int16, (4,)),
+])
+
+
+def _write_json_atomic(path: Path, obj) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=1))
+    os.replace(tmp, path)
+
+
+# ───────────────────── 写入 ─────────────────────
+class TrajectoryWriter:
+    def __init__(
+        self,
+        root: str | Path,
+        frame_shape: Tuple[int, int, int],
+        chunk_size: int = 2048,
+        dets_per_step: int = 16,
+    ):
+        """
+        参数:
+            frame_shape  : (H, W, 3)
+            chunk_size   : 每个分块预分配的帧数
+            dets_per_step: 每分块检测框容量 = chunk_size × dets_per_step
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.frame_shape = tuple(frame_shape)
+        self.chunk_size = chunk_size
+        self.det_capacity = chunk_size * dets_per_step
+
+        index_path = self.root / "index.json"
+        if index_path.exists():
+            # 追加写：延续已有数据集的全局计数
+            self.index = json.loads(index_path.read_text())
+            assert tuple(self.index["frame_shape"]) == self.frame_shape, "帧尺寸与已有数据集不一致"
+        else:
+            self.index = {"frame_shape": list(self.frame_shape), "classes": [], "chunks": []}
+        self._cls_id = {c: i for i, c in enumerate(self.index["classes"])}
+        chunks = self.index["chunks"]
+        self.n_frames = sum(c["n_frames"] for c in chunks)
+        self.n_steps = sum(c["n_steps"] for c in chunks)
+        self.n_dets = sum(c["n_dets"] for c in chunks)
+        self.episode = max((c["last_episode"] for c in chunks), default=-1)
+
+        self._chunk = None
+        self._cur_frame = -1
+        self._ep_start = -1
+
+    # ---------------- 分块管理 ----------------
+    def _open_chunk(self) -> None:
+        cid = len(self.index["chunks"])
+        d = self.root / f"chunk_{cid:05d}"
+        d.mkdir(exist_ok=True)
+        fmt = np.lib.format
+        self._chunk = {
+            "id": cid,
+            "frames": fmt.open_memmap(d / "frames.npy", "w+", np.uint8, (self.chunk_size, *self.frame_shape)),
+            "steps": fmt.open_memmap(d / "steps.npy", "w+", STEP_DTYPE, (self.chunk_size,)),
+            "dets": fmt.open_memmap(d / "dets.npy", "w+", DET_DTYPE, (self.det_capacity,)),
+            "meta": {"dir": d.name, "n_frames": 0, "n_steps": 0, "n_dets": 0,
+                     "frame_offset": self.n_frames, "step_offset": self.n_steps,
+                     "det_offset": self.n_dets, "last_episode": self.episode},
+        }
+        self.index["chunks"].append(self._chunk["meta"])
+
+    def _close_chunk(self) -> None:
+        self.flush()
+        self._chunk = None
+
+    def _needs_roll(self, n_frames: int, n_dets: int) -> bool:
+        c = self._chunk
+        return c is None or c["meta"]["n_frames"] + n_frames > self.chunk_size \
+            or c["meta"]["n_dets"] + n_dets > self.det_capacity
+
+    def _roll(self) -> None:
+        self._close_chunk()
+        self._open_chunk()
+
+    def _add_frame(self, frame: np.ndarray) -> int:
+        m = self._chunk["meta"]
+        self._chunk["frames"][m["n_frames"]] = frame
+        m["n_frames"] += 1
+        self.n_frames += 1
+        return self.n_frames - 1
+
+    # ---------------- 外部接口 ----------------
+    def start_episode(self, first_frame: np.ndarray) -> None:
+        if self._needs_roll(1, 0):
+            self._roll()
+        self.episode += 1
+        self._chunk["meta"]["last_episode"] = self.episode
+        self._cur_frame = self._add_frame(first_frame)
+        self._ep_start = self._cur_frame
+
+    def record(self, action: int, reward: float, terminated: bool,
+               dets: Sequence[Dict], next_frame: np.ndarray) -> None:
+        """记录一步：动作在当前帧上执行，得到 reward 与 next_frame。"""
+        if self._ep_start < 0:
+            raise RuntimeError("[trajectory] 请先调用 start_episode()")
+        # 帧堆叠回溯要求同一回合的帧在同一分块内连续：
+        # 换块时把当前观测帧复制到新块开头，并以它作为新的回溯起点
+        if self._needs_roll(1, len(dets)):
+            carry = np.array(self.frame(self._cur_frame))
+            self._roll()
+            self._cur_frame = self._ep_start = self._add_frame(carry)
+        c, m = self._chunk, self._chunk["meta"]
+
+        s = c["steps"][m["n_steps"]]
+        s["frame"] = self._cur_frame
+        s["ep_start"] = self._ep_start
+        s["action"] = action
+        s["reward"] = reward
+        s["terminated"] = terminated
+        s["episode"] = self.episode
+        s["det_start"] = self.n_dets
+        s["det_count"] = len(dets)
+
+        for d in dets:
+            row = c["dets"][m["n_dets"]]
+            row["step"] = self.n_steps
+            row["cls"] = self._class_id(d["cls"])
+            row["conf"] = d["conf"]
+            row["xyxy"] = d["xyxy"]
+            m["n_dets"] += 1
+            self.n_dets += 1
+
+        if next_frame is not None:
+            self._cur_frame = self._add_frame(next_frame)
+        s["next_frame"] = self._cur_frame
+
+        m["n_steps"] += 1
+        self.n_steps += 1
+        if terminated:
+            self._ep_start = -1
+            self.flush()            # 每局结束落一次索引，崩溃最多丢一局
+
+    def flush(self) -> None:
+        if self._chunk is None:
+            return
+        for k in ("frames", "steps", "dets"):
+            self._chunk[k].flush()
+        _write_json_atomic(self.root / "index.json", self.index)
+
+    def frame(self, idx: int) -> np.ndarray:
+        c = self._chunk
+        return c["frames"][idx - c["meta"]["frame_offset"]]
+
+    def _class_id(self, name: str) -> int:
+        cid = self._cls_id.get(name)
+        if cid is None:
+            cid = self._cls_id[name] = len(self.index["classes"])
+            self.index["classes"].append(name)
+        return cid
+
+    def close(self) -> None:
+        self._close_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# ───────────────────── 读取 ─────────────────────
+class TrajectoryDataset:
+    def __init__(self, root: str | Path, frame_stack: int = 4):
+        self.root = Path(root)
+        self.frame_stack = frame_stack
+        self.index = json.loads((self.root / "index.json").read_text())
+        self.classes: List[str] = self.index["classes"]
+
+        self._frames, steps, dets = [], [], []
+        self._frame_offsets = []
+        for c in self.index["chunks"]:
+            d = self.root / c["dir"]
+            # 预分配的空余部分不读：只切出有效前缀（仍是 memmap 视图）
+            self._frames.append(np.load(d / "frames.npy", mmap_mode="r")[:c["n_frames"]])
+            steps.append(np.load(d / "steps.npy", mmap_mode="r")[:c["n_steps"]])
+            dets.append(np.load(d / "dets.npy", mmap_mode="r")[:c["n_dets"]])
+            self._frame_offsets.append(c["frame_offset"])
+        self._frame_offsets = np.asarray(self._frame_offsets, dtype=np.int64)
+
+        # 步与检测的元数据很小，合并到内存；帧保持 mmap
+        self.steps = np.concatenate(steps) if steps else np.empty(0, STEP_DTYPE)
+        self.dets = np.concatenate(dets) if dets else np.empty(0, DET_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    @property
+    def n_frames(self) -> int:
+        return sum(len(f) for f in self._frames)
+
+    # ---------------- 帧访问 ----------------
+    def _locate(self, idx: int) -> Tuple[int, int]:
+        ci = int(np.searchsorted(self._frame_offsets, idx, side="right") - 1)
+        return ci, idx - int(self._frame_offsets[ci])
+
+    def frame(self, idx: int) -> np.ndarray:
+        ci, li = self._locate(idx)
+        return self._frames[ci][li]
+
+    def stacked(self, step: int, key: str = "frame") -> np.ndarray:
+        """(frame_stack, H, W, 3)；回合开头不足时重复第一帧，与 env.reset() 一致。"""
+        s = self.steps[step]
+        last = int(s[key])
+        first = max(int(s["ep_start"]), last - self.frame_stack + 1)
+        ci, li = self._locate(first)
+        view = self._frames[ci][li: li + (last - first + 1)]          # 零拷贝视图
+        pad = self.frame_stack - len(view)
+        if pad:
+            view = np.concatenate([np.repeat(view[:1], pad, axis=0), view])
+        return view
+
+    def detections(self, step: int) -> np.ndarray:
+        s = self.steps[step]
+        return self.dets[s["det_start"]: s["det_start"] + s["det_count"]]
+
+    def slice(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        """连续步区间；帧部分在同一分块内时直接返回 mmap 视图。"""
+        steps = self.steps[start:stop]
+        f0, f1 = int(steps["frame"][0]), int(steps["frame"][-1])
+        ci, li = self._locate(f0)
+        if li + (f1 - f0) < len(self._frames[ci]):
+            frames = self._frames[ci][li: li + (f1 - f0) + 1]
+        else:
+            frames = np.stack([self.frame(i) for i in range(f0, f1 + 1)])
+        return {"frames": frames, "steps": steps}
+
+    # ---------------- 采样 ----------------
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None) -> Dict[str, np.ndarray]:
+        rng = rng or np.random.default_rng()
+        idx = np.sort(rng.integers(0, len(self), size=batch_size))   # 排序后 mmap 读取更接近顺序
+        return self.batch(idx)
+
+    def batch(self, idx: np.ndarray) -> Dict[str, np.ndarray]:
+        steps = self.steps[idx]
+        return {
+            "obs": np.stack([self.stacked(i) for i in idx]),            # (B, k, H, W, 3)
+            "actions": steps["action"],
+            "rewards": steps["reward"],
+            "terminated": steps["terminated"],
+            "step_idx": np.asarray(idx),
+        }
+
+    def iter_minibatches(self, batch_size: int, shuffle: bool = True,
+                         rng: Optional[np.random.Generator] = None) -> Iterator[Dict[str, np.ndarray]]:
+        rng = rng or np.random.default_rng()
+        order = rng.permutation(len(self)) if shuffle else np.arange(len(self))
+        for i in range(0, len(order), batch_size):
+            yield self.batch(np.sort(order[i:i + batch_size]))